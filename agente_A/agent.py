@@ -1,10 +1,25 @@
-from typing import Literal
-from langchain_openai import ChatOpenAI
+import asyncio
+from typing import Literal, Iterator, AsyncIterator, Dict, Any, List, Optional
 from langchain_core.messages import HumanMessage, AIMessage
 
-from rag_tools import rag_tool, web_search_tool
-from settings import CHAT_MODEL, AGENT_MODE
+from rag_tools import rag_tool_stream, web_search_tool_stream, arag_tool_stream, aweb_search_tool_stream
+from resources import get_chat, embedding_cache_stats, get_metrics_sink
+from query_rewriter import condense_query, acondense_query
+from context_packer import count_tokens
+from settings import (
+    CHAT_MODEL, AGENT_MODE, HISTORY_TOKEN_CAP, METRICS_SINK_PATH, METRICS_RETENTION, METRICS_BACKGROUND,
+    TRACE_ENABLED, TRACE_FORMAT, TRACE_PATH, CHAT_PRICE_PER_1M,
+)
 from metrics import MetricsCollector
+from tracing import Tracer, span
+from llm_usage import new_usage, add_usage
+
+REFERENCES_MARK = "**Referencias"
+WEB_DISABLED_ANSWER = "(La busqueda web esta deshabilitada actualmente.)"
+
+async def _aiter(items: List[str]) -> AsyncIterator[str]:
+    for item in items:
+        yield item
 
 class SimpleMemory:
     """Memoria conversacional simple con ventana deslizante."""
@@ -32,64 +47,213 @@ class SimpleMemory:
             elif isinstance(msg, AIMessage):
                 context.append(f"Asistente: {msg.content}")
         return "\n".join(context)
+    
+    def get_history(self, max_tokens: int) -> str:
+        """
+        Historial para el prompt de generacion: sin secciones de referencias y
+        recortado a `max_tokens`, conservando los mensajes mas recientes.
+        """
+        lines = []
+        used = 0
+        for msg in reversed(self.messages):
+            if isinstance(msg, HumanMessage):
+                line = f"Usuario: {msg.content}"
+            else:
+                line = f"Asistente: {msg.content.split(REFERENCES_MARK)[0].strip()}"
+            cost = count_tokens(line)
+            if used + cost > max_tokens:
+                break
+            lines.append(line)
+            used += cost
+        return "\n".join(reversed(lines))
 
 class Agent:
     def __init__(self, window_k: int = 6, model: str = CHAT_MODEL, collect_metrics: bool = False):
-        self.llm = ChatOpenAI(model=model, temperature=0)
+        self.llm = get_chat(model, temperature=0)
         self.memory = SimpleMemory(window_k=window_k)
         self.collect_metrics = collect_metrics
-        self.metrics_collector = MetricsCollector() if collect_metrics else None
+        self.metrics_collector = self._new_collector() if collect_metrics else None
         self.question_counter = 0
         self.agent_mode = AGENT_MODE
+        self.last_retrieval_query = None
+
+    @staticmethod
+    def _new_collector() -> MetricsCollector:
+        # el sink es uno por proceso: cada sesion (o reinicio) crea un colector, no un sink
+        return MetricsCollector(sink=get_metrics_sink(METRICS_SINK_PATH), retention=METRICS_RETENTION, background=METRICS_BACKGROUND,
+                                prices=CHAT_PRICE_PER_1M)
 
     def decide_and_answer(self, user_query: str, allow_web: bool = True) -> str:
         """Responde usando RAG o web segun corresponda."""
+        return "".join(self.decide_and_answer_stream(user_query, allow_web=allow_web))
+
+    async def adecide_and_answer(self, user_query: str, allow_web: bool = True) -> str:
+        """Version asincrona de decide_and_answer."""
+        return "".join([piece async for piece in self.adecide_and_answer_stream(user_query, allow_web=allow_web)])
+
+    def _new_turn(self, user_query: str, allow_web: bool) -> Dict[str, Any]:
+        """
+        Decide la herramienta (rag, web o ninguna) del turno.
+        Con TRACE_ENABLED el turno lleva un Tracer que registra cada etapa.
+        """
         self.question_counter += 1
         text_l = user_query.lower()
         wants_web = any(w in text_l for w in ["busca en la web", "buscar en la web", "web", "internet", "google"])
 
-        web_used = False
-        t_retrieval_ms = 0.0
-        t_generation_ms = 0.0
-        retrieved_docs = []
-        result = ""
-
+        turn = {
+            "tool": "rag",
+            "web_used": False,
+            "stats": {},
+            "retrieval_query": user_query,
+            "history": "",
+            "rewrite_usage": new_usage(),
+            "tracer": Tracer(f"agente_{self.agent_mode}") if TRACE_ENABLED else None,
+        }
         if wants_web and not allow_web:
-            result = "(La busqueda web esta deshabilitada actualmente.)"
+            turn["tool"] = None
         elif allow_web and wants_web:
-            web_used = True
-            result, t_retrieval_ms, t_generation_ms, retrieved_docs = web_search_tool(user_query)
+            turn["tool"] = "web"
+            turn["web_used"] = True
+        return turn
+
+    def _previous_query(self) -> Optional[str]:
+        # Solo se hereda contexto si hubo un turno anterior en esta conversacion
+        return self.last_retrieval_query if self.memory.messages else None
+
+    def _route(self, user_query: str, allow_web: bool) -> Dict[str, Any]:
+        """
+        Decide la herramienta y prepara sus argumentos. Para RAG se embebe una consulta
+        corta e independiente; el historial va aparte al prompt.
+        """
+        turn = self._new_turn(user_query, allow_web)
+        if turn["tool"] == "rag":
+            with span(turn["tracer"], "condense query"):
+                turn["retrieval_query"] = condense_query(user_query, self._previous_query(),
+                                                         usage=turn["rewrite_usage"])
+            turn["history"] = self.memory.get_history(HISTORY_TOKEN_CAP)
+        self.last_retrieval_query = turn["retrieval_query"]
+        return turn
+
+    async def _aroute(self, user_query: str, allow_web: bool) -> Dict[str, Any]:
+        """Version asincrona de _route (la reescritura LLM usa ainvoke)."""
+        turn = self._new_turn(user_query, allow_web)
+        if turn["tool"] == "rag":
+            with span(turn["tracer"], "condense query"):
+                turn["retrieval_query"] = await acondense_query(user_query, self._previous_query(),
+                                                                usage=turn["rewrite_usage"])
+            turn["history"] = self.memory.get_history(HISTORY_TOKEN_CAP)
+        self.last_retrieval_query = turn["retrieval_query"]
+        return turn
+
+    def _rag_kwargs(self, user_query: str, turn: Dict[str, Any]) -> Dict[str, Any]:
+        # La cache de respuestas solo aplica a preguntas que no dependen de la anterior
+        return dict(
+            question=user_query, history=turn["history"],
+            use_cache=turn["retrieval_query"] == user_query, stats=turn["stats"],
+            tracer=turn["tracer"],
+        )
+
+    def decide_and_answer_stream(self, user_query: str, allow_web: bool = True) -> Iterator[str]:
+        """
+        Igual que decide_and_answer pero emite la respuesta por partes a medida que el
+        LLM la genera. La memoria y las metricas se actualizan al agotar el generador.
+        """
+        turn = self._route(user_query, allow_web)
+        if turn["tool"] is None:
+            pieces = iter([WEB_DISABLED_ANSWER])
+        elif turn["tool"] == "web":
+            pieces = web_search_tool_stream(user_query, stats=turn["stats"], tracer=turn["tracer"])
         else:
-            context = self.memory.get_context()
-            enriched_query = f"Contexto previo:\n{context}\n\nPregunta actual: {user_query}" if context else user_query
-            result, t_retrieval_ms, t_generation_ms, retrieved_docs = rag_tool(enriched_query)
+            pieces = rag_tool_stream(turn["retrieval_query"], **self._rag_kwargs(user_query, turn))
 
-        self.memory.add_user_message(user_query)
-        self.memory.add_ai_message(result)
+        parts = []
+        with span(turn["tracer"], f"{turn['tool']}_tool"):
+            for piece in pieces:
+                parts.append(piece)
+                yield piece
+        self._finish(user_query, allow_web, turn, "".join(parts))
+
+    async def adecide_and_answer_stream(self, user_query: str, allow_web: bool = True) -> AsyncIterator[str]:
+        """
+        Version asincrona de decide_and_answer_stream. El cierre del turno (metricas y
+        traza, que escriben a disco) corre en un hilo para no bloquear el event loop.
+        """
+        turn = await self._aroute(user_query, allow_web)
+        if turn["tool"] is None:
+            pieces = _aiter([WEB_DISABLED_ANSWER])
+        elif turn["tool"] == "web":
+            pieces = aweb_search_tool_stream(user_query, stats=turn["stats"], tracer=turn["tracer"])
+        else:
+            pieces = arag_tool_stream(turn["retrieval_query"], **self._rag_kwargs(user_query, turn))
+
+        parts = []
+        with span(turn["tracer"], f"{turn['tool']}_tool"):
+            async for piece in pieces:
+                parts.append(piece)
+                yield piece
+        await asyncio.to_thread(self._finish, user_query, allow_web, turn, "".join(parts))
+
+    def _finish(self, user_query: str, allow_web: bool, turn: Dict[str, Any], result: str):
+        """Actualiza la memoria, registra las metricas de la pregunta y exporta la traza."""
+        tool_stats = turn["stats"]
+        history = turn["history"]
+        tracer = turn["tracer"]
+        with span(tracer, "memory update"):
+            self.memory.add_user_message(user_query)
+            self.memory.add_ai_message(result)
 
         if self.collect_metrics and self.metrics_collector:
-            tokens_in = self.metrics_collector.count_tokens(user_query)
-            tokens_out = self.metrics_collector.count_tokens(result)
-            
-            self.metrics_collector.add_metric(
-                agent_mode=self.agent_mode,
-                question_id=self.question_counter,
-                question_text=user_query,
-                web_allowed=allow_web,
-                web_used=web_used,
-                t_retrieval_ms=t_retrieval_ms,
-                t_generation_ms=t_generation_ms,
-                tokens_in=tokens_in,
-                tokens_out=tokens_out,
-                retrieved_docs=retrieved_docs,
-                answer=result
-            )
-
-        return result
+            # tokens, citas, fidelidad y EM se calculan en el hilo de puntaje del colector
+            collector = self.metrics_collector
+            question_id = self.question_counter
+            stage_ms = tracer.totals() if tracer else None
+            cache_stats = embedding_cache_stats()
+
+            def record():
+                # tokens de los prompts realmente enviados: el de generacion (API, o la estimacion
+                # si no lo informo; 0 si no se envio, p.ej. acierto de cache) mas la reescritura
+                # LLM de la consulta. La pregunta sola queda en query_tokens
+                generation = tool_stats.get("llm_usage") or {}
+                estimate = tool_stats.get("prompt_tokens_est") or {}
+                rewrite = turn["rewrite_usage"]
+                usage = add_usage(add_usage({}, generation), rewrite) if rewrite["calls"] else generation
+                query_tokens = collector.count_tokens(user_query)
+                collector.add_metric(
+                    agent_mode=self.agent_mode,
+                    question_id=question_id,
+                    question_text=user_query,
+                    web_allowed=allow_web,
+                    web_used=turn["web_used"],
+                    t_retrieval_ms=tool_stats.get("t_retrieval_ms", 0.0),
+                    t_generation_ms=tool_stats.get("t_generation_ms", 0.0),
+                    tokens_in=(generation.get("prompt_tokens") or estimate.get("total", 0))
+                              + rewrite["prompt_tokens"],
+                    tokens_out=usage.get("completion_tokens") or collector.count_tokens(result),
+                    retrieved_docs=tool_stats.get("retrieved_docs", []),
+                    answer=result,
+                    cache_hit=tool_stats.get("cache_hit", False),
+                    query_tokens=query_tokens,
+                    retrieval_query_tokens=collector.count_tokens(turn["retrieval_query"]),
+                    history_tokens=collector.count_tokens(history) if history else 0,
+                    t_first_token_ms=tool_stats.get("t_first_token_ms", 0.0),
+                    t_rerank_ms=tool_stats.get("t_rerank_ms", 0.0),
+                    stage_ms=stage_ms,
+                    llm_usage=usage,
+                    prompt_tokens_est=estimate
+                )
+                collector.update_embedding_cache_stats(cache_stats)
+
+            collector.submit(record)
+        if tracer:
+            tracer.append_to(TRACE_PATH, TRACE_FORMAT)
     
     def save_metrics(self, json_path: str = "metrics.json", csv_path: str = "metrics.csv"):
-        """Guarda las metricas recolectadas."""
+        """
+        Escribe lo pendiente en el sink JSON Lines y guarda en JSON/CSV las metricas
+        retenidas en memoria (las ultimas METRICS_RETENTION).
+        """
         if self.metrics_collector:
+            self.metrics_collector.flush()
             self.metrics_collector.save_to_json(json_path)
             self.metrics_collector.save_to_csv(csv_path)
             return self.metrics_collector.get_summary()
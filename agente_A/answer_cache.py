@@ -0,0 +1,83 @@
+import time
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple, Dict, Any
+
+import numpy as np
+
+class SemanticAnswerCache:
+    """
+    Cache semantica de respuestas.
+    Devuelve una respuesta guardada si el embedding de la consulta esta a menos de
+    `threshold` (similitud coseno) de una consulta previa con la misma version de
+    indice y el mismo modo de agente. Expira por TTL y por tamano (LRU).
+    """
+
+    def __init__(self, threshold: float = 0.95, ttl_s: float = 3600.0, max_size: int = 256):
+        self.threshold = threshold
+        self.ttl_s = ttl_s
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def lookup(self, vector: List[float], index_version: str, agent_mode: str) -> Optional[Tuple[str, List[dict]]]:
+        query = _unit(vector)
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            best_id, best_sim = None, self.threshold
+            for entry_id, entry in self._entries.items():
+                if entry["index_version"] != index_version or entry["agent_mode"] != agent_mode:
+                    continue
+                sim = float(np.dot(query, entry["vector"]))
+                if sim >= best_sim:
+                    best_id, best_sim = entry_id, sim
+            if best_id is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            entry = self._entries[best_id]
+            return entry["answer"], entry["retrieved_docs"]
+
+    def store(self, vector: List[float], index_version: str, agent_mode: str,
+              answer: str, retrieved_docs: List[dict]):
+        with self._lock:
+            self._entries[self._next_id] = {
+                "vector": _unit(vector),
+                "index_version": index_version,
+                "agent_mode": agent_mode,
+                "answer": answer,
+                "retrieved_docs": retrieved_docs,
+                "created_at": time.time(),
+            }
+            self._next_id += 1
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, index_version: Optional[str] = None):
+        """Elimina todo, o solo las entradas que no son de `index_version`."""
+        with self._lock:
+            if index_version is None:
+                self._entries.clear()
+                return
+            stale = [i for i, e in self._entries.items() if e["index_version"] != index_version]
+            for entry_id in stale:
+                del self._entries[entry_id]
+
+    def _expire(self, now: float):
+        expired = [i for i, e in self._entries.items() if now - e["created_at"] > self.ttl_s]
+        for entry_id in expired:
+            del self._entries[entry_id]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+def _unit(vector: List[float]) -> np.ndarray:
+    v = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(v)
+    return v / norm if norm else v
@@ -7,6 +7,7 @@ env_path = os.path.join(os.path.dirname(__file__), "..", ".env")
 load_dotenv(env_path)
 
 from agent import Agent
+import resources
 from settings import AGENT_MODE
 
 st.set_page_config(page_title=f"GPTEC - Agente {AGENT_MODE}", page_icon="A", layout="wide")
@@ -35,6 +36,10 @@ with st.sidebar:
         st.session_state.agent = Agent(window_k=6, collect_metrics=collect_metrics)
         st.success("Memoria limpiada")
     
+    if st.button("Recargar indice"):
+        resources.reload()
+        st.success("Indice recargado")
+    
     if collect_metrics and st.session_state.agent.metrics_collector:
         if st.button("Guardar metricas"):
             summary = st.session_state.agent.save_metrics()
@@ -44,10 +49,8 @@ with st.sidebar:
 query = st.text_input("Pregunta (basada en los apuntes PDF):")
 
 if st.button("Preguntar") and query.strip():
-    with st.spinner("Consultando..."):
-        answer = st.session_state.agent.decide_and_answer(query, allow_web=allow_web)
     st.markdown("### Respuesta")
-    st.write(answer)
+    st.write_stream(st.session_state.agent.decide_and_answer_stream(query, allow_web=allow_web))
 
 with st.expander("Ver memoria conversacional"):
     memory_context = st.session_state.agent.memory.get_context()
@@ -68,6 +71,9 @@ if collect_metrics and st.session_state.agent.metrics_collector:
             with col2:
                 st.metric("T. retrieval (ms)", f"{summary.get('avg_t_retrieval_ms', 0):.1f}")
                 st.metric("T. generacion (ms)", f"{summary.get('avg_t_generation_ms', 0):.1f}")
+                st.metric("T. primer token (ms)", f"{summary.get('avg_t_first_token_ms', 0):.1f}")
+                st.caption("T. total p50/p95/p99 (ms): " + " / ".join(
+                    f"{summary.get(f'p{p}_t_total_ms', 0):.0f}" for p in (50, 95, 99)))
             with col3:
                 st.metric("Tokens in", f"{summary.get('avg_tokens_in', 0):.0f}")
                 st.metric("Tokens out", f"{summary.get('avg_tokens_out', 0):.0f}")
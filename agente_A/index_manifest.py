@@ -0,0 +1,70 @@
+import os
+import json
+import hashlib
+from typing import List, Dict, Any, Tuple, Set
+from langchain_core.documents import Document
+
+MANIFEST_FILE = "index_manifest.json"
+
+def page_key(doc: Document) -> str:
+    return f"{doc.metadata.get('source')}#{doc.metadata.get('page')}"
+
+def page_fingerprint(text: str, params: str) -> str:
+    """Hash del texto limpio de la pagina + parametros de chunking."""
+    return hashlib.sha256(f"{params}\0{text}".encode("utf-8")).hexdigest()
+
+def chunk_ids(doc: Document, n: int) -> List[str]:
+    """IDs estables por pagina, para que Chroma haga upsert en vez de duplicar."""
+    key = page_key(doc)
+    return [f"{key}:{i}" for i in range(n)]
+
+class IndexManifest:
+    """
+    Registro de lo que hay en el indice: huella y IDs de chunks por pagina.
+    Se guarda junto al indice (DB_DIR/index_manifest.json).
+    """
+
+    def __init__(self, db_dir: str, params: str = "", pages: Dict[str, Dict[str, Any]] = None):
+        self.db_dir = db_dir
+        self.params = params
+        self.pages = pages or {}
+
+    @classmethod
+    def load(cls, db_dir: str) -> "IndexManifest":
+        path = os.path.join(db_dir, MANIFEST_FILE)
+        if not os.path.exists(path):
+            return cls(db_dir)
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(db_dir, data.get("params", ""), data.get("pages", {}))
+
+    def save(self):
+        os.makedirs(self.db_dir, exist_ok=True)
+        with open(os.path.join(self.db_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+            json.dump({"params": self.params, "pages": self.pages}, f, indent=1, ensure_ascii=False)
+
+    def diff_page(self, doc: Document, params: str) -> Tuple[bool, List[str]]:
+        """
+        Compara una pagina con el manifiesto.
+        Retorna (es nueva o cambio, IDs de la version previa a borrar).
+        """
+        fp = page_fingerprint(doc.page_content, params)
+        doc.metadata["content_hash"] = fp
+        prev = self.pages.get(page_key(doc))
+        if prev is not None and prev["fingerprint"] == fp:
+            return False, []
+        return True, list(prev["chunk_ids"]) if prev is not None else []
+
+    def removed_ids(self, seen: Set[str]) -> List[str]:
+        """IDs de chunks de paginas que ya no existen en DATA_DIR."""
+        ids = []
+        for key, prev in self.pages.items():
+            if key not in seen:
+                ids.extend(prev["chunk_ids"])
+        return ids
+
+    def record(self, doc: Document, ids: List[str]):
+        self.pages[page_key(doc)] = {"fingerprint": doc.metadata["content_hash"], "chunk_ids": ids}
+
+    def forget_missing(self, seen: Set[str]):
+        self.pages = {k: v for k, v in self.pages.items() if k in seen}
@@ -0,0 +1,52 @@
+import os
+import json
+import uuid
+from datetime import datetime
+from typing import Dict, Any
+
+META_FILE = "index_meta.json"
+
+class IndexMismatchError(RuntimeError):
+    """El indice se construyo con otro backend/modelo de embeddings que el configurado."""
+
+def write_index_meta(db_dir: str, **extra) -> Dict[str, Any]:
+    """Escribe una nueva version del indice; se llama cada vez que build_index termina."""
+    meta = {
+        "version": uuid.uuid4().hex[:12],
+        "built_at": datetime.now().isoformat(),
+    }
+    meta.update(extra)
+    os.makedirs(db_dir, exist_ok=True)
+    with open(os.path.join(db_dir, META_FILE), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2, ensure_ascii=False)
+    return meta
+
+def read_index_meta(db_dir: str) -> Dict[str, Any]:
+    path = os.path.join(db_dir, META_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def index_version(db_dir: str) -> str:
+    return read_index_meta(db_dir).get("version", "sin-version")
+
+def check_embedding_backend(db_dir: str, backend: str, model: str):
+    """Falla si el indice de `db_dir` se embebio con otro backend o modelo (los vectores no serian comparables)."""
+    meta = read_index_meta(db_dir)
+    if not meta:
+        return
+    built = (meta.get("embed_backend", "openai"), meta.get("embed_model", model))
+    if built != (backend, model):
+        raise IndexMismatchError(
+            f"El indice en {db_dir} se construyo con {built[0]}/{built[1]} pero la configuracion usa "
+            f"{backend}/{model}. Reconstruir con build_index.py --full o cambiar EMBED_BACKEND."
+        )
+
+def dir_size_bytes(db_dir: str) -> int:
+    """Tamano en disco del indice."""
+    total = 0
+    for root, _, files in os.walk(db_dir):
+        for f in files:
+            total += os.path.getsize(os.path.join(root, f))
+    return total
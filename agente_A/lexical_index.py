@@ -0,0 +1,137 @@
+import os
+import re
+import json
+from typing import List, Dict, Tuple, Any, Optional
+
+import numpy as np
+from unidecode import unidecode
+from langchain_core.documents import Document
+
+from numpy_store import pack_strings, unpack_string
+
+INDEX_FILE = "bm25.npz"
+META_FILE = "bm25_meta.json"
+
+TOKEN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset("""
+a al algo algun alguna como con cual cuales cuando de del donde el ella ellos en entre es esa ese eso esta
+estan este esto fue ha hay la las le les lo los mas me mi mismo muy no nos o otra otro para pero por porque
+que quien se ser si sin sobre son su sus tambien te tiene un una uno unos unas y ya yo
+explica explicame dame define describe menciona
+""".split())
+
+def tokenize(text: str) -> List[str]:
+    """Misma normalizacion que limpiar_texto (unidecode) + minusculas, sin stopwords."""
+    return [t for t in TOKEN.findall(unidecode(text).lower()) if t not in STOPWORDS and (len(t) > 1 or t.isdigit())]
+
+class BM25Index:
+    """
+    Indice invertido BM25 en formato CSR: para cada termino, los chunks donde aparece
+    (`doc_ids`) y su frecuencia (`tfs`) entre indptr[t] e indptr[t + 1]. El IDF y el
+    largo de cada chunk se precalculan al construir. `ids` son los IDs de los chunks en el
+    vector store (para leer sus embeddings); indices antiguos no los tienen.
+    """
+
+    def __init__(self, vocab: Dict[str, int], indptr: np.ndarray, doc_ids: np.ndarray, tfs: np.ndarray,
+                 idf: np.ndarray, doc_len: np.ndarray, text_blob: np.ndarray, text_off: np.ndarray,
+                 metadatas: List[Dict[str, Any]], k1: float = 1.5, b: float = 0.75,
+                 ids: Optional[List[str]] = None):
+        self.vocab = vocab
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.idf = idf
+        self.doc_len = doc_len
+        self.text_blob = text_blob
+        self.text_off = text_off
+        self.metadatas = metadatas
+        self.k1 = k1
+        self.b = b
+        self.ids = ids
+        self.avgdl = float(doc_len.mean()) if len(doc_len) else 0.0
+
+    @classmethod
+    def build(cls, texts: List[str], metadatas: List[Dict[str, Any]],
+              k1: float = 1.5, b: float = 0.75, ids: Optional[List[str]] = None) -> "BM25Index":
+        vocab: Dict[str, int] = {}
+        postings: List[Dict[int, int]] = []
+        doc_len = np.zeros(len(texts), dtype=np.float32)
+        for d, text in enumerate(texts):
+            terms = tokenize(text)
+            doc_len[d] = len(terms)
+            for term in terms:
+                t = vocab.setdefault(term, len(vocab))
+                if t == len(postings):
+                    postings.append({})
+                postings[t][d] = postings[t].get(d, 0) + 1
+
+        indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum([len(p) for p in postings], out=indptr[1:])
+        doc_ids = np.fromiter((d for p in postings for d in p), dtype=np.int32, count=int(indptr[-1]))
+        tfs = np.fromiter((tf for p in postings for tf in p.values()), dtype=np.float32, count=int(indptr[-1]))
+        df = np.diff(indptr).astype(np.float32)
+        idf = np.log(1.0 + (len(texts) - df + 0.5) / (df + 0.5)).astype(np.float32)
+        text_blob, text_off = pack_strings(texts)
+        return cls(vocab, indptr, doc_ids, tfs, idf, doc_len, text_blob, text_off, list(metadatas), k1, b,
+                   list(ids) if ids is not None else None)
+
+    def save(self, db_dir: str):
+        os.makedirs(db_dir, exist_ok=True)
+        np.savez(os.path.join(db_dir, INDEX_FILE), indptr=self.indptr, doc_ids=self.doc_ids, tfs=self.tfs,
+                 idf=self.idf, doc_len=self.doc_len, text_blob=self.text_blob, text_off=self.text_off)
+        with open(os.path.join(db_dir, META_FILE), 'w', encoding='utf-8') as f:
+            json.dump({"k1": self.k1, "b": self.b, "vocab": self.vocab, "metadatas": self.metadatas,
+                       "ids": self.ids},
+                      f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, db_dir: str) -> Optional["BM25Index"]:
+        path = os.path.join(db_dir, INDEX_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(os.path.join(db_dir, META_FILE), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        with np.load(path) as arrays:
+            return cls(meta["vocab"], arrays["indptr"], arrays["doc_ids"], arrays["tfs"], arrays["idf"],
+                       arrays["doc_len"], arrays["text_blob"], arrays["text_off"], meta["metadatas"],
+                       meta["k1"], meta["b"], meta.get("ids"))
+
+    def __len__(self) -> int:
+        return len(self.doc_len)
+
+    def search(self, query: str, k: int) -> Tuple[List[Tuple[Document, float]], float]:
+        """
+        Top-k por BM25. Retorna tambien la cobertura del mejor resultado: fraccion de
+        los terminos distintos de la consulta que aparecen en el. Si el indice tiene IDs,
+        la metadata de cada resultado trae "chunk_id".
+        """
+        terms = [self.vocab[t] for t in dict.fromkeys(tokenize(query)) if t in self.vocab]
+        n_query_terms = len(set(tokenize(query)))
+        if not terms or not len(self):
+            return [], 0.0
+        scores = np.zeros(len(self), dtype=np.float32)
+        matched = np.zeros(len(self), dtype=np.int32)
+        norm = self.k1 * (1 - self.b + self.b * self.doc_len / max(self.avgdl, 1e-9))
+        for t in terms:
+            start, end = self.indptr[t], self.indptr[t + 1]
+            docs, tf = self.doc_ids[start:end], self.tfs[start:end]
+            scores[docs] += self.idf[t] * tf * (self.k1 + 1) / (tf + norm[docs])
+            matched[docs] += 1
+
+        k = min(k, int(np.count_nonzero(scores)))
+        if k == 0:
+            return [], 0.0
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        hits = [
+            (Document(page_content=unpack_string(self.text_blob, self.text_off, int(d)),
+                      metadata=self._metadata(int(d))), float(scores[d]))
+            for d in top
+        ]
+        return hits, matched[top[0]] / n_query_terms
+
+    def _metadata(self, d: int) -> Dict[str, Any]:
+        metadata = dict(self.metadatas[d])
+        if self.ids is not None:
+            metadata["chunk_id"] = self.ids[d]
+        return metadata
@@ -0,0 +1,137 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional, Any, Iterable, Iterator, AsyncIterable, AsyncIterator
+
+# Uso de tokens de la llamada en curso; lo fijan tracking()/tracked() y lo completan los clientes envueltos
+_current: ContextVar[Optional[Dict[str, int]]] = ContextVar("llm_usage", default=None)
+
+def new_usage() -> Dict[str, int]:
+    return {"prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0, "calls": 0}
+
+def add_usage(total: Dict[str, int], other: Optional[Dict[str, int]]) -> Dict[str, int]:
+    """Suma `other` a `total` (in place) y lo retorna."""
+    for key, value in (other or {}).items():
+        total[key] = total.get(key, 0) + value
+    return total
+
+@contextmanager
+def tracking(usage: Optional[Dict[str, int]]) -> Iterator[Optional[Dict[str, int]]]:
+    """Las llamadas al LLM dentro del bloque suman su uso a `usage`; al salir se restaura el anterior."""
+    token = _current.set(usage)
+    try:
+        yield usage
+    finally:
+        _current.reset(token)
+
+def tracked(items: Iterable, usage: Dict[str, int]) -> Iterator:
+    """
+    Itera un stream del LLM con `usage` activo solo mientras se pide cada elemento: entre
+    un yield y el siguiente (o si el consumidor abandona el stream) no queda nada ligado.
+    """
+    iterator = iter(items)
+    while True:
+        with tracking(usage):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+async def atracked(items: AsyncIterable, usage: Dict[str, int]) -> AsyncIterator:
+    """Version asincrona de tracked."""
+    iterator = items.__aiter__()
+    while True:
+        with tracking(usage):
+            try:
+                item = await iterator.__anext__()
+            except StopAsyncIteration:
+                return
+        yield item
+
+def _add(usage: Optional[Dict[str, int]], reported: Any):
+    if usage is None or reported is None:
+        return
+    if not isinstance(reported, dict):
+        reported = reported.model_dump()
+    details = reported.get("prompt_tokens_details") or {}
+    usage["prompt_tokens"] += reported.get("prompt_tokens") or 0
+    usage["completion_tokens"] += reported.get("completion_tokens") or 0
+    usage["cached_tokens"] += details.get("cached_tokens") or 0
+    usage["calls"] += 1
+
+class _UsageStream:
+    def __init__(self, stream, usage: Dict[str, int]):
+        self._stream = stream
+        self._usage = usage
+
+    def __enter__(self):
+        self._stream.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._stream.__exit__(*exc)
+
+    def __iter__(self):
+        for chunk in self._stream:
+            _add(self._usage, chunk.usage)
+            yield chunk
+
+class _AsyncUsageStream(_UsageStream):
+    async def __aenter__(self):
+        await self._stream.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc):
+        return await self._stream.__aexit__(*exc)
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            _add(self._usage, chunk.usage)
+            yield chunk
+
+class UsageRecordingCompletions:
+    """
+    Envuelve client.chat.completions de ChatOpenAI. langchain-openai 0.1.7 descarta el
+    chunk final con `usage` del streaming, asi que se lee aqui (pidiendo include_usage)
+    y se suma al dict activo (ver tracking).
+    """
+
+    def __init__(self, completions, stream_usage: bool = True):
+        self._completions = completions
+        self._stream_usage = stream_usage
+
+    def _params(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        if params.get("stream") and self._stream_usage:
+            params.setdefault("stream_options", {"include_usage": True})
+        return params
+
+    def create(self, **params):
+        usage = _current.get()
+        response = self._completions.create(**self._params(params))
+        if usage is None:
+            return response
+        if params.get("stream"):
+            return _UsageStream(response, usage)
+        _add(usage, response.usage)
+        return response
+
+    def __getattr__(self, name):
+        return getattr(self._completions, name)
+
+class AsyncUsageRecordingCompletions(UsageRecordingCompletions):
+    async def create(self, **params):
+        usage = _current.get()
+        response = await self._completions.create(**self._params(params))
+        if usage is None:
+            return response
+        if params.get("stream"):
+            return _AsyncUsageStream(response, usage)
+        _add(usage, response.usage)
+        return response
+
+def cost_usd(usage: Dict[str, int], prices: Dict[str, float]) -> float:
+    """Costo de las llamadas registradas con precios en USD por millon de tokens."""
+    cached = usage.get("cached_tokens", 0)
+    return (prices["input"] * (usage.get("prompt_tokens", 0) - cached)
+            + prices["cached_input"] * cached
+            + prices["output"] * usage.get("completion_tokens", 0)) / 1e6
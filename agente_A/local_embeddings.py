@@ -0,0 +1,97 @@
+import time
+import queue
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import List, Optional, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+class LocalEmbeddings(Embeddings):
+    """
+    Embeddings con un modelo sentence-transformers en CPU (sin red).
+    Las consultas sueltas que llegan a la vez desde varios hilos se agrupan en un
+    solo encode (batching dinamico): se espera hasta `max_wait_ms` o hasta juntar `batch_size`.
+    """
+
+    def __init__(self, model_name: str, batch_size: int = 32, threads: Optional[int] = None,
+                 max_wait_ms: float = 5.0, backend: str = "torch", device: str = "cpu"):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.threads = threads
+        self.max_wait_ms = max_wait_ms
+        self.backend = backend
+        self.device = device
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._queue: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+
+    @property
+    def model(self):
+        with self._model_lock:
+            if self._model is None:
+                from sentence_transformers import SentenceTransformer
+                if self.threads:
+                    import torch
+                    torch.set_num_threads(self.threads)
+                kwargs = {"backend": self.backend} if self.backend != "torch" else {}
+                self._model = SentenceTransformer(self.model_name, device=self.device, **kwargs)
+            return self._model
+
+    def warmup(self) -> float:
+        """Carga el modelo y hace un encode de prueba; retorna los segundos que tomo."""
+        start = time.perf_counter()
+        self._encode(["calentamiento"])
+        return time.perf_counter() - start
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        # normalizados para que la distancia L2 de Chroma siga equivaliendo a coseno
+        vectors = self.model.encode(texts, batch_size=self.batch_size,
+                                    normalize_embeddings=True, show_progress_bar=False)
+        return vectors.tolist()
+
+    def count_tokens(self, texts: List[str]) -> int:
+        return sum(len(ids) for ids in self.model.tokenizer(texts)["input_ids"])
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._encode(texts) if texts else []
+
+    def _submit(self, text: str) -> Future:
+        future: Future = Future()
+        self._queue.put((text, future))
+        with self._model_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._batch_loop, daemon=True)
+                self._worker.start()
+        return future
+
+    def _batch_loop(self):
+        while True:
+            pending = [self._queue.get()]
+            deadline = time.perf_counter() + self.max_wait_ms / 1000
+            while len(pending) < self.batch_size:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    pending.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            try:
+                vectors = self._encode([text for text, _ in pending])
+            except Exception as e:
+                for _, future in pending:
+                    future.set_exception(e)
+                continue
+            for (_, future), vector in zip(pending, vectors):
+                future.set_result(vector)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._submit(text).result()
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await asyncio.wrap_future(self._submit(text))
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await asyncio.get_running_loop().run_in_executor(None, self.embed_documents, texts)
@@ -2,10 +2,56 @@ import time
 import re
 import json
 import uuid
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future
 from datetime import datetime
-from typing import List, Dict, Any, Tuple
-from dataclasses import dataclass, asdict
-import tiktoken
+from functools import lru_cache
+from typing import List, Dict, Any, Tuple, Optional, Deque, Callable
+from dataclasses import dataclass, asdict, field
+from unidecode import unidecode
+
+from context_packer import get_tokenizer
+from metrics_sink import JsonlSink
+from quantile_sketch import QuantileSketch
+from llm_usage import cost_usd
+
+CITATION_RE = re.compile(r'\[(\d+)\]\s*([^,]+),\s*p\.(\d+)', re.IGNORECASE)
+
+@lru_cache(maxsize=256)
+def _pattern(pattern: str) -> "re.Pattern":
+    return re.compile(pattern, re.IGNORECASE)
+
+def peak_rss_mb() -> float:
+    """
+    Memoria maxima del proceso. En Linux se lee VmHWM, que se reinicia con exec
+    (ru_maxrss hereda el pico del proceso padre cuando se lanza con subprocess).
+    """
+    try:
+        with open("/proc/self/status", 'r') as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource  # solo Unix; ru_maxrss viene en KB en Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+# un solo hilo de puntaje para todo el proceso (una sesion de Streamlit = un colector):
+# las metricas se puntuan en orden y no queda un hilo vivo por cada sesion cerrada
+_worker: Optional[ThreadPoolExecutor] = None
+_worker_lock = threading.Lock()
+
+def _scoring_worker() -> ThreadPoolExecutor:
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix="metrics")
+        return _worker
+
+def _report_error(future: Future):
+    if future.exception() is not None:
+        print(f"Error al registrar metricas: {future.exception()}")
 
 @dataclass
 class QuestionMetrics:
@@ -33,13 +79,73 @@ class QuestionMetrics:
     em_binary: int
     
     answer: str
+    
+    cache_hit: bool = False
+    
+    query_tokens: int = 0
+    retrieval_query_tokens: int = 0
+    history_tokens: int = 0
+    
+    t_first_token_ms: float = 0.0
+    t_rerank_ms: float = 0.0
+    
+    stage_ms: Dict[str, float] = field(default_factory=dict)
+    
+    # uso real informado por la API (tokens_in/out lo usan cuando existe) y estimacion
+    # previa al envio de cada parte del prompt
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    prompt_tokens_est: Dict[str, int] = field(default_factory=dict)
+    cost_usd: float = 0.0
+
+# promedios de get_summary -> campo de QuestionMetrics (se acumulan en add_metric)
+SUMMARY_MEANS = {
+    "avg_t_retrieval_ms": "t_retrieval_ms",
+    "avg_t_generation_ms": "t_generation_ms",
+    "avg_t_first_token_ms": "t_first_token_ms",
+    "avg_t_rerank_ms": "t_rerank_ms",
+    "avg_tokens_in": "tokens_in",
+    "avg_tokens_out": "tokens_out",
+    "fidelity_rate": "fidelity_binary",
+    "avg_citation_correctness": "citations_correct_ratio",
+    "exact_match_rate": "em_binary",
+    "web_usage_rate": "web_used",
+    "answer_cache_hit_rate": "cache_hit",
+    "avg_prompt_tokens": "prompt_tokens",
+    "avg_completion_tokens": "completion_tokens",
+    "avg_cached_tokens": "cached_tokens",
+    "avg_cost_usd": "cost_usd",
+}
+# campos con p50/p95/p99 en get_summary (sketch de cuantiles, error relativo ~1%)
+SKETCH_FIELDS = ("t_retrieval_ms", "t_generation_ms", "t_total_ms", "tokens_in", "tokens_out")
+PERCENTILES = (50, 95, 99)
 
 class MetricsCollector:
-    """Colector de metricas para evaluacion."""
+    """
+    Colector de metricas para evaluacion.
+    Con `sink` cada metrica se agrega al archivo JSON Lines apenas se produce; `retention`
+    limita cuantas se conservan en memoria (None = todas). get_summary usa solo acumulados
+    (sumas y sketches de cuantiles), que se pueden combinar entre sesiones o agentes con merge.
+    Con `background` el puntaje (tokens, citas, fidelidad, EM) corre via submit en el hilo
+    de puntaje compartido del proceso, fuera del camino de la respuesta; flush y los save
+    esperan a que termine, get_summary no: resume lo ya puntuado.
+    """
     
-    def __init__(self):
-        self.metrics: List[QuestionMetrics] = []
+    def __init__(self, sink: Optional[JsonlSink] = None, retention: Optional[int] = None,
+                 background: bool = False, prices: Optional[Dict[str, float]] = None):
+        self.metrics: Deque[QuestionMetrics] = deque(maxlen=retention)
+        self.sink = sink
+        self._count = 0
+        self._sums = dict.fromkeys(SUMMARY_MEANS.values(), 0.0)
+        self.sketches = {name: QuantileSketch() for name in SKETCH_FIELDS}
         self.run_id = str(uuid.uuid4())[:8]
+        self.prices = prices
+        self.background = background
+        self._last: Optional[Future] = None
+        # protege los acumulados: el hilo de puntaje los actualiza mientras get_summary los lee
+        self._lock = threading.Lock()
+        self.embedding_cache_stats: Dict[str, int] = {}
         
         self.gold_answers = {
             "distancia coseno": r"(coseno|cos|similitud.*coseno|\sum.*x.*y|producto.*escalar)",
@@ -49,16 +155,34 @@ class MetricsCollector:
             "backpropagation": r"(propagacion.*atras|gradiente|derivada|cadena|chain.*rule)",
             "gradiente descendente": r"(gradient.*descent|descenso.*gradiente|optimizacion|minimizar)",
         }
+        for pattern in self.gold_answers.values():
+            _pattern(pattern)
         
-        try:
-            self.tokenizer = tiktoken.encoding_for_model("gpt-3.5-turbo")
-        except:
-            self.tokenizer = tiktoken.get_encoding("cl100k_base")
+        self.tokenizer = get_tokenizer()
+    
+    def submit(self, task: Callable[[], None]) -> Optional[Future]:
+        """Ejecuta `task` (p.ej. un add_metric) en el hilo de puntaje, o aqui mismo sin background."""
+        if not self.background:
+            task()
+            return None
+        future = _scoring_worker().submit(task)
+        future.add_done_callback(_report_error)
+        self._last = future
+        return future
+    
+    def wait(self):
+        """Espera a que se puntuen las metricas enviadas con submit (el hilo las procesa en orden)."""
+        last = self._last
+        if last is not None:
+            try:
+                last.result()
+            except Exception:
+                pass  # ya informado por _report_error
     
     def count_tokens(self, text: str) -> int:
         """Cuenta tokens usando tiktoken."""
         try:
-            return len(self.tokenizer.encode(text))
+            return len(self.tokenizer.encode(text, disallowed_special=()))
         except:
             return len(text.split())
     
@@ -67,10 +191,7 @@ class MetricsCollector:
         Extrae citas del formato: [1] archivo.pdf, p.5
         """
         citations = []
-        pattern = r'\[(\d+)\]\s*([^,]+),\s*p\.(\d+)'
-        matches = re.finditer(pattern, answer, re.IGNORECASE)
-        
-        for match in matches:
+        for match in CITATION_RE.finditer(answer):
             citations.append({
                 "file": match.group(2).strip(),
                 "page": int(match.group(3))
@@ -105,19 +226,22 @@ class MetricsCollector:
         
         return correct / len(cited)
     
-    def check_exact_match(self, question: str, answer: str) -> int:
+    def check_exact_match(self, question: str, answer: str, gold_pattern: Optional[str] = None) -> int:
         """
         Verifica si la respuesta contiene los conceptos clave para preguntas objetivas.
+        `gold_pattern` reemplaza a gold_answers para esta pregunta.
         """
         question_lower = question.lower()
         answer_lower = answer.lower()
         
-        from unidecode import unidecode
         answer_normalized = unidecode(answer_lower)
         
+        if gold_pattern:
+            return 1 if _pattern(gold_pattern).search(answer_normalized) else 0
+        
         for key, pattern in self.gold_answers.items():
             if key in question_lower:
-                if re.search(pattern, answer_normalized, re.IGNORECASE):
+                if _pattern(pattern).search(answer_normalized):
                     return 1
                 return 0
         
@@ -134,14 +258,27 @@ class MetricsCollector:
                    tokens_in: int,
                    tokens_out: int,
                    retrieved_docs: List[Dict],
-                   answer: str):
+                   answer: str,
+                   cache_hit: bool = False,
+                   query_tokens: int = 0,
+                   retrieval_query_tokens: int = 0,
+                   history_tokens: int = 0,
+                   t_first_token_ms: float = 0.0,
+                   t_rerank_ms: float = 0.0,
+                   stage_ms: Optional[Dict[str, float]] = None,
+                   llm_usage: Optional[Dict[str, int]] = None,
+                   prompt_tokens_est: Optional[Dict[str, int]] = None,
+                   gold_pattern: Optional[str] = None):
         """
         Agrega una metrica completa.
+        `llm_usage` es el uso de tokens que informo la API (ver llm_usage.tracking); con
+        `prices` (USD por millon de tokens) se calcula cost_usd.
         """
+        llm_usage = llm_usage or {}
         cited_docs = self.parse_citations(answer)
         fidelity = self.calculate_fidelity(cited_docs, retrieved_docs)
         citations_ratio = self.calculate_citation_correctness(cited_docs, retrieved_docs)
-        em = self.check_exact_match(question_text, answer)
+        em = self.check_exact_match(question_text, answer, gold_pattern)
         
         metric = QuestionMetrics(
             run_id=self.run_id,
@@ -161,20 +298,66 @@ class MetricsCollector:
             fidelity_binary=fidelity,
             citations_correct_ratio=citations_ratio,
             em_binary=em,
-            answer=answer
+            answer=answer,
+            cache_hit=cache_hit,
+            query_tokens=query_tokens,
+            retrieval_query_tokens=retrieval_query_tokens,
+            history_tokens=history_tokens,
+            t_first_token_ms=t_first_token_ms,
+            t_rerank_ms=t_rerank_ms,
+            stage_ms=stage_ms or {},
+            prompt_tokens=llm_usage.get("prompt_tokens", 0),
+            completion_tokens=llm_usage.get("completion_tokens", 0),
+            cached_tokens=llm_usage.get("cached_tokens", 0),
+            prompt_tokens_est=prompt_tokens_est or {},
+            cost_usd=cost_usd(llm_usage, self.prices) if self.prices else 0.0
         )
         
-        self.metrics.append(metric)
+        with self._lock:
+            self.metrics.append(metric)
+            self._count += 1
+            for name in self._sums:
+                self._sums[name] += float(getattr(metric, name))
+            for name, sketch in self.sketches.items():
+                sketch.add(getattr(metric, name))
+        if self.sink:
+            self.sink.write(asdict(metric))
+    
+    def aggregates(self) -> Dict[str, Any]:
+        """Acumulados serializables (JSON) para combinar con merge_aggregates."""
+        with self._lock:
+            return {"count": self._count, "sums": dict(self._sums),
+                    "sketches": {name: sketch.to_dict() for name, sketch in self.sketches.items()}}
+    
+    def merge_aggregates(self, data: Dict[str, Any]):
+        """Suma los acumulados de otra sesion o agente (resultado de aggregates())."""
+        with self._lock:
+            self._count += data["count"]
+            for name, value in data["sums"].items():
+                self._sums[name] = self._sums.get(name, 0.0) + value
+            for name, sketch in data["sketches"].items():
+                self.sketches.setdefault(name, QuantileSketch()).merge(QuantileSketch.from_dict(sketch))
+    
+    def merge(self, other: "MetricsCollector"):
+        self.merge_aggregates(other.aggregates())
+    
+    def flush(self):
+        """Escribe en el sink las metricas que quedan en el buffer."""
+        self.wait()
+        if self.sink:
+            self.sink.flush()
     
     def save_to_json(self, filepath: str = "metrics.json"):
-        """Guarda metricas en JSON."""
+        """Guarda en JSON las metricas retenidas en memoria."""
+        self.wait()
         with open(filepath, 'w', encoding='utf-8') as f:
             json.dump([asdict(m) for m in self.metrics], f, indent=2, ensure_ascii=False)
     
     def save_to_csv(self, filepath: str = "metrics.csv"):
-        """Guarda metricas en CSV."""
+        """Guarda en CSV las metricas retenidas en memoria."""
         import csv
         
+        self.wait()
         if not self.metrics:
             return
         
@@ -183,7 +366,10 @@ class MetricsCollector:
                 'run_id', 'timestamp', 'agent_mode', 'question_id', 'question_text',
                 'web_allowed', 'web_used', 't_retrieval_ms', 't_generation_ms', 't_total_ms',
                 'tokens_in', 'tokens_out', 'retrieved_docs', 'cited_docs',
-                'fidelity_binary', 'citations_correct_ratio', 'em_binary'
+                'fidelity_binary', 'citations_correct_ratio', 'em_binary', 'cache_hit',
+                'query_tokens', 'retrieval_query_tokens', 'history_tokens', 't_first_token_ms',
+                't_rerank_ms', 'stage_ms', 'prompt_tokens', 'completion_tokens', 'cached_tokens',
+                'prompt_tokens_est', 'cost_usd'
             ]
             
             writer = csv.DictWriter(f, fieldnames=fieldnames)
@@ -193,26 +379,34 @@ class MetricsCollector:
                 row = asdict(m)
                 row['retrieved_docs'] = json.dumps(row['retrieved_docs'])
                 row['cited_docs'] = json.dumps(row['cited_docs'])
+                row['stage_ms'] = json.dumps(row['stage_ms'])
+                row['prompt_tokens_est'] = json.dumps(row['prompt_tokens_est'])
                 row.pop('answer', None)
                 writer.writerow(row)
     
+    def update_embedding_cache_stats(self, stats: Dict[str, int]):
+        """Registra los contadores hit/miss de la cache de embeddings de consultas."""
+        self.embedding_cache_stats = dict(stats)
+    
     def get_summary(self) -> Dict[str, Any]:
-        """Genera resumen de metricas."""
-        if not self.metrics:
-            return {}
-        
-        import statistics
-        
-        return {
-            "total_questions": len(self.metrics),
-            "avg_t_retrieval_ms": statistics.mean(m.t_retrieval_ms for m in self.metrics),
-            "median_t_retrieval_ms": statistics.median(m.t_retrieval_ms for m in self.metrics),
-            "avg_t_generation_ms": statistics.mean(m.t_generation_ms for m in self.metrics),
-            "median_t_generation_ms": statistics.median(m.t_generation_ms for m in self.metrics),
-            "avg_tokens_in": statistics.mean(m.tokens_in for m in self.metrics),
-            "avg_tokens_out": statistics.mean(m.tokens_out for m in self.metrics),
-            "fidelity_rate": statistics.mean(m.fidelity_binary for m in self.metrics),
-            "avg_citation_correctness": statistics.mean(m.citations_correct_ratio for m in self.metrics),
-            "exact_match_rate": statistics.mean(m.em_binary for m in self.metrics),
-            "web_usage_rate": statistics.mean(m.web_used for m in self.metrics),
-        }
\ No newline at end of file
+        """Resumen de las metricas ya puntuadas (no espera a las pendientes; ver flush)."""
+        with self._lock:
+            if not self._count:
+                return {}
+            summary = {"total_questions": self._count, "total_cost_usd": self._sums["cost_usd"]}
+            summary.update({key: self._sums[name] / self._count for key, name in SUMMARY_MEANS.items()})
+            summary.update({
+                "median_t_retrieval_ms": self.sketches["t_retrieval_ms"].quantile(0.5),
+                "median_t_generation_ms": self.sketches["t_generation_ms"].quantile(0.5),
+            })
+            for name, sketch in self.sketches.items():
+                summary.update({f"p{p}_{name}": sketch.quantile(p / 100) for p in PERCENTILES})
+        
+        hits = self.embedding_cache_stats.get("hits", 0)
+        misses = self.embedding_cache_stats.get("misses", 0)
+        summary.update({
+            "embed_cache_hits": hits,
+            "embed_cache_misses": misses,
+            "embed_cache_hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+        })
+        return summary
\ No newline at end of file
@@ -0,0 +1,107 @@
+import os
+import json
+import atexit
+import threading
+from typing import List, Dict, Any, Iterator, Optional
+
+class JsonlSink:
+    """
+    Escribe registros como JSON Lines (un objeto por linea, solo append). Se acumulan en un
+    buffer y se escriben cada `flush_every` registros o, con un timer, a lo mas
+    `flush_interval_s` segundos despues del primero pendiente. Si la escritura falla los
+    registros quedan en el buffer para el siguiente intento.
+    Cuando el archivo supera `max_bytes` se rota: ruta -> ruta.1 -> ... -> ruta.<backups>.
+    Debe haber un solo sink por ruta en el proceso (ver resources.get_metrics_sink).
+    """
+
+    def __init__(self, path: str, flush_every: int = 20, flush_interval_s: float = 5.0,
+                 max_bytes: int = 10 * 1024 * 1024, backups: int = 5):
+        self.path = path
+        self.flush_every = flush_every
+        self.flush_interval_s = flush_interval_s
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._buffer: List[str] = []
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+        atexit.register(self.flush)
+
+    def write(self, record: Dict[str, Any]):
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self._buffer.append(line)
+            if len(self._buffer) >= self.flush_every:
+                self._flush_locked()
+            elif self._timer is None and self.flush_interval_s:
+                self._start_timer()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _start_timer(self):
+        self._timer = threading.Timer(self.flush_interval_s, self._flush_on_timer)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _flush_on_timer(self):
+        with self._lock:
+            self._timer = None
+            try:
+                self._flush_locked()
+            except OSError as e:
+                print(f"No se pudo escribir {self.path}: {e}; se reintenta en {self.flush_interval_s}s")
+                self._start_timer()
+
+    def _flush_locked(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._buffer:
+            return
+        data = "\n".join(self._buffer) + "\n"
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if self.max_bytes and os.path.exists(self.path) \
+                and os.path.getsize(self.path) + len(data.encode("utf-8")) > self.max_bytes:
+            self._rotate()
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(data)
+        # solo se descarta lo que quedo escrito
+        self._buffer.clear()
+
+    def _rotate(self):
+        # otro proceso con la misma ruta pudo rotar recien: lo que falta ya no se mueve
+        try:
+            if self.backups <= 0:
+                os.remove(self.path)
+                return
+            for i in range(self.backups - 1, 0, -1):
+                src = f"{self.path}.{i}"
+                if os.path.exists(src):
+                    os.replace(src, f"{self.path}.{i + 1}")
+            os.replace(self.path, f"{self.path}.1")
+        except FileNotFoundError:
+            pass
+
+    def close(self):
+        self.flush()
+        atexit.unregister(self.flush)
+
+def segments(path: str) -> List[str]:
+    """Archivos de un sink en orden cronologico (rotados primero)."""
+    rotated = []
+    i = 1
+    while os.path.exists(f"{path}.{i}"):
+        rotated.append(f"{path}.{i}")
+        i += 1
+    return list(reversed(rotated)) + ([path] if os.path.exists(path) else [])
+
+def iter_records(path: str) -> Iterator[Dict[str, Any]]:
+    """Lee todos los registros de un sink, incluidos los segmentos rotados."""
+    for segment in segments(path):
+        with open(segment, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
@@ -0,0 +1,485 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+from typing import List, Dict, Tuple, Any, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+
+NUMPY_SUBDIR = "numpy"  # dentro de DB_DIR
+VECTORS_FILE = "vectors.npy"
+META_FILE = "meta.npz"
+COLUMNS_FILE = "columns.json"
+HNSW_FILE = "hnsw.bin"
+QUANT_FILE = "vectors_q.npy"
+QUANT_META_FILE = "quant.json"
+
+# bits en 1 de cada valor de 16 bits, para la distancia de Hamming de los vectores binarios
+_POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+_POPCOUNT16 = (_POPCOUNT8[:, None] + _POPCOUNT8[None, :]).reshape(-1)
+
+def _pack_bits(v: np.ndarray) -> np.ndarray:
+    """Signo de cada dimension en bits, con un byte de relleno si hace falta para leerlo como uint16."""
+    packed = np.packbits(v > 0, axis=1)
+    if packed.shape[1] % 2:
+        packed = np.hstack([packed, np.zeros((len(packed), 1), dtype=np.uint8)])
+    return np.ascontiguousarray(packed)
+
+def pack_strings(values: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Concatena textos en un blob UTF-8 con offsets (columna de largo variable)."""
+    encoded = [v.encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+def unpack_string(blob: np.ndarray, offsets: np.ndarray, i: int) -> str:
+    return blob[offsets[i]:offsets[i + 1]].tobytes().decode("utf-8")
+
+def quantize(vectors: np.ndarray, method: str, dim: Optional[int] = None) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Cuantiza para la busqueda de candidatos: "int8" (simetrico, una escala por dimension) o
+    "binary" (signo, 1 bit por dimension). `dim` trunca a las primeras dimensiones
+    (Matryoshka) y renormaliza. Retorna la matriz y la escala (solo int8).
+    """
+    v = np.asarray(vectors[:, :dim] if dim else vectors, dtype=np.float32)
+    v = v / (np.linalg.norm(v, axis=1, keepdims=True) + 1e-12)
+    if method == "int8":
+        scale = np.abs(v).max(axis=0) / 127.0
+        scale[scale == 0] = 1.0
+        return np.round(v / scale).astype(np.int8), scale.astype(np.float32)
+    if method == "binary":
+        return _pack_bits(v), None
+    raise ValueError(f"Cuantizacion desconocida: {method}")
+
+class NumpyVectorStore:
+    """
+    Vector store en proceso: embeddings en una matriz NumPy (float32 o float16) abierta con
+    memory map, texto y metadata en columnas compactas (metadata codificada por diccionario)
+    y busqueda exacta por productos punto, o aproximada con HNSW (hnswlib) si index="hnsw".
+    Con `quantization` ("int8" o "binary", opcionalmente truncado a `truncate_dim`) la busqueda
+    flat elige k * rescore_factor candidatos sobre la matriz cuantizada y los reordena con
+    los vectores completos, de los que solo se leen esas filas del memory map.
+    Las distancias son L2 al cuadrado, igual que Chroma, para que rag_tools no cambie.
+    """
+
+    def __init__(self, path: str, dtype: str = "float32", index: str = "flat",
+                 hnsw_m: int = 16, hnsw_ef_construction: int = 200, hnsw_ef: int = 64,
+                 quantization: Optional[str] = None, truncate_dim: Optional[int] = None,
+                 rescore_factor: int = 4):
+        self._options = dict(dtype=dtype, index=index, hnsw_m=hnsw_m, hnsw_ef_construction=hnsw_ef_construction,
+                             hnsw_ef=hnsw_ef, quantization=quantization, truncate_dim=truncate_dim,
+                             rescore_factor=rescore_factor)
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.index = index
+        self.hnsw_m = hnsw_m
+        self.hnsw_ef_construction = hnsw_ef_construction
+        self.hnsw_ef = hnsw_ef
+        self.quantization = quantization
+        self.truncate_dim = truncate_dim
+        self.rescore_factor = rescore_factor
+        self.vectors = np.zeros((0, 0), dtype=self.dtype)
+        self._q: Optional[np.ndarray] = None
+        self._q_scale: Optional[np.ndarray] = None
+        self._sq_norms = np.zeros(0, dtype=np.float32)
+        self._meta: Dict[str, np.ndarray] = {}
+        self._vocab: Dict[str, list] = {}
+        self._hnsw = None
+        self._row_of: Optional[Dict[str, int]] = None
+        # filas editables (solo mientras build_index modifica el indice)
+        self._rows: Optional[Tuple[List[str], List[str], List[Dict[str, Any]]]] = None
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> "NumpyVectorStore":
+        store = cls(path, **kwargs)
+        vectors_path = os.path.join(path, VECTORS_FILE)
+        if not os.path.exists(vectors_path):
+            return store
+        store.vectors = np.load(vectors_path, mmap_mode="r")
+        with np.load(os.path.join(path, META_FILE)) as meta:
+            store._meta = {key: meta[key] for key in meta.files}
+        with open(os.path.join(path, COLUMNS_FILE), 'r', encoding='utf-8') as f:
+            store._vocab = json.load(f)
+        store._sq_norms = store._meta["sq_norms"]
+        hnsw_path = os.path.join(path, HNSW_FILE)
+        if store.index == "hnsw" and len(store.vectors):
+            import hnswlib
+            if os.path.exists(hnsw_path):
+                store._hnsw = hnswlib.Index(space="l2", dim=store.vectors.shape[1])
+                store._hnsw.load_index(hnsw_path, max_elements=len(store.vectors))
+            else:
+                # el indice se guardo como flat: se construye el grafo en memoria
+                store._hnsw = store._build_hnsw(store.vectors)
+            store._hnsw.set_ef(store.hnsw_ef)
+        elif store.quantization and len(store.vectors):
+            store._load_quantized()
+        return store
+
+    def _load_quantized(self):
+        """Usa la matriz cuantizada guardada si coincide con la configuracion; si no, la calcula."""
+        meta_path = os.path.join(self.path, QUANT_META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+            if (saved["method"], saved["dim"]) == (self.quantization, self.truncate_dim):
+                self._q = np.load(os.path.join(self.path, QUANT_FILE), mmap_mode="r")
+                self._q_scale = np.asarray(saved["scale"], dtype=np.float32) if saved["scale"] else None
+                return
+        self._q, self._q_scale = quantize(self.vectors, self.quantization, self.truncate_dim)
+
+    def _build_hnsw(self, vectors: np.ndarray):
+        import hnswlib
+        hnsw = hnswlib.Index(space="l2", dim=vectors.shape[1])
+        hnsw.init_index(max_elements=len(vectors), ef_construction=self.hnsw_ef_construction, M=self.hnsw_m)
+        hnsw.add_items(np.asarray(vectors, dtype=np.float32), np.arange(len(vectors)))
+        return hnsw
+
+    def count(self) -> int:
+        return len(self._rows[0]) if self._rows is not None else len(self.vectors)
+
+    # --- lectura ---
+
+    def _document(self, i: int) -> Document:
+        if self._rows is not None:
+            return Document(page_content=self._rows[1][i], metadata=dict(self._rows[2][i]))
+        metadata = {}
+        for key, vocab in self._vocab.items():
+            code = self._meta[f"col__{key}"][i]
+            if code >= 0:
+                metadata[key] = vocab[code]
+        return Document(page_content=unpack_string(self._meta["text_blob"], self._meta["text_off"], i),
+                        metadata=metadata)
+
+    def _query_flat(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        # ||v - q||^2 = ||v||^2 - 2 v.q + ||q||^2 para todas las filas a la vez
+        dots = np.asarray(self.vectors @ queries.T, dtype=np.float32).T
+        dists = self._sq_norms[None, :] - 2 * dots + np.sum(queries * queries, axis=1)[:, None]
+        if k < dists.shape[1]:
+            top = np.argpartition(dists, k, axis=1)[:, :k]
+        else:
+            top = np.tile(np.arange(dists.shape[1]), (len(queries), 1))
+        top_d = np.take_along_axis(dists, top, axis=1)
+        order = np.argsort(top_d, axis=1)
+        return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_d, order, axis=1)
+
+    def _query_quantized(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Candidatos sobre la matriz cuantizada y reordenamiento exacto (rescoring)."""
+        n_candidates = min(len(self.vectors), k * max(self.rescore_factor, 1))
+        q = queries[:, :self.truncate_dim] if self.truncate_dim else queries
+        q = q / (np.linalg.norm(q, axis=1, keepdims=True) + 1e-12)
+        if self.quantization == "int8":
+            approx = np.asarray(self._q @ (q * self._q_scale).T, dtype=np.float32).T
+        else:
+            matrix = self._q.view(np.uint16)
+            approx = np.stack([-_POPCOUNT16[matrix ^ b].sum(axis=1, dtype=np.int32)
+                               for b in _pack_bits(q).view(np.uint16)])
+        if n_candidates < approx.shape[1]:
+            candidates = np.argpartition(-approx, n_candidates - 1, axis=1)[:, :n_candidates]
+        else:
+            candidates = np.tile(np.arange(approx.shape[1]), (len(queries), 1))
+
+        labels = np.zeros((len(queries), k), dtype=np.int64)
+        dists = np.zeros((len(queries), k), dtype=np.float32)
+        for row, (query, cand) in enumerate(zip(queries, candidates)):
+            cand = np.sort(cand)  # lectura secuencial del memory map
+            full = np.asarray(self.vectors[cand], dtype=np.float32)
+            d = self._sq_norms[cand] - 2 * (full @ query) + query @ query
+            order = np.argsort(d)[:k]
+            labels[row], dists[row] = cand[order], d[order]
+        return labels, dists
+
+    def search_many(self, query_vectors: List[List[float]], k: int) -> List[List[Tuple[Document, float]]]:
+        """Top-k de varias consultas con una sola multiplicacion de matrices."""
+        n = self.count()
+        if n == 0 or not len(query_vectors):
+            return [[] for _ in query_vectors]
+        if self._rows is not None:
+            raise RuntimeError("El indice tiene cambios sin guardar; llamar save() antes de buscar")
+        k = min(k, n)
+        queries = np.asarray(query_vectors, dtype=np.float32)
+        if self._hnsw is not None:
+            labels, dists = self._hnsw.knn_query(queries, k=k)
+        elif self._q is not None:
+            labels, dists = self._query_quantized(queries, k)
+        else:
+            labels, dists = self._query_flat(queries, k)
+        return [
+            [(self._document(int(i)), float(max(d, 0.0))) for i, d in zip(row_ids, row_dists)]
+            for row_ids, row_dists in zip(labels, dists)
+        ]
+
+    def similarity_search_by_vector_with_relevance_scores(self, embedding: List[float], k: int = 4):
+        """Misma firma que Chroma: retorna (Document, distancia L2 al cuadrado)."""
+        return self.search_many([embedding], k)[0]
+
+    def get_vectors(self, ids: List[str]) -> List[Optional[List[float]]]:
+        """Embeddings guardados de los chunks `ids` (None si el ID no esta en el indice)."""
+        if self._rows is not None:
+            raise RuntimeError("El indice tiene cambios sin guardar; llamar save() antes de buscar")
+        if self._row_of is None:
+            self._row_of = {unpack_string(self._meta["id_blob"], self._meta["id_off"], i): i
+                            for i in range(len(self.vectors))}
+        rows = [self._row_of.get(chunk_id) for chunk_id in ids]
+        return [np.asarray(self.vectors[i], dtype=np.float32).tolist() if i is not None else None for i in rows]
+
+    def get_all(self) -> Tuple[List[str], List[str], List[Dict[str, Any]]]:
+        """IDs, textos y metadata de todas las filas."""
+        if self._rows is not None:
+            return list(self._rows[0]), list(self._rows[1]), list(self._rows[2])
+        n = len(self.vectors)
+        ids = [unpack_string(self._meta["id_blob"], self._meta["id_off"], i) for i in range(n)]
+        docs = [self._document(i) for i in range(n)]
+        return ids, [d.page_content for d in docs], [d.metadata for d in docs]
+
+    # --- escritura (build_index) ---
+
+    def _materialize(self):
+        if self._rows is not None:
+            return
+        self._rows = self.get_all()
+        self._row_of = None
+        self.vectors = np.array(self.vectors, dtype=self.dtype) if len(self.vectors) else self.vectors
+        self._hnsw = None
+        self._q = None
+
+    def upsert(self, ids: List[str], embeddings: List[List[float]],
+               documents: List[str], metadatas: List[Dict[str, Any]]):
+        self._materialize()
+        row_ids, texts, metas = self._rows
+        new = np.asarray(embeddings, dtype=self.dtype)
+        if not len(row_ids):
+            self.vectors = np.zeros((0, new.shape[1]), dtype=self.dtype)
+        position = {chunk_id: i for i, chunk_id in enumerate(row_ids)}
+        appended = []
+        latest = {chunk_id: j for j, chunk_id in enumerate(ids)}  # si un id se repite gana el ultimo
+        for chunk_id, j in latest.items():
+            i = position.get(chunk_id)
+            if i is None:
+                position[chunk_id] = len(row_ids)
+                row_ids.append(chunk_id)
+                texts.append(documents[j])
+                metas.append(metadatas[j] or {})
+                appended.append(j)
+            else:
+                texts[i] = documents[j]
+                metas[i] = metadatas[j] or {}
+                self.vectors[i] = new[j]
+        if appended:
+            self.vectors = np.vstack([self.vectors, new[appended]])
+
+    def delete(self, ids: List[str]):
+        self._materialize()
+        row_ids, texts, metas = self._rows
+        drop = set(ids)
+        keep = [i for i, chunk_id in enumerate(row_ids) if chunk_id not in drop]
+        self._rows = ([row_ids[i] for i in keep], [texts[i] for i in keep], [metas[i] for i in keep])
+        self.vectors = self.vectors[keep]
+
+    def delete_collection(self):
+        self._rows = ([], [], [])
+        self.vectors = np.zeros((0, 0), dtype=self.dtype)
+        self._hnsw = None
+        self._q = None
+
+    def save(self):
+        """Escribe matriz, columnas y (si corresponde) HNSW; reemplaza los archivos al final."""
+        if self._rows is None:
+            return
+        row_ids, texts, metas = self._rows
+        os.makedirs(self.path, exist_ok=True)
+        vectors = np.ascontiguousarray(self.vectors, dtype=self.dtype)
+        if not len(row_ids):
+            vectors = np.zeros((0, 0), dtype=self.dtype)
+
+        vocab: Dict[str, list] = {}
+        codes: Dict[str, Dict[Any, int]] = {}
+        for meta in metas:
+            for key, value in meta.items():
+                col = codes.setdefault(key, {})
+                if value not in col:
+                    col[value] = len(col)
+        for key, col in codes.items():
+            vocab[key] = list(col)
+        columns = {
+            f"col__{key}": np.array([col.get(m[key], -1) if key in m else -1 for m in metas], dtype=np.int32)
+            for key, col in codes.items()
+        }
+        text_blob, text_off = pack_strings(texts)
+        id_blob, id_off = pack_strings(row_ids)
+        sq_norms = np.sum(vectors.astype(np.float32) ** 2, axis=1) if len(row_ids) else np.zeros(0, np.float32)
+
+        def tmp(name):
+            return os.path.join(self.path, f".{name}.tmp")
+
+        with open(tmp(VECTORS_FILE), 'wb') as f:
+            np.save(f, vectors)
+        with open(tmp(META_FILE), 'wb') as f:
+            np.savez(f, text_blob=text_blob, text_off=text_off, id_blob=id_blob, id_off=id_off,
+                     sq_norms=sq_norms.astype(np.float32), **columns)
+        with open(tmp(COLUMNS_FILE), 'w', encoding='utf-8') as f:
+            json.dump(vocab, f, ensure_ascii=False)
+        names = [VECTORS_FILE, META_FILE, COLUMNS_FILE]
+        hnsw_path = os.path.join(self.path, HNSW_FILE)
+        if self.index == "hnsw" and len(row_ids):
+            self._build_hnsw(vectors).save_index(tmp(HNSW_FILE))
+            names.append(HNSW_FILE)
+        elif os.path.exists(hnsw_path):
+            os.remove(hnsw_path)
+        if self.quantization and len(row_ids):
+            q, scale = quantize(vectors, self.quantization, self.truncate_dim)
+            with open(tmp(QUANT_FILE), 'wb') as f:
+                np.save(f, q)
+            with open(tmp(QUANT_META_FILE), 'w', encoding='utf-8') as f:
+                json.dump({"method": self.quantization, "dim": self.truncate_dim,
+                           "scale": scale.tolist() if scale is not None else None}, f)
+            names += [QUANT_FILE, QUANT_META_FILE]
+        else:
+            for name in (QUANT_FILE, QUANT_META_FILE):
+                if os.path.exists(os.path.join(self.path, name)):
+                    os.remove(os.path.join(self.path, name))
+        for name in names:
+            os.replace(tmp(name), os.path.join(self.path, name))
+
+        # se reabre en modo lectura (memory map)
+        fresh = NumpyVectorStore.load(self.path, **self._options)
+        self.__dict__.update(fresh.__dict__)
+
+def from_chroma(chroma_dir: str, path: str, **kwargs) -> NumpyVectorStore:
+    """Copia un indice Chroma existente (sin volver a embeber)."""
+    from langchain_community.vectorstores import Chroma
+    data = Chroma(persist_directory=chroma_dir)._collection.get(include=["embeddings", "documents", "metadatas"])
+    store = NumpyVectorStore(path, **kwargs)
+    store.delete_collection()
+    if data["ids"]:
+        store.upsert(data["ids"], data["embeddings"], data["documents"], data["metadatas"])
+    store.save()
+    return store
+
+def _probe(backend: str, db_dir: str, queries_path: str, k: int, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    """Carga un backend y mide latencia por consulta (corre en un proceso aparte para medir RAM)."""
+    from metrics import peak_rss_mb
+    queries = np.load(queries_path)
+    start = time.perf_counter()
+    if backend == "chroma":
+        from langchain_community.vectorstores import Chroma
+        collection = Chroma(persist_directory=db_dir)._collection
+        search = lambda q: collection.query(query_embeddings=[q.tolist()], n_results=k,
+                                            include=["documents", "metadatas", "distances"])
+    else:
+        store = NumpyVectorStore.load(db_dir, **kwargs)
+        search = lambda q: store.search_many([q], k)
+    load_ms = (time.perf_counter() - start) * 1000
+    search(queries[0])
+    latencies = []
+    for q in queries:
+        t0 = time.perf_counter()
+        search(q)
+        latencies.append((time.perf_counter() - t0) * 1000)
+    return {
+        "load_ms": load_ms,
+        "query_p50_ms": float(np.percentile(latencies, 50)),
+        "query_p95_ms": float(np.percentile(latencies, 95)),
+        "max_rss_mb": peak_rss_mb(),
+    }
+
+def _sample_queries(vectors: np.ndarray, n_queries: int) -> np.ndarray:
+    """Consultas de prueba: vectores del propio indice con algo de ruido, normalizados."""
+    rng = np.random.default_rng(0)
+    rows = rng.integers(0, len(vectors), n_queries)
+    queries = np.asarray(vectors[rows], dtype=np.float32) + rng.normal(0, 0.01, (n_queries, vectors.shape[1]))
+    return (queries / np.linalg.norm(queries, axis=1, keepdims=True)).astype(np.float32)
+
+def quantization_report(path: str, variants: List[Dict[str, Any]], n_queries: int = 200,
+                        k: int = 8) -> Dict[str, Dict[str, Any]]:
+    """
+    recall@k de cada variante cuantizada frente a la busqueda exacta en float, con el tamano
+    de la matriz que se recorre en cada consulta y la latencia por consulta.
+    """
+    exact = NumpyVectorStore.load(path)
+    queries = _sample_queries(exact.vectors, n_queries)
+    k = min(k, len(exact.vectors))
+
+    def run(store, search):
+        labels, latencies = [], []
+        for q in queries:
+            t0 = time.perf_counter()
+            labels.append(search(q[None, :], k)[0][0])
+            latencies.append((time.perf_counter() - t0) * 1000)
+        return np.array(labels), float(np.percentile(latencies, 50))
+
+    truth, exact_ms = run(exact, exact._query_flat)
+    results = {"float": {"recall_at_k": 1.0, "search_matrix_mb": exact.vectors.nbytes / 2**20,
+                         "query_p50_ms": exact_ms}}
+    for variant in variants:
+        store = NumpyVectorStore.load(path, **variant)
+        labels, ms = run(store, store._query_quantized)
+        recall = np.mean([len(set(a) & set(b)) / k for a, b in zip(labels, truth)])
+        name = f"{variant['quantization']}" + (f"@{variant['truncate_dim']}" if variant.get("truncate_dim") else "")
+        name += f" x{variant.get('rescore_factor', 4)}"
+        results[name] = {"recall_at_k": float(recall), "search_matrix_mb": store._q.nbytes / 2**20,
+                         "query_p50_ms": ms}
+    return results
+
+def benchmark(chroma_dir: str, numpy_dir: str, n_queries: int = 200, k: int = 8,
+              variants: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, Dict[str, Any]]:
+    """Compara Chroma con el store NumPy usando vectores del propio indice (con ruido) como consultas."""
+    variants = variants or {"numpy-flat": {"index": "flat"}}
+    queries = _sample_queries(NumpyVectorStore.load(numpy_dir).vectors, n_queries)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        queries_path = os.path.join(tmp, "queries.npy")
+        np.save(queries_path, queries.astype(np.float32))
+        runs = [("chroma", chroma_dir, {})] + [(name, numpy_dir, kw) for name, kw in variants.items()]
+        for name, db_dir, kw in runs:
+            out = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--probe", "chroma" if name == "chroma" else "numpy",
+                 "--db", db_dir, "--queries-file", queries_path, "--k", str(k), "--kwargs", json.dumps(kw)],
+                cwd=os.path.dirname(os.path.abspath(__file__)), check=True, capture_output=True, text=True,
+            )
+            results[name] = json.loads(out.stdout.strip().splitlines()[-1])
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Store NumPy: convertir desde Chroma y comparar latencia/RAM")
+    parser.add_argument("--from-chroma", action="store_true", help="copia el indice Chroma de DB_DIR al store NumPy")
+    parser.add_argument("--bench", action="store_true", help="compara Chroma con NumPy flat y HNSW")
+    parser.add_argument("--quant-bench", action="store_true",
+                        help="recall@k, tamano y latencia de int8/binario (con y sin truncar) frente a float")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=8)
+    parser.add_argument("--probe", help=argparse.SUPPRESS)
+    parser.add_argument("--db", help=argparse.SUPPRESS)
+    parser.add_argument("--queries-file", help=argparse.SUPPRESS)
+    parser.add_argument("--kwargs", type=json.loads, default={}, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.probe:
+        print(json.dumps(_probe(args.probe, args.db, args.queries_file, args.k, args.kwargs)))
+        sys.exit(0)
+
+    from settings import (DB_DIR, NUMPY_STORE_DTYPE, NUMPY_STORE_INDEX, NUMPY_STORE_QUANTIZATION,
+                          NUMPY_STORE_TRUNCATE_DIM, NUMPY_STORE_RESCORE_FACTOR)
+    NUMPY_STORE_DIR = os.path.join(DB_DIR, NUMPY_SUBDIR)
+    if args.from_chroma:
+        store = from_chroma(DB_DIR, NUMPY_STORE_DIR, dtype=NUMPY_STORE_DTYPE, index=NUMPY_STORE_INDEX,
+                            quantization=NUMPY_STORE_QUANTIZATION, truncate_dim=NUMPY_STORE_TRUNCATE_DIM,
+                            rescore_factor=NUMPY_STORE_RESCORE_FACTOR)
+        print(f"{store.count()} chunks copiados a {NUMPY_STORE_DIR}")
+    if args.bench:
+        results = benchmark(DB_DIR, NUMPY_STORE_DIR, n_queries=args.queries, k=args.k,
+                            variants={"numpy-flat": {"index": "flat"}, "numpy-hnsw": {"index": "hnsw"}})
+        print(f"{'backend':<12} {'carga ms':>9} {'p50 ms':>8} {'p95 ms':>8} {'RSS MB':>8}")
+        for name, r in results.items():
+            print(f"{name:<12} {r['load_ms']:>9.1f} {r['query_p50_ms']:>8.2f} {r['query_p95_ms']:>8.2f} {r['max_rss_mb']:>8.0f}")
+    if args.quant_bench:
+        dim = NumpyVectorStore.load(NUMPY_STORE_DIR).vectors.shape[1]
+        variants = [{"quantization": m, "truncate_dim": d, "rescore_factor": r}
+                    for m in ("int8", "binary") for d in (None, dim // 3) for r in (1, 4)]
+        results = quantization_report(NUMPY_STORE_DIR, variants, n_queries=args.queries, k=args.k)
+        print(f"{'variante':<18} {'recall@' + str(args.k):>9} {'matriz MB':>10} {'p50 ms':>8}")
+        for name, r in results.items():
+            print(f"{name:<18} {r['recall_at_k']:>9.3f} {r['search_matrix_mb']:>10.2f} {r['query_p50_ms']:>8.3f}")
@@ -0,0 +1,123 @@
+import re
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple, Dict
+
+from unidecode import unidecode
+from langchain_core.prompts import PromptTemplate
+
+from settings import CHAT_MODEL, QUERY_REWRITE_MODE
+from resources import get_chat
+from llm_usage import tracking
+
+# Se aplica sobre la pregunta sin tildes y en minusculas. Solo cuenta el comienzo:
+# un conector ("y ...", "pero ...") o una pregunta suelta ("¿por que?").
+FOLLOWUP_PATTERN = re.compile(
+    r"^(y|pero|entonces|tambien|ademas|o sea)\b|"
+    r"^(por que|como|como asi|cual|cuales|y eso)$",
+)
+# Pronombre o posesivo que remite a la pregunta anterior ("eso ...", "¿cual es su ...?").
+# Se aplica en minusculas pero con tildes: sin ellas "¿estás seguro?" pasaria por el
+# demostrativo "estas". Si se escribio sin tildes, "estas" seguido de un adjetivo de
+# estado, un participio o un gerundio se toma como el verbo estar.
+_ESTAR = r"(?!\s+(seguro|segura|seguros|seguras|bien|mal|claro|clara|listo|lista|\w+(ado|ido|ando|iendo)s?\b))"
+_PRONOUN = (r"(eso|esto|ese|ése|esa|ésa|esos|ésos|esas|ésas|estos|éstos|éstas|ello|lo anterior|lo mismo|su|sus|"
+            r"estas\b" + _ESTAR + r")")
+PRONOUN_PATTERN = re.compile(
+    r"^((por qu[eé]|para qu[eé]|c[oó]mo|cu[aá]l|cu[aá]les|qu[eé])\s+((es|son|fue|era|ser[ií]a|ser[ií]an)\s+)?)?"
+    + _PRONOUN + r"\b",
+)
+_LEADING_PUNCT = " \t\"'([?!¿¡"
+_TRAILING_PUNCT = " \t\"').]?!."
+
+MAX_INHERITED_WORDS = 24
+REWRITE_CACHE_SIZE = 512
+
+REWRITE_PROMPT = PromptTemplate.from_template("""
+Reescribe la pregunta actual como una consulta de busqueda corta e independiente,
+usando la pregunta anterior solo para resolver referencias. Responde solo con la consulta.
+
+Pregunta anterior: {previous}
+Pregunta actual: {question}
+
+Consulta:
+""")
+
+def _lower(question: str) -> str:
+    return " ".join(question.lower().strip(_LEADING_PUNCT).rstrip(_TRAILING_PUNCT).split())
+
+def is_followup(question: str) -> bool:
+    lowered = _lower(question)
+    return bool(PRONOUN_PATTERN.search(lowered) or FOLLOWUP_PATTERN.search(unidecode(lowered)))
+
+# reescrituras LLM ya hechas, compartidas por la version sincrona y la asincrona;
+# solo se guardan las exitosas, asi un error transitorio no queda cacheado
+_rewrites: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+_rewrites_lock = threading.Lock()
+
+def _cached_rewrite(key: Tuple[str, str]) -> Optional[str]:
+    with _rewrites_lock:
+        if key in _rewrites:
+            _rewrites.move_to_end(key)
+        return _rewrites.get(key)
+
+def _store_rewrite(key: Tuple[str, str], rewritten: str) -> str:
+    with _rewrites_lock:
+        _rewrites[key] = rewritten
+        _rewrites.move_to_end(key)
+        while len(_rewrites) > REWRITE_CACHE_SIZE:
+            _rewrites.popitem(last=False)
+    return rewritten
+
+def _rewrite_llm(previous: str, question: str) -> str:
+    key = (previous, question)
+    cached = _cached_rewrite(key)
+    if cached is not None:
+        return cached
+    llm = get_chat(CHAT_MODEL, temperature=0)
+    rewritten = llm.invoke(REWRITE_PROMPT.format(previous=previous, question=question)).content.strip()
+    return _store_rewrite(key, rewritten or question)
+
+async def _arewrite_llm(previous: str, question: str) -> str:
+    key = (previous, question)
+    cached = _cached_rewrite(key)
+    if cached is not None:
+        return cached
+    llm = get_chat(CHAT_MODEL, temperature=0)
+    rewritten = (await llm.ainvoke(REWRITE_PROMPT.format(previous=previous, question=question))).content.strip()
+    return _store_rewrite(key, rewritten or question)
+
+def _rewrite_heuristic(previous: str, question: str) -> str:
+    # se acota la parte heredada para que una cadena de seguimientos no crezca sin limite
+    return " ".join(previous.split()[:MAX_INHERITED_WORDS] + [question])
+
+def condense_query(question: str, previous: Optional[str], mode: str = QUERY_REWRITE_MODE,
+                   usage: Optional[Dict[str, int]] = None) -> str:
+    """
+    Convierte la pregunta en una consulta de recuperacion independiente y corta.
+    Si no hubo turno anterior o no es una pregunta de seguimiento se usa tal cual; si
+    lo es, se resuelve con la consulta anterior (heuristica local o llamada LLM cacheada).
+    Los tokens de la llamada LLM se suman a `usage` (ver llm_usage.new_usage).
+    """
+    if not previous or not is_followup(question):
+        return question
+    if mode == "llm":
+        try:
+            with tracking(usage):
+                return _rewrite_llm(previous, question)
+        except Exception:
+            return _rewrite_heuristic(previous, question)
+    return _rewrite_heuristic(previous, question)
+
+async def acondense_query(question: str, previous: Optional[str], mode: str = QUERY_REWRITE_MODE,
+                          usage: Optional[Dict[str, int]] = None) -> str:
+    """Version asincrona de condense_query (la llamada LLM no bloquea el event loop)."""
+    if not previous or not is_followup(question):
+        return question
+    if mode == "llm":
+        try:
+            with tracking(usage):
+                return await _arewrite_llm(previous, question)
+        except Exception:
+            return _rewrite_heuristic(previous, question)
+    return _rewrite_heuristic(previous, question)
@@ -1,16 +1,155 @@
 import os
 import time
-from typing import List, Tuple
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain_community.vectorstores import Chroma
+import asyncio
+import numpy as np
+from typing import List, Tuple, Optional, Iterator, AsyncIterator, Dict
 from langchain_core.documents import Document
 from langchain_core.prompts import PromptTemplate
 
-from settings import DB_DIR, EMBED_MODEL, CHAT_MODEL
+from settings import (
+    DB_DIR, EMBED_MODEL, CHAT_MODEL, AGENT_MODE, ANSWER_CACHE_ENABLED, RETRIEVAL_SCORE_THRESHOLD,
+    CONTEXT_TOKEN_BUDGET, CHUNK_TOKENS_EST, RETRIEVAL_MODE, RRF_K, LEXICAL_FAST_MARGIN,
+    RERANK_ENABLED, RERANK_CANDIDATES,
+)
+from resources import (
+    get_vectorstore, get_embeddings, get_chat, get_answer_cache, get_lexical_index, get_reranker,
+    get_index_version,
+)
+from context_packer import pack_context, candidates_needed, count_tokens, SEPARATOR
+from llm_usage import new_usage, tracked, atracked
+from tracing import Tracer, span, event
 
 def _load_vs():
-    emb = OpenAIEmbeddings(model=EMBED_MODEL)
-    return Chroma(persist_directory=DB_DIR, embedding_function=emb)
+    return get_vectorstore(DB_DIR, EMBED_MODEL)
+
+def _similarity(distance: float) -> float:
+    """
+    Chroma usa distancia L2 al cuadrado; con embeddings normalizados (OpenAI)
+    equivale a similitud coseno = 1 - d/2.
+    """
+    return 1.0 - distance / 2.0
+
+def _to_scored(results: List[Tuple[Document, float]]) -> List[Tuple[Document, float]]:
+    """Convierte distancias en similitud coseno (el umbral se aplica despues de fusionar)."""
+    return [(doc, _similarity(distance)) for doc, distance in results]
+
+def _apply_threshold(scored: List[Tuple[Document, Optional[float]]]) -> List[Tuple[Document, Optional[float]]]:
+    """
+    Umbral unico de relevancia: descarta lo que tiene similitud coseno bajo
+    RETRIEVAL_SCORE_THRESHOLD, venga del vector store o solo de BM25. Sin similitud
+    conocida (indice BM25 sin IDs de chunk) tampoco pasa el umbral.
+    """
+    if RETRIEVAL_SCORE_THRESHOLD is None:
+        return scored
+    return [(doc, score) for doc, score in scored
+            if score is not None and score >= RETRIEVAL_SCORE_THRESHOLD]
+
+def _with_rank_score(doc: Document, rank_score: float) -> Document:
+    """Copia del fragmento con el score que decidio su posicion (RRF o BM25) en la metadata."""
+    return Document(page_content=doc.page_content, metadata={**doc.metadata, "rank_score": rank_score})
+
+def _search(vs, query_vector: List[float], k: int) -> List[Tuple[Document, float]]:
+    """Busqueda con similitud real."""
+    return _to_scored(vs.similarity_search_by_vector_with_relevance_scores(query_vector, k=k))
+
+def _search_many(vs, query_vectors: List[List[float]], k: int) -> List[List[Tuple[Document, float]]]:
+    """Varias busquedas en una sola consulta al vector store."""
+    if hasattr(vs, "search_many"):
+        return [_to_scored(results) for results in vs.search_many(query_vectors, k)]
+    res = vs._collection.query(
+        query_embeddings=query_vectors,
+        n_results=k,
+        include=["documents", "metadatas", "distances"],
+    )
+    return [
+        _to_scored([(Document(page_content=text, metadata=meta or {}), dist)
+                    for text, meta, dist in zip(texts, metas, dists)])
+        for texts, metas, dists in zip(res["documents"], res["metadatas"], res["distances"])
+    ]
+
+def _lexical(query: str, k: int) -> Tuple[List[Tuple[Document, float]], bool]:
+    """
+    Resultados BM25 (solo con RETRIEVAL_MODE = "hybrid") y si bastan por si solos: el mejor
+    contiene todos los terminos de la consulta y supera al segundo por LEXICAL_FAST_MARGIN.
+    """
+    lex = get_lexical_index(DB_DIR) if RETRIEVAL_MODE == "hybrid" else None
+    if lex is None:
+        return [], False
+    hits, coverage = lex.search(query, k)
+    confident = (LEXICAL_FAST_MARGIN is not None and bool(hits) and coverage >= 1.0
+                 and (len(hits) == 1 or hits[0][1] >= LEXICAL_FAST_MARGIN * hits[1][1]))
+    return hits, confident
+
+def _lexical_only(vs, query_vector: List[float],
+                  hits: List[Tuple[Document, float]]) -> List[Tuple[Document, Optional[float]]]:
+    """
+    Camino rapido: se usa el orden BM25 sin busqueda vectorial ni fusion; rank_score es
+    el BM25 relativo al mejor (1.0) y el score, la similitud coseno con su embedding guardado.
+    """
+    top = hits[0][1]
+    sims = _lexical_similarity(vs, query_vector, [doc for doc, _ in hits])
+    return [(_with_rank_score(doc, score / top), sim) for (doc, score), sim in zip(hits, sims)]
+
+def _stored_vectors(vs, ids: List[str]) -> List[Optional[List[float]]]:
+    """Embeddings guardados de los chunks `ids`, en el mismo orden (None si no estan)."""
+    if hasattr(vs, "get_vectors"):
+        return vs.get_vectors(ids)
+    res = vs._collection.get(ids=ids, include=["embeddings"])
+    by_id = dict(zip(res["ids"], res["embeddings"]))
+    return [by_id.get(chunk_id) for chunk_id in ids]
+
+def _lexical_similarity(vs, query_vector: List[float], docs: List[Document]) -> List[Optional[float]]:
+    """Similitud coseno de fragmentos que solo encontro BM25, con sus embeddings del indice."""
+    ids = [doc.metadata.get("chunk_id") for doc in docs]
+    known = [chunk_id for chunk_id in ids if chunk_id is not None]
+    stored = zip(known, _stored_vectors(vs, known)) if known else []
+    found = {chunk_id: vector for chunk_id, vector in stored if vector is not None}
+    if not found:
+        return [None] * len(ids)
+    matrix = np.asarray(list(found.values()), dtype=np.float32)
+    matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    query = np.asarray(query_vector, dtype=np.float32)
+    query /= max(float(np.linalg.norm(query)), 1e-12)
+    sims = dict(zip(found, (matrix @ query).tolist()))
+    return [sims.get(chunk_id) for chunk_id in ids]
+
+def _fuse(vs, query_vector: List[float], vector_hits: List[Tuple[Document, float]],
+          lexical_hits: List[Tuple[Document, float]], k: int) -> List[Tuple[Document, Optional[float]]]:
+    """
+    Reciprocal rank fusion: cada fragmento suma 1/(RRF_K + rango) por cada lista en que
+    aparece y se ordena por esa suma, normalizada a [0, 1] (1 = primero en ambas listas)
+    y guardada como rank_score en la metadata. El score sigue siendo la similitud coseno;
+    para lo que solo encontro BM25 se calcula con su embedding guardado.
+    """
+    if not lexical_hits:
+        return vector_hits
+    fused: Dict[tuple, list] = {}
+    for hits, cosine in ((vector_hits, True), (lexical_hits, False)):
+        for rank, (doc, score) in enumerate(hits, 1):
+            key = (doc.metadata.get("source"), doc.metadata.get("page"), doc.page_content)
+            entry = fused.setdefault(key, [doc, 0.0, None])
+            entry[1] += 1.0 / (RRF_K + rank)
+            if cosine:
+                entry[2] = score
+    best = 2.0 / (RRF_K + 1)
+    ranked = sorted(fused.values(), key=lambda entry: entry[1], reverse=True)[:k]
+    missing = [entry for entry in ranked if entry[2] is None]
+    if missing:
+        for entry, sim in zip(missing, _lexical_similarity(vs, query_vector, [e[0] for e in missing])):
+            entry[2] = sim
+    return [(_with_rank_score(doc, rrf / best), sim) for doc, rrf, sim in ranked]
+
+def _fetch_k(k: int) -> int:
+    """Con rerank se piden mas candidatos de los que se van a usar."""
+    return max(k, RERANK_CANDIDATES) if RERANK_ENABLED else k
+
+def _rerank(query: str, results: List[Tuple[Document, float]], stats: dict) -> List[Tuple[Document, float]]:
+    """Reordena con el cross-encoder (si RERANK_ENABLED); deja t_rerank_ms y rerank_fallback en `stats`."""
+    if not RERANK_ENABLED or len(results) < 2:
+        return results
+    reranked, info = get_reranker().rerank(query, results)
+    stats.update(info)
+    return reranked
 
 def _format_citations(docs: List[Document]) -> str:
     cites = []
@@ -25,7 +164,7 @@ RAG_PROMPT = PromptTemplate.from_template("""
 Eres un asistente que responde SOLO con informacion de los fragmentos recuperados.
 Si no esta en los fragmentos, di explicitamente que no aparece en los apuntes y no inventes.
 Incluye una seccion "Referencias" con archivo y pagina.
-Pregunta: {question}
+{history}Pregunta: {question}
 
 Fragmentos:
 {context}
@@ -46,102 +185,446 @@ Resultados de busqueda:
 Genera una respuesta coherente y al final incluye una seccion "Referencias Web" con los enlaces relevantes.
 """)
 
-def rag_tool(query: str, k: int = 4) -> Tuple[str, float, float, List[dict]]:
+def _stream_llm(llm, prompt: str, stats: dict, error_msg: str,
+                tracer: Optional[Tracer] = None) -> Iterator[str]:
     """
-    Herramienta RAG unica para este agente.
-    Retorna: (respuesta, t_retrieval_ms, t_generation_ms, retrieved_docs)
+    Emite la respuesta del LLM a medida que llega.
+    Deja en `stats`: t_first_token_ms, t_generation_ms, answer, llm_error y llm_usage
+    (prompt_tokens, completion_tokens y cached_tokens que informa la API).
     """
-    vs = _load_vs()
-    retriever = vs.as_retriever(search_kwargs={"k": k})
-    
-    start_retrieval = time.time()
-    try:
-        docs = retriever.get_relevant_documents(query)
-    except AttributeError:
-        docs = retriever.invoke(query)
-    t_retrieval_ms = (time.time() - start_retrieval) * 1000
+    start_generation = time.time()
+    stats["t_first_token_ms"] = 0.0
+    stats["llm_error"] = False
+    stats["llm_usage"] = usage = new_usage()
+    parts = []
+    with span(tracer, "llm"):
+        try:
+            for chunk in tracked(llm.stream(prompt), usage):
+                if not chunk.content:
+                    continue
+                if not parts:
+                    stats["t_first_token_ms"] = (time.time() - start_generation) * 1000
+                    event(tracer, "llm first token")
+                parts.append(chunk.content)
+                yield chunk.content
+        except Exception as e:
+            stats["llm_error"] = True
+            message = error_msg.format(e=e)
+            parts.append(message)
+            yield message
+    stats["t_generation_ms"] = (time.time() - start_generation) * 1000
+    stats["answer"] = "".join(parts)
+
+async def _astream_llm(llm, prompt: str, stats: dict, error_msg: str,
+                       tracer: Optional[Tracer] = None) -> AsyncIterator[str]:
+    """Version asincrona de _stream_llm."""
+    start_generation = time.time()
+    stats["t_first_token_ms"] = 0.0
+    stats["llm_error"] = False
+    stats["llm_usage"] = usage = new_usage()
+    parts = []
+    with span(tracer, "llm"):
+        try:
+            async for chunk in atracked(llm.astream(prompt), usage):
+                if not chunk.content:
+                    continue
+                if not parts:
+                    stats["t_first_token_ms"] = (time.time() - start_generation) * 1000
+                    event(tracer, "llm first token")
+                parts.append(chunk.content)
+                yield chunk.content
+        except Exception as e:
+            stats["llm_error"] = True
+            message = error_msg.format(e=e)
+            parts.append(message)
+            yield message
+    stats["t_generation_ms"] = (time.time() - start_generation) * 1000
+    stats["answer"] = "".join(parts)
+
+def _prompt_estimate(prompt: str, **parts: str) -> Dict[str, int]:
+    """Tokens de cada parte del prompt antes de enviarlo; "template" es el resto (instrucciones)."""
+    estimate = {name: count_tokens(text) for name, text in parts.items()}
+    total = count_tokens(prompt)
+    estimate["template"] = max(total - sum(estimate.values()), 0)
+    estimate["total"] = total
+    return estimate
+
+def _init_stats(stats: Optional[dict]) -> dict:
+    stats = stats if stats is not None else {}
+    stats.update(cache_hit=False, t_retrieval_ms=0.0, t_generation_ms=0.0,
+                 t_first_token_ms=0.0, retrieved_docs=[], retrieval_path="vector",
+                 t_rerank_ms=0.0, rerank_fallback=False, llm_usage={}, prompt_tokens_est={})
+    return stats
 
-    if not docs:
-        return "(No se encontraron fragmentos relevantes en los apuntes.)", t_retrieval_ms, 0.0, []
+def _cache_lookup(query_vector: List[float], stats: dict, start_retrieval: float) -> Optional[str]:
+    """Busca en la cache semantica; si hay acierto deja cache_hit y retrieved_docs en `stats`."""
+    cached = get_answer_cache().lookup(query_vector, get_index_version(DB_DIR), AGENT_MODE)
+    if cached is None:
+        return None
+    answer, retrieved_docs = cached
+    stats.update(cache_hit=True, retrieved_docs=retrieved_docs,
+                 t_retrieval_ms=(time.time() - start_retrieval) * 1000)
+    return answer
 
-    retrieved_docs = []
-    for doc in docs[:3]:
-        retrieved_docs.append({
+def _cache_store(query_vector: List[float], stats: dict, result: str):
+    get_answer_cache().store(query_vector, get_index_version(DB_DIR), AGENT_MODE, result, stats["retrieved_docs"])
+
+def _build_rag_prompt(scored: List[Tuple[Document, float]], stats: dict,
+                      question: str, history: str) -> Tuple[str, str]:
+    """Arma el prompt y las referencias a partir de los fragmentos empaquetados."""
+    docs = [doc for doc, _ in scored]
+    stats["retrieved_docs"] = [
+        {
             "file": doc.metadata.get("source", "desconocido"),
             "page": doc.metadata.get("page", "?"),
-            "score": 0.0
-        })
+            "score": round(score, 4) if score is not None else None,
+            "rank_score": round(doc.metadata["rank_score"], 4) if "rank_score" in doc.metadata else None,
+        }
+        for doc, score in scored
+    ]
 
-    context = "\n---\n".join([d.page_content for d in docs[:3]])
-    cites = _format_citations(docs[:3])
+    context = SEPARATOR.join([d.page_content for d in docs])
+    cites = _format_citations(docs)
+    history = f"Conversacion previa:\n{history}\n\n" if history else ""
+    prompt = RAG_PROMPT.format(question=question, history=history, context=context)
+    stats["prompt_tokens_est"] = _prompt_estimate(prompt, question=question, history=history, context=context)
+    return prompt, f"\n\n**Referencias:**\n{cites}"
 
-    llm = ChatOpenAI(model=CHAT_MODEL, temperature=0)
-    prompt = RAG_PROMPT.format(question=query, context=context)
+NO_DOCS_ANSWER = "(No se encontraron fragmentos relevantes en los apuntes.)"
+RAG_ERROR_MSG = "(Error al generar respuesta: {e})"
 
-    start_generation = time.time()
+def rag_tool_stream(query: str, k: Optional[int] = None, use_cache: bool = True,
+                    stats: Optional[dict] = None,
+                    budget_tokens: int = CONTEXT_TOKEN_BUDGET,
+                    question: Optional[str] = None,
+                    history: str = "",
+                    tracer: Optional[Tracer] = None) -> Iterator[str]:
+    """
+    Version en streaming de rag_tool: emite la respuesta por partes (y al final las
+    referencias). Al agotarse, `stats` contiene t_retrieval_ms, t_generation_ms,
+    t_first_token_ms, retrieved_docs, cache_hit, retrieval_path ("lexical", "hybrid"
+    o "vector") y, con rerank, t_rerank_ms (incluido en t_retrieval_ms) y rerank_fallback.
+    En el camino solo lexico la consulta se embebe (para la cache y la similitud coseno)
+    pero se omiten la busqueda vectorial y la fusion.
+    Con `tracer` se registra cada etapa (ver tracing.Tracer).
+    """
+    stats = _init_stats(stats)
+    with span(tracer, "store load"):
+        vs = _load_vs()
+
+    start_retrieval = time.time()
+    if k is None:
+        k = candidates_needed(budget_tokens, CHUNK_TOKENS_EST)
+    k = _fetch_k(k)
+    with span(tracer, "lexical", k=k):
+        lexical_hits, confident = _lexical(query, k)
+    use_cache = use_cache and ANSWER_CACHE_ENABLED
+    with span(tracer, "embed"):
+        query_vector = get_embeddings(EMBED_MODEL).embed_query(query)
+    if use_cache:
+        with span(tracer, "cache lookup"):
+            cached = _cache_lookup(query_vector, stats, start_retrieval)
+        if cached is not None:
+            yield cached
+            return
+    if confident:
+        with span(tracer, "lexical score"):
+            results = _apply_threshold(_lexical_only(vs, query_vector, lexical_hits))
+    else:
+        with span(tracer, "search", k=k):
+            results = _apply_threshold(_fuse(vs, query_vector, _search(vs, query_vector, k), lexical_hits, k))
+    stats["retrieval_path"] = "lexical" if confident else ("hybrid" if lexical_hits else "vector")
+    if RERANK_ENABLED:
+        with span(tracer, "rerank", candidates=len(results)):
+            results = _rerank(query, results, stats)
+    with span(tracer, "pack context"):
+        scored = pack_context(results, budget_tokens)
+    stats["t_retrieval_ms"] = (time.time() - start_retrieval) * 1000
+
+    if not scored:
+        yield NO_DOCS_ANSWER
+        return
+
+    with span(tracer, "prompt build"):
+        prompt, references = _build_rag_prompt(scored, stats, question or query, history)
+    llm = get_chat(CHAT_MODEL, temperature=0)
+    yield from _stream_llm(llm, prompt, stats, RAG_ERROR_MSG, tracer)
+    yield references
+
+    if use_cache and not stats["llm_error"]:
+        with span(tracer, "cache store"):
+            _cache_store(query_vector, stats, stats["answer"] + references)
+
+async def arag_tool_stream(query: str, k: Optional[int] = None, use_cache: bool = True,
+                           stats: Optional[dict] = None,
+                           budget_tokens: int = CONTEXT_TOKEN_BUDGET,
+                           question: Optional[str] = None,
+                           history: str = "",
+                           tracer: Optional[Tracer] = None) -> AsyncIterator[str]:
+    """
+    Version asincrona de rag_tool_stream: embeddings y chat con clientes async;
+    abrir el store, BM25 y la consulta al vector store (bloqueantes) corren en un hilo aparte.
+    """
+    stats = _init_stats(stats)
+    with span(tracer, "store load"):
+        vs = await asyncio.to_thread(_load_vs)
+
+    start_retrieval = time.time()
+    if k is None:
+        k = candidates_needed(budget_tokens, CHUNK_TOKENS_EST)
+    k = _fetch_k(k)
+    with span(tracer, "lexical", k=k):
+        lexical_hits, confident = await asyncio.to_thread(_lexical, query, k)
+    use_cache = use_cache and ANSWER_CACHE_ENABLED
+    with span(tracer, "embed"):
+        query_vector = await get_embeddings(EMBED_MODEL).aembed_query(query)
+    if use_cache:
+        with span(tracer, "cache lookup"):
+            cached = _cache_lookup(query_vector, stats, start_retrieval)
+        if cached is not None:
+            yield cached
+            return
+    if confident:
+        with span(tracer, "lexical score"):
+            results = _apply_threshold(await asyncio.to_thread(_lexical_only, vs, query_vector, lexical_hits))
+    else:
+        with span(tracer, "search", k=k):
+            vector_hits = await asyncio.to_thread(_search, vs, query_vector, k)
+            results = _apply_threshold(
+                await asyncio.to_thread(_fuse, vs, query_vector, vector_hits, lexical_hits, k))
+    stats["retrieval_path"] = "lexical" if confident else ("hybrid" if lexical_hits else "vector")
+    if RERANK_ENABLED:
+        with span(tracer, "rerank", candidates=len(results)):
+            results = await asyncio.to_thread(_rerank, query, results, stats)
+    with span(tracer, "pack context"):
+        scored = pack_context(results, budget_tokens)
+    stats["t_retrieval_ms"] = (time.time() - start_retrieval) * 1000
+
+    if not scored:
+        yield NO_DOCS_ANSWER
+        return
+
+    with span(tracer, "prompt build"):
+        prompt, references = _build_rag_prompt(scored, stats, question or query, history)
+    llm = get_chat(CHAT_MODEL, temperature=0)
+    async for piece in _astream_llm(llm, prompt, stats, RAG_ERROR_MSG, tracer):
+        yield piece
+    yield references
+
+    if use_cache and not stats["llm_error"]:
+        with span(tracer, "cache store"):
+            _cache_store(query_vector, stats, stats["answer"] + references)
+
+def retrieve_many(queries: List[str], k: Optional[int] = None,
+                  budget_tokens: int = CONTEXT_TOKEN_BUDGET,
+                  stats: Optional[List[dict]] = None,
+                  batch: bool = True) -> List[List[Tuple[Document, float]]]:
+    """
+    Recuperacion para evaluaciones. Con `batch` (por defecto): un solo llamado de
+    embeddings para las consultas que no resuelve BM25 y una sola consulta al vector
+    store. Con batch=False cada consulta se embebe y busca por separado, para medir
+    su latencia real. Retorna los fragmentos empaquetados de cada consulta, en el mismo orden.
+    Si se pasa `stats` (lista vacia), se agrega un dict por consulta con retrieval_path,
+    t_rerank_ms, rerank_fallback y t_retrieval_ms: el tiempo de las etapas propias de la
+    consulta (BM25, fusion, rerank, empaquetado) mas, en modo batch, su parte del
+    embedding y la busqueda en bloque.
+    """
+    if not queries:
+        return []
+    if k is None:
+        k = candidates_needed(budget_tokens, CHUNK_TOKENS_EST)
+    k = _fetch_k(k)
+    packed, per_query = [], []
+    for group in ([queries] if batch else [[q] for q in queries]):
+        group_packed, group_stats = _retrieve_group(group, k, budget_tokens)
+        packed.extend(group_packed)
+        per_query.extend(group_stats)
+    if stats is not None:
+        stats.extend(per_query)
+    return packed
+
+def _retrieve_group(queries: List[str], k: int,
+                    budget_tokens: int) -> Tuple[List[List[Tuple[Document, float]]], List[dict]]:
+    """Recupera `queries` con un solo embedding y una sola busqueda; ver retrieve_many."""
+    elapsed = [0.0] * len(queries)
+    lexical = []
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        lexical.append(_lexical(query, k))
+        elapsed[i] += time.perf_counter() - start
+    vs = _load_vs()
+    start = time.perf_counter()
+    vectors = get_embeddings(EMBED_MODEL).embed_queries(queries)
+    embed_share = (time.perf_counter() - start) / len(queries)
+    pending = [i for i, (_, confident) in enumerate(lexical) if not confident]
+    search_share, all_hits = 0.0, []
+    if pending:
+        start = time.perf_counter()
+        all_hits = _search_many(vs, [vectors[i] for i in pending], k)
+        search_share = (time.perf_counter() - start) / len(pending)
+    hits_of = dict(zip(pending, all_hits))
+    results = []
+    for i, (vector, (lexical_hits, confident)) in enumerate(zip(vectors, lexical)):
+        start = time.perf_counter()
+        if confident:
+            results.append(_apply_threshold(_lexical_only(vs, vector, lexical_hits)))
+        else:
+            results.append(_apply_threshold(_fuse(vs, vector, hits_of[i], lexical_hits, k)))
+            elapsed[i] += search_share
+        elapsed[i] += time.perf_counter() - start + embed_share
+
+    packed, per_query = [], []
+    for i, (query, (lexical_hits, confident)) in enumerate(zip(queries, lexical)):
+        query_stats = {"retrieval_path": "lexical" if confident else ("hybrid" if lexical_hits else "vector"),
+                       "t_rerank_ms": 0.0, "rerank_fallback": False}
+        start = time.perf_counter()
+        packed.append(pack_context(_rerank(query, results[i], query_stats), budget_tokens))
+        query_stats["t_retrieval_ms"] = (elapsed[i] + time.perf_counter() - start) * 1000
+        per_query.append(query_stats)
+    return packed, per_query
+
+def answer_from_context(question: str, scored: List[Tuple[Document, float]],
+                        stats: Optional[dict] = None, history: str = "") -> str:
+    """Genera la respuesta RAG con fragmentos ya recuperados (ver retrieve_many)."""
+    stats = _init_stats(stats)
+    if not scored:
+        return NO_DOCS_ANSWER
+    prompt, references = _build_rag_prompt(scored, stats, question, history)
+    llm = get_chat(CHAT_MODEL, temperature=0)
+    answer = "".join(_stream_llm(llm, prompt, stats, RAG_ERROR_MSG))
+    return answer + references
+
+def rag_tool(query: str, k: Optional[int] = None, use_cache: bool = True,
+             stats: Optional[dict] = None,
+             budget_tokens: int = CONTEXT_TOKEN_BUDGET,
+             question: Optional[str] = None,
+             history: str = "",
+             tracer: Optional[Tracer] = None) -> Tuple[str, float, float, List[dict]]:
+    """
+    Herramienta RAG unica para este agente.
+    `query` es la consulta de recuperacion (lo que se embebe); `question` y `history`
+    son la pregunta original y el historial recortado que van al prompt.
+    Pide al indice solo los candidatos que caben en `budget_tokens` (o `k` si se indica)
+    y empaqueta los de mayor score sin repetir texto solapado de la misma pagina.
+    Retorna: (respuesta, t_retrieval_ms, t_generation_ms, retrieved_docs)
+    Si se pasa `stats`, se completa con informacion extra (p.ej. cache_hit).
+    """
+    stats = stats if stats is not None else {}
+    result = "".join(rag_tool_stream(query, k=k, use_cache=use_cache, stats=stats,
+                                     budget_tokens=budget_tokens, question=question, history=history,
+                                     tracer=tracer))
+    return result, stats["t_retrieval_ms"], stats["t_generation_ms"], stats["retrieved_docs"]
+
+async def arag_tool(query: str, k: Optional[int] = None, use_cache: bool = True,
+                    stats: Optional[dict] = None,
+                    budget_tokens: int = CONTEXT_TOKEN_BUDGET,
+                    question: Optional[str] = None,
+                    history: str = "",
+                    tracer: Optional[Tracer] = None) -> Tuple[str, float, float, List[dict]]:
+    """Version asincrona de rag_tool."""
+    stats = stats if stats is not None else {}
+    parts = [piece async for piece in arag_tool_stream(
+        query, k=k, use_cache=use_cache, stats=stats,
+        budget_tokens=budget_tokens, question=question, history=history, tracer=tracer)]
+    return "".join(parts), stats["t_retrieval_ms"], stats["t_generation_ms"], stats["retrieved_docs"]
+
+def _web_search(query: str) -> Tuple[List[dict], List[str]]:
+    """Consulta DuckDuckGo y retorna (resultados, fragmentos para el prompt)."""
+    from langchain_community.tools import DuckDuckGoSearchResults
+    search = DuckDuckGoSearchResults(max_results=5)
+    raw = search.run(query)
+
+    results = []
+    web_context = []
+    
+    for item in raw.split("title:"):
+        if "link:" in item and "snippet:" in item:
+            try:
+                title_part = item.split("link:")[0].strip()
+                link_part = item.split("link:")[1].split(", snippet:")[0].strip()
+                snippet_part = item.split("snippet:")[-1].strip()
+                
+                results.append({
+                    "title": title_part,
+                    "link": link_part,
+                    "snippet": snippet_part
+                })
+                
+                web_context.append(f"Titulo: {title_part}\nContenido: {snippet_part}")
+            except:
+                continue
+    return results, web_context
+
+def _web_references(results: List[dict], stats: dict) -> str:
+    refs = "\n\n**Referencias Web:**\n"
+    for i, res in enumerate(results[:5], 1):
+        refs += f"[{i}] {res['title']}\n    Link: {res['link']}\n"
+    stats["retrieved_docs"] = [{"file": "web", "page": 0, "score": 0.0} for _ in results[:5]]
+    return f"\n{refs}"
+
+WEB_ERROR_MSG = "Se encontraron resultados, pero hubo un error: {e}"
+
+def web_search_tool_stream(query: str, stats: Optional[dict] = None,
+                           tracer: Optional[Tracer] = None) -> Iterator[str]:
+    """Busqueda web en streaming; al agotarse, `stats` tiene los tiempos y retrieved_docs."""
+    stats = _init_stats(stats)
+    start_retrieval = time.time()
     try:
-        response = llm.invoke(prompt)
-        answer = response.content
+        with span(tracer, "web search"):
+            results, web_context = _web_search(query)
     except Exception as e:
-        answer = f"(Error al generar respuesta: {e})"
-    t_generation_ms = (time.time() - start_generation) * 1000
+        yield f"(Error al realizar la busqueda web: {e})"
+        return
+    stats["t_retrieval_ms"] = (time.time() - start_retrieval) * 1000
 
-    return f"{answer}\n\n**Referencias:**\n{cites}", t_retrieval_ms, t_generation_ms, retrieved_docs
+    if not results:
+        yield "(No se encontraron resultados en la web.)"
+        return
 
-def web_search_tool(query: str) -> Tuple[str, float, float, List[dict]]:
-    """Busqueda web."""
+    llm = get_chat(CHAT_MODEL, temperature=0.3)
+    with span(tracer, "prompt build"):
+        web_results = "\n\n".join(web_context[:5])
+        prompt = WEB_PROMPT.format(question=query, web_results=web_results)
+        stats["prompt_tokens_est"] = _prompt_estimate(prompt, question=query, context=web_results)
+    yield from _stream_llm(llm, prompt, stats, WEB_ERROR_MSG, tracer)
+    yield _web_references(results, stats)
+
+async def aweb_search_tool_stream(query: str, stats: Optional[dict] = None,
+                                  tracer: Optional[Tracer] = None) -> AsyncIterator[str]:
+    """Version asincrona de web_search_tool_stream (la busqueda corre en un hilo aparte)."""
+    stats = _init_stats(stats)
     start_retrieval = time.time()
     try:
-        from langchain_community.tools import DuckDuckGoSearchResults
-        search = DuckDuckGoSearchResults(max_results=5)
-        raw = search.run(query)
-
-        results = []
-        web_context = []
-        
-        for item in raw.split("title:"):
-            if "link:" in item and "snippet:" in item:
-                try:
-                    title_part = item.split("link:")[0].strip()
-                    link_part = item.split("link:")[1].split(", snippet:")[0].strip()
-                    snippet_part = item.split("snippet:")[-1].strip()
-                    
-                    results.append({
-                        "title": title_part,
-                        "link": link_part,
-                        "snippet": snippet_part
-                    })
-                    
-                    web_context.append(f"Titulo: {title_part}\nContenido: {snippet_part}")
-                except:
-                    continue
-        
-        t_retrieval_ms = (time.time() - start_retrieval) * 1000
-
-        if not results:
-            return "(No se encontraron resultados en la web.)", t_retrieval_ms, 0.0, []
-
-        start_generation = time.time()
-        llm = ChatOpenAI(model=CHAT_MODEL, temperature=0.3)
-        prompt = WEB_PROMPT.format(
-            question=query,
-            web_results="\n\n".join(web_context[:5])
-        )
-        
-        try:
-            answer = llm.invoke(prompt).content
-        except Exception as e:
-            answer = f"Se encontraron resultados, pero hubo un error: {e}"
-        
-        t_generation_ms = (time.time() - start_generation) * 1000
+        with span(tracer, "web search"):
+            results, web_context = await asyncio.to_thread(_web_search, query)
+    except Exception as e:
+        yield f"(Error al realizar la busqueda web: {e})"
+        return
+    stats["t_retrieval_ms"] = (time.time() - start_retrieval) * 1000
 
-        refs = "\n\n**Referencias Web:**\n"
-        for i, res in enumerate(results[:5], 1):
-            refs += f"[{i}] {res['title']}\n    Link: {res['link']}\n"
+    if not results:
+        yield "(No se encontraron resultados en la web.)"
+        return
 
-        retrieved_docs = [{"file": "web", "page": 0, "score": 0.0} for _ in results[:5]]
+    llm = get_chat(CHAT_MODEL, temperature=0.3)
+    with span(tracer, "prompt build"):
+        web_results = "\n\n".join(web_context[:5])
+        prompt = WEB_PROMPT.format(question=query, web_results=web_results)
+        stats["prompt_tokens_est"] = _prompt_estimate(prompt, question=query, context=web_results)
+    async for piece in _astream_llm(llm, prompt, stats, WEB_ERROR_MSG, tracer):
+        yield piece
+    yield _web_references(results, stats)
 
-        return f"{answer}\n{refs}", t_retrieval_ms, t_generation_ms, retrieved_docs
+def web_search_tool(query: str, stats: Optional[dict] = None,
+                    tracer: Optional[Tracer] = None) -> Tuple[str, float, float, List[dict]]:
+    """Busqueda web."""
+    stats = stats if stats is not None else {}
+    result = "".join(web_search_tool_stream(query, stats=stats, tracer=tracer))
+    return result, stats["t_retrieval_ms"], stats["t_generation_ms"], stats["retrieved_docs"]
 
-    except Exception as e:
-        return f"(Error al realizar la busqueda web: {e})", 0.0, 0.0, []
\ No newline at end of file
+async def aweb_search_tool(query: str, stats: Optional[dict] = None,
+                           tracer: Optional[Tracer] = None) -> Tuple[str, float, float, List[dict]]:
+    """Version asincrona de web_search_tool."""
+    stats = stats if stats is not None else {}
+    parts = [piece async for piece in aweb_search_tool_stream(query, stats=stats, tracer=tracer)]
+    return "".join(parts), stats["t_retrieval_ms"], stats["t_generation_ms"], stats["retrieved_docs"]
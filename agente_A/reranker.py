@@ -0,0 +1,136 @@
+import math
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Tuple, Dict, Any, Optional
+
+from langchain_core.documents import Document
+
+from embedding_cache import normalizar_consulta
+
+class CrossEncoderReranker:
+    """
+    Reordena candidatos con un cross-encoder local en CPU, por lotes de hasta `batch_size`.
+    Cada lote se dimensiona con el costo medido por par para que quepa en lo que queda de
+    `budget_ms`; los que no alcanzan a puntuarse quedan al final en su orden original.
+    Los puntajes (consulta, fragmento) se guardan en una LRU de `cache_size` entradas.
+    """
+
+    def __init__(self, model_name: str, batch_size: int = 16, budget_ms: Optional[float] = 300.0,
+                 cache_size: int = 4096, threads: Optional[int] = None):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.budget_ms = budget_ms
+        self.cache_size = cache_size
+        self.threads = threads
+        self._model = None
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.fallbacks = 0
+        # ms por par, promedio movil de los lotes medidos (None hasta el primero)
+        self.ms_per_pair: Optional[float] = None
+
+    @property
+    def model(self):
+        with self._lock:
+            if self._model is None:
+                from sentence_transformers import CrossEncoder
+                if self.threads:
+                    import torch
+                    torch.set_num_threads(self.threads)
+                self._model = CrossEncoder(self.model_name, device="cpu")
+            return self._model
+
+    def warmup(self) -> float:
+        model = self.model
+        start = time.perf_counter()
+        model.predict([("consulta", "fragmento")], show_progress_bar=False)
+        elapsed = time.perf_counter() - start
+        # un par aislado cuesta mas que uno dentro de un lote: estimacion conservadora
+        self._measure(elapsed * 1000, 1)
+        return elapsed
+
+    def _measure(self, elapsed_ms: float, pairs: int):
+        per_pair = elapsed_ms / max(pairs, 1)
+        with self._lock:
+            self.ms_per_pair = per_pair if self.ms_per_pair is None else 0.7 * self.ms_per_pair + 0.3 * per_pair
+
+    def _batch_len(self, remaining: int, elapsed_ms: float) -> int:
+        """Pares del siguiente lote: los que alcanzan a puntuarse en lo que queda del presupuesto."""
+        n = min(self.batch_size, remaining)
+        if self.budget_ms is None:
+            return n
+        if self.ms_per_pair is None:
+            return 1  # sin medicion todavia: un solo par para estimar el costo
+        return min(n, int((self.budget_ms - elapsed_ms) / self.ms_per_pair))
+
+    @staticmethod
+    def _key(query: str, doc: Document) -> Tuple[str, str]:
+        return normalizar_consulta(query), hashlib.sha1(doc.page_content.encode("utf-8")).hexdigest()
+
+    def _cached(self, key: Tuple[str, str]) -> Optional[float]:
+        with self._lock:
+            score = self._cache.get(key)
+            if score is None:
+                self.misses += 1
+                return None
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return score
+
+    def _store(self, key: Tuple[str, str], score: float):
+        with self._lock:
+            self._cache[key] = score
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def rerank(self, query: str, scored: List[Tuple[Document, Optional[float]]]
+               ) -> Tuple[List[Tuple[Document, Optional[float]]], Dict[str, Any]]:
+        """
+        Retorna los fragmentos ordenados por el cross-encoder e info con t_rerank_ms y
+        rerank_fallback. El score de cada fragmento (similitud coseno) no cambia; el del
+        cross-encoder (sigmoide del logit, en [0, 1]) queda como rank_score en la metadata.
+        Si el presupuesto se agota a mitad de camino, los que alcanzaron a puntuarse van
+        primero y el resto despues, en su orden original; rerank_fallback indica que no
+        se puntuo ninguno.
+        """
+        start = time.perf_counter()
+        if len(scored) < 2:
+            return scored, {"t_rerank_ms": 0.0, "rerank_fallback": False}
+
+        keys = [self._key(query, doc) for doc, _ in scored]
+        scores = [self._cached(key) for key in keys]
+        pending = [i for i, s in enumerate(scores) if s is None]
+        model = self.model if pending else None
+        while pending:
+            n = self._batch_len(len(pending), (time.perf_counter() - start) * 1000)
+            if n < 1:
+                break
+            batch, pending = pending[:n], pending[n:]
+            batch_start = time.perf_counter()
+            logits = model.predict([(query, scored[i][0].page_content) for i in batch],
+                                   batch_size=len(batch), show_progress_bar=False)
+            self._measure((time.perf_counter() - batch_start) * 1000, len(batch))
+            for i, logit in zip(batch, logits):
+                scores[i] = 1.0 / (1.0 + math.exp(-float(logit)))
+                self._store(keys[i], scores[i])
+
+        if all(s is None for s in scores):
+            with self._lock:
+                self.fallbacks += 1
+            return scored, {"t_rerank_ms": (time.perf_counter() - start) * 1000, "rerank_fallback": True}
+        reranked = sorted(
+            ((Document(page_content=doc.page_content, metadata={**doc.metadata, "rank_score": s}), score)
+             for (doc, score), s in zip(scored, scores) if s is not None),
+            key=lambda x: x[0].metadata["rank_score"], reverse=True)
+        reranked.extend(item for item, s in zip(scored, scores) if s is None)
+        return reranked, {"t_rerank_ms": (time.perf_counter() - start) * 1000, "rerank_fallback": False}
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "fallbacks": self.fallbacks, "size": len(self._cache),
+                    "ms_per_pair": self.ms_per_pair}
@@ -0,0 +1,313 @@
+import os
+import asyncio
+import threading
+from typing import Dict, Tuple, Any, Union, Optional
+
+import httpx
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+from langchain_community.vectorstores import Chroma
+
+from settings import (
+    DB_DIR, EMBED_MODEL, EMBED_BACKEND, VECTOR_STORE, NUMPY_STORE_DTYPE,
+    NUMPY_STORE_INDEX, NUMPY_STORE_HNSW_EF, NUMPY_STORE_QUANTIZATION, NUMPY_STORE_TRUNCATE_DIM,
+    NUMPY_STORE_RESCORE_FACTOR, LLM_STREAM_USAGE, RERANK_MODEL, RERANK_BATCH_SIZE, RERANK_BUDGET_MS, RERANK_CACHE_SIZE, EMBED_CACHE_SIZE, EMBED_CACHE_PATH,
+    LOCAL_EMBED_ENGINE, LOCAL_EMBED_BATCH_SIZE, LOCAL_EMBED_THREADS, LOCAL_EMBED_MAX_WAIT_MS, LOCAL_EMBED_WARMUP,
+    ANSWER_CACHE_THRESHOLD, ANSWER_CACHE_TTL_S, ANSWER_CACHE_SIZE, MAX_CONCURRENT_REQUESTS,
+    METRICS_SINK_PATH, METRICS_FLUSH_EVERY, METRICS_FLUSH_INTERVAL_S, METRICS_MAX_BYTES, METRICS_BACKUPS,
+)
+from embedding_cache import EmbeddingCache, CachedEmbeddings
+from answer_cache import SemanticAnswerCache
+from index_meta import check_embedding_backend, index_version, IndexMismatchError, META_FILE
+from numpy_store import NumpyVectorStore, NUMPY_SUBDIR
+from lexical_index import BM25Index
+from reranker import CrossEncoderReranker
+from llm_usage import UsageRecordingCompletions, AsyncUsageRecordingCompletions
+from metrics_sink import JsonlSink
+
+VectorStore = Union[Chroma, NumpyVectorStore]
+
+class ResourceRegistry:
+    """
+    Registro de recursos compartidos por proceso.
+    Abre una sola vez el vector store, el cliente de embeddings y los clientes
+    de chat, y reutiliza un pool HTTP comun entre todos ellos.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._http_client = None
+        self._http_async_client = None
+        self._limiter = None
+        self._embeddings: Dict[str, CachedEmbeddings] = {}
+        self._vectorstores: Dict[Tuple[str, str, str], VectorStore] = {}
+        self._lexical: Dict[Tuple[str, str], Optional[BM25Index]] = {}
+        self._reranker: Optional[CrossEncoderReranker] = None
+        self._chats: Dict[Tuple[str, float], ChatOpenAI] = {}
+        self._index_versions: Dict[str, Tuple[Optional[Tuple[int, int]], str]] = {}
+        self._sinks: Dict[str, JsonlSink] = {}
+        self._answer_cache = SemanticAnswerCache(
+            threshold=ANSWER_CACHE_THRESHOLD,
+            ttl_s=ANSWER_CACHE_TTL_S,
+            max_size=ANSWER_CACHE_SIZE,
+        )
+
+    def http_client(self) -> httpx.Client:
+        with self._lock:
+            if self._http_client is None:
+                self._http_client = httpx.Client(
+                    limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+                    timeout=httpx.Timeout(60.0, connect=10.0),
+                )
+            return self._http_client
+
+    def http_async_client(self) -> httpx.AsyncClient:
+        with self._lock:
+            if self._http_async_client is None:
+                self._http_async_client = httpx.AsyncClient(
+                    limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+                    timeout=httpx.Timeout(60.0, connect=10.0),
+                )
+            return self._http_async_client
+
+    def limiter(self) -> asyncio.Semaphore:
+        """Limita cuantas preguntas se atienden a la vez en este proceso."""
+        with self._lock:
+            if self._limiter is None:
+                self._limiter = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+            return self._limiter
+
+    def embeddings(self, model: str = EMBED_MODEL) -> CachedEmbeddings:
+        with self._lock:
+            if model not in self._embeddings:
+                if EMBED_BACKEND == "local":
+                    from local_embeddings import LocalEmbeddings
+                    base = LocalEmbeddings(
+                        model,
+                        batch_size=LOCAL_EMBED_BATCH_SIZE,
+                        threads=LOCAL_EMBED_THREADS,
+                        max_wait_ms=LOCAL_EMBED_MAX_WAIT_MS,
+                        backend=LOCAL_EMBED_ENGINE,
+                    )
+                    if LOCAL_EMBED_WARMUP:
+                        print(f"Modelo de embeddings local {model} listo en {base.warmup():.2f}s")
+                else:
+                    base = OpenAIEmbeddings(
+                        model=model,
+                        http_client=self.http_client(),
+                        http_async_client=self.http_async_client(),
+                    )
+                cache = EmbeddingCache(model, max_size=EMBED_CACHE_SIZE, path=EMBED_CACHE_PATH)
+                self._embeddings[model] = CachedEmbeddings(base, cache)
+            return self._embeddings[model]
+
+    def embedding_cache_stats(self) -> Dict[str, int]:
+        """Suma hits/misses de las caches de consultas de todos los modelos abiertos."""
+        totals = {"hits": 0, "misses": 0, "size": 0}
+        with self._lock:
+            for emb in self._embeddings.values():
+                for key, value in emb.cache.stats().items():
+                    totals[key] += value
+        return totals
+
+    def vectorstore(self, db_dir: str = DB_DIR, model: str = EMBED_MODEL) -> VectorStore:
+        with self._lock:
+            # la version forma parte de la clave: si cambia el indice se reabre el store
+            key = (db_dir, model, self.index_version(db_dir))
+            if key not in self._vectorstores:
+                check_embedding_backend(db_dir, EMBED_BACKEND, model)
+                if VECTOR_STORE == "numpy":
+                    self._vectorstores[key] = open_numpy_store(db_dir)
+                    if not self._vectorstores[key].count():
+                        del self._vectorstores[key]
+                        raise IndexMismatchError(
+                            f"No hay store NumPy en {db_dir}; correr build_index.py o numpy_store.py --from-chroma")
+                else:
+                    self._vectorstores[key] = Chroma(
+                        persist_directory=db_dir,
+                        embedding_function=self.embeddings(model),
+                    )
+            return self._vectorstores[key]
+
+    def chat(self, model: str, temperature: float = 0.0) -> ChatOpenAI:
+        key = (model, float(temperature))
+        with self._lock:
+            if key not in self._chats:
+                chat = ChatOpenAI(
+                    model=model,
+                    temperature=temperature,
+                    http_client=self.http_client(),
+                    http_async_client=self.http_async_client(),
+                )
+                # registra el uso real de tokens de cada llamada (ver llm_usage.tracking)
+                chat.client = UsageRecordingCompletions(chat.client, LLM_STREAM_USAGE)
+                chat.async_client = AsyncUsageRecordingCompletions(chat.async_client, LLM_STREAM_USAGE)
+                self._chats[key] = chat
+            return self._chats[key]
+
+    def lexical_index(self, db_dir: str = DB_DIR) -> Optional[BM25Index]:
+        """Indice BM25 de build_index (None si el indice se construyo antes de tenerlo)."""
+        with self._lock:
+            key = (db_dir, self.index_version(db_dir))
+            if key not in self._lexical:
+                self._lexical[key] = BM25Index.load(db_dir)
+            return self._lexical[key]
+
+    def reranker(self) -> CrossEncoderReranker:
+        with self._lock:
+            if self._reranker is None:
+                self._reranker = CrossEncoderReranker(
+                    RERANK_MODEL,
+                    batch_size=RERANK_BATCH_SIZE,
+                    budget_ms=RERANK_BUDGET_MS,
+                    cache_size=RERANK_CACHE_SIZE,
+                    threads=LOCAL_EMBED_THREADS,
+                )
+                print(f"Cross-encoder {RERANK_MODEL} listo en {self._reranker.warmup():.2f}s")
+            return self._reranker
+
+    def answer_cache(self) -> SemanticAnswerCache:
+        return self._answer_cache
+
+    def metrics_sink(self, path: str = METRICS_SINK_PATH) -> JsonlSink:
+        """Un solo sink por archivo: lo comparten todos los Agent (sesiones) del proceso."""
+        with self._lock:
+            if path not in self._sinks:
+                self._sinks[path] = JsonlSink(path, flush_every=METRICS_FLUSH_EVERY,
+                                              flush_interval_s=METRICS_FLUSH_INTERVAL_S,
+                                              max_bytes=METRICS_MAX_BYTES, backups=METRICS_BACKUPS)
+            return self._sinks[path]
+
+    def index_version(self, db_dir: str = DB_DIR) -> str:
+        """
+        Version del indice de index_meta.json. Se relee solo si cambia el mtime o el
+        tamano del archivo (p. ej. build_index en otro proceso); al cambiar la version
+        se descartan los stores abiertos y las respuestas cacheadas de la anterior.
+        """
+        stamp = _meta_stamp(db_dir)
+        with self._lock:
+            cached = self._index_versions.get(db_dir)
+            if cached is not None and cached[0] == stamp:
+                return cached[1]
+            version = index_version(db_dir)
+            self._index_versions[db_dir] = (stamp, version)
+            if cached is not None and cached[1] != version:
+                self._drop_handles(db_dir)
+                self._answer_cache.invalidate(version)
+            return version
+
+    def _drop_handles(self, db_dir: str):
+        for key in [k for k in self._vectorstores if k[0] == db_dir]:
+            del self._vectorstores[key]
+        for key in [k for k in self._lexical if k[0] == db_dir]:
+            del self._lexical[key]
+        _clear_chroma_cache()
+
+    def reload(self):
+        """Descarta los vector stores abiertos; se reabren en la siguiente consulta."""
+        with self._lock:
+            self._vectorstores.clear()
+            self._lexical.clear()
+            self._index_versions.clear()
+            self._answer_cache.invalidate()
+            _clear_chroma_cache()
+
+    def close(self):
+        """Libera todos los recursos (usar tras reconstruir el indice o al salir)."""
+        with self._lock:
+            self._vectorstores.clear()
+            self._lexical.clear()
+            self._index_versions.clear()
+            self._answer_cache.invalidate()
+            for emb in self._embeddings.values():
+                emb.cache.close()
+            self._embeddings.clear()
+            self._chats.clear()
+            self._reranker = None
+            # los sinks se vacian pero se conservan: los colectores vivos los siguen usando
+            for sink in self._sinks.values():
+                sink.flush()
+            _clear_chroma_cache()
+            if self._http_client is not None:
+                self._http_client.close()
+                self._http_client = None
+            # el cliente async se cierra desde el event loop que lo usa (ver aclose)
+            self._http_async_client = None
+            self._limiter = None
+
+    async def aclose(self):
+        client = self._http_async_client
+        self.close()
+        if client is not None:
+            await client.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "vectorstores": len(self._vectorstores),
+                "lexical_indexes": len(self._lexical),
+                "embeddings": len(self._embeddings),
+                "chats": len(self._chats),
+                "rerank_cache": self._reranker.stats() if self._reranker else None,
+            }
+
+def open_numpy_store(db_dir: str = DB_DIR) -> NumpyVectorStore:
+    return NumpyVectorStore.load(os.path.join(db_dir, NUMPY_SUBDIR), dtype=NUMPY_STORE_DTYPE,
+                                 index=NUMPY_STORE_INDEX, hnsw_ef=NUMPY_STORE_HNSW_EF,
+                                 quantization=NUMPY_STORE_QUANTIZATION, truncate_dim=NUMPY_STORE_TRUNCATE_DIM,
+                                 rescore_factor=NUMPY_STORE_RESCORE_FACTOR)
+
+def _meta_stamp(db_dir: str) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(os.path.join(db_dir, META_FILE))
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+def _clear_chroma_cache():
+    # chromadb guarda un sistema por ruta; hay que limpiarlo para releer el indice
+    try:
+        from chromadb.api.client import SharedSystemClient
+        SharedSystemClient.clear_system_cache()
+    except Exception:
+        pass
+
+registry = ResourceRegistry()
+
+def get_vectorstore(db_dir: str = DB_DIR, model: str = EMBED_MODEL) -> VectorStore:
+    return registry.vectorstore(db_dir, model)
+
+def get_lexical_index(db_dir: str = DB_DIR) -> Optional[BM25Index]:
+    return registry.lexical_index(db_dir)
+
+def get_embeddings(model: str = EMBED_MODEL) -> CachedEmbeddings:
+    return registry.embeddings(model)
+
+def embedding_cache_stats() -> Dict[str, int]:
+    return registry.embedding_cache_stats()
+
+def get_reranker() -> CrossEncoderReranker:
+    return registry.reranker()
+
+def get_answer_cache() -> SemanticAnswerCache:
+    return registry.answer_cache()
+
+def get_metrics_sink(path: str = METRICS_SINK_PATH) -> JsonlSink:
+    return registry.metrics_sink(path)
+
+def get_index_version(db_dir: str = DB_DIR) -> str:
+    return registry.index_version(db_dir)
+
+def get_request_limiter() -> asyncio.Semaphore:
+    return registry.limiter()
+
+def get_chat(model: str, temperature: float = 0.0) -> ChatOpenAI:
+    return registry.chat(model, temperature)
+
+def reload():
+    registry.reload()
+
+def close():
+    registry.close()
+
+async def aclose():
+    await registry.aclose()
@@ -0,0 +1,95 @@
+import os
+import asyncio
+from collections import OrderedDict
+from typing import Tuple
+from dotenv import load_dotenv
+
+env_path = os.path.join(os.path.dirname(__file__), "..", ".env")
+load_dotenv(env_path)
+
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from agent import Agent
+import resources
+from settings import AGENT_MODE, MAX_SESSIONS
+
+class Pregunta(BaseModel):
+    question: str
+    session_id: str = "default"
+    allow_web: bool = False
+
+class SessionStore:
+    """Un Agent (con su memoria) por sesion; se descartan las menos usadas."""
+
+    def __init__(self, max_sessions: int = MAX_SESSIONS):
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, Tuple[Agent, asyncio.Lock]]" = OrderedDict()
+
+    def get(self, session_id: str) -> Tuple[Agent, asyncio.Lock]:
+        if session_id not in self._sessions:
+            self._sessions[session_id] = (Agent(window_k=6, collect_metrics=False), asyncio.Lock())
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        self._sessions.move_to_end(session_id)
+        return self._sessions[session_id]
+
+    def reset(self, session_id: str):
+        self._sessions.pop(session_id, None)
+
+sessions = SessionStore()
+app = FastAPI(title=f"GPTEC - Agente {AGENT_MODE}")
+
+@app.get("/health")
+async def health():
+    return {"status": "ok", "agent_mode": AGENT_MODE, "resources": resources.registry.stats()}
+
+@app.post("/ask")
+async def ask(req: Pregunta):
+    agent, session_lock = sessions.get(req.session_id)
+    # la memoria de una sesion es secuencial; el limitador acota el total del proceso
+    async with session_lock, resources.get_request_limiter():
+        answer = await agent.adecide_and_answer(req.question, allow_web=req.allow_web)
+    return {"answer": answer, "session_id": req.session_id, "agent_mode": AGENT_MODE}
+
+@app.post("/ask/stream")
+async def ask_stream(req: Pregunta):
+    agent, session_lock = sessions.get(req.session_id)
+
+    async def stream():
+        async with session_lock, resources.get_request_limiter():
+            async for piece in agent.adecide_and_answer_stream(req.question, allow_web=req.allow_web):
+                yield piece
+
+    return StreamingResponse(stream(), media_type="text/plain; charset=utf-8")
+
+@app.post("/reset/{session_id}")
+async def reset(session_id: str):
+    sessions.reset(session_id)
+    return {"session_id": session_id, "reset": True}
+
+def _open_index():
+    # abre el indice (valida el backend de embeddings), el BM25 y la version que usa la cache
+    # de respuestas; si el backend es local, carga y calienta el modelo
+    resources.get_vectorstore()
+    resources.get_lexical_index()
+    resources.get_index_version()
+
+@app.post("/reload")
+async def reload_index():
+    resources.reload()
+    await asyncio.to_thread(_open_index)
+    return {"reloaded": True, "index_version": resources.get_index_version()}
+
+@app.on_event("startup")
+async def startup():
+    await asyncio.to_thread(_open_index)
+
+@app.on_event("shutdown")
+async def shutdown():
+    await resources.aclose()
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host=os.getenv("HOST", "127.0.0.1"), port=int(os.getenv("PORT", "8000")))
@@ -6,11 +6,126 @@ DATA_DIR = os.path.abspath(os.path.join(BASE_DIR, "..", "data"))
 # Solo RAG A
 DB_DIR = os.path.join(BASE_DIR, "chroma_ragA")
 
-EMBED_MODEL = "text-embedding-3-small"
+# Vector store: "chroma" o "numpy" (matriz en memory map dentro de DB_DIR/numpy, busqueda
+# exacta "flat" o aproximada "hnsw"; "float16" reduce a la mitad el tamano de los vectores)
+VECTOR_STORE = "chroma"
+NUMPY_STORE_DTYPE = "float32"
+NUMPY_STORE_INDEX = "flat"
+NUMPY_STORE_HNSW_EF = 64
+# Cuantizacion de la busqueda flat: None, "int8" o "binary"; TRUNCATE_DIM usa solo las primeras
+# dimensiones (Matryoshka) y se reordenan k * RESCORE_FACTOR candidatos con los vectores completos
+NUMPY_STORE_QUANTIZATION = None
+NUMPY_STORE_TRUNCATE_DIM = None
+NUMPY_STORE_RESCORE_FACTOR = 4
+
+# Backend de embeddings: "openai" (API) o "local" (sentence-transformers en CPU, sin red).
+# El indice guarda con que backend y modelo se construyo y no se abre con otro.
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "openai")
+LOCAL_EMBED_MODEL = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+LOCAL_EMBED_ENGINE = "torch"  # "onnx" requiere sentence-transformers>=3.2 con optimum
+LOCAL_EMBED_BATCH_SIZE = 32
+LOCAL_EMBED_THREADS = os.cpu_count() or 1
+LOCAL_EMBED_MAX_WAIT_MS = 5.0  # espera maxima para agrupar consultas concurrentes
+LOCAL_EMBED_WARMUP = True
+
+if EMBED_BACKEND == "local":
+    EMBED_MODEL = LOCAL_EMBED_MODEL
+    EMBED_DIM = 384
+else:
+    EMBED_MODEL = "text-embedding-3-small"
+    EMBED_DIM = 1536
 CHAT_MODEL = "gpt-3.5-turbo-0125"
+# Precio del chat en USD por millon de tokens (cost_usd de las metricas) y si se pide a la API el
+# uso de tokens al final del streaming (stream_options; algunos servidores compatibles no lo aceptan)
+CHAT_PRICE_PER_1M = {"input": 0.50, "cached_input": 0.50, "output": 1.50}
+LLM_STREAM_USAGE = True
 
 # Configuracion RAG A (chunks fijos)
 CHUNK_SIZE = 800
 CHUNK_OVERLAP = 120
 
-AGENT_MODE = "A"
\ No newline at end of file
+# Estrategia de chunking de build_index (ver chunking.STRATEGIES: "fixed-char", "token",
+# "sentence", "page", "semantic"); chunk_size/chunk_overlap en caracteres para "fixed-char"
+# y en tokens para las demas
+CHUNK_STRATEGY = "fixed-char"
+CHUNK_STRATEGY_PARAMS = {"chunk_size": CHUNK_SIZE, "chunk_overlap": CHUNK_OVERLAP}
+
+AGENT_MODE = "A"
+
+# Cache de embeddings de consultas (LRU en memoria + SQLite opcional, None lo desactiva)
+EMBED_CACHE_SIZE = 1024
+EMBED_CACHE_PATH = os.path.join(BASE_DIR, "embed_cache.sqlite3")
+
+# Cache semantica de respuestas (similitud coseno minima, TTL en segundos, entradas maximas)
+ANSWER_CACHE_ENABLED = True
+ANSWER_CACHE_THRESHOLD = 0.95
+ANSWER_CACHE_TTL_S = 3600
+ANSWER_CACHE_SIZE = 256
+
+# Procesos para parsear PDFs en build_index (1 = secuencial)
+INGEST_WORKERS = os.cpu_count() or 1
+
+# Embeddings en build_index: tokens y chunks maximos por lote, peticiones concurrentes y reintentos.
+# EMBED_BASE_URL permite apuntar a un servidor de embeddings local (p.ej. uno falso para pruebas).
+EMBED_BASE_URL = os.getenv("EMBED_BASE_URL")
+EMBED_BATCH_TOKENS = 8000
+EMBED_BATCH_SIZE = 256
+EMBED_CONCURRENCY = 4 if EMBED_BACKEND == "openai" else 1  # el modelo local ya usa todos los hilos
+EMBED_MAX_RETRIES = 6
+
+# Similitud coseno minima para usar un fragmento recuperado (None = sin filtro)
+RETRIEVAL_SCORE_THRESHOLD = 0.3
+
+# Recuperacion: "dense" (solo vector) o "hybrid" (BM25 + vector fusionados con reciprocal
+# rank fusion; requiere el indice BM25 de build_index). En modo hibrido se omite la busqueda
+# vectorial si el mejor resultado BM25 contiene todos los terminos de la consulta y supera
+# al segundo por LEXICAL_FAST_MARGIN (None lo desactiva)
+RETRIEVAL_MODE = "dense"
+RRF_K = 60
+BM25_K1 = 1.5
+BM25_B = 0.75
+LEXICAL_FAST_MARGIN = 1.5
+
+# Rerank con cross-encoder local (CPU): se piden RERANK_CANDIDATES fragmentos, se puntuan por
+# lotes dimensionados con el costo medido por par para no exceder RERANK_BUDGET_MS; los que
+# no alcanzan a puntuarse quedan despues de los puntuados, en su orden original
+RERANK_ENABLED = False
+RERANK_MODEL = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"
+RERANK_CANDIDATES = 20
+RERANK_BATCH_SIZE = 16
+RERANK_BUDGET_MS = 300
+RERANK_CACHE_SIZE = 4096
+
+# Presupuesto de tokens para los fragmentos del prompt y tamano estimado de cada chunk
+CONTEXT_TOKEN_BUDGET = 700
+CHUNK_TOKENS_EST = CHUNK_SIZE // 4  # ~4 caracteres por token
+
+# Reescritura de la consulta de recuperacion ("heuristic" local o "llm" cacheado)
+# y tope de tokens del historial que se agrega al prompt de generacion
+QUERY_REWRITE_MODE = "heuristic"
+HISTORY_TOKEN_CAP = 400
+
+# Servicio HTTP (server.py): preguntas atendidas en paralelo por proceso y sesiones en memoria
+MAX_CONCURRENT_REQUESTS = 8
+MAX_SESSIONS = 500
+
+# Hilos de generacion en evaluate.py
+EVAL_WORKERS = 8
+# Metricas del agente (app.py): cada pregunta se agrega a METRICS_SINK_PATH (JSON Lines) y se
+# escribe cada METRICS_FLUSH_EVERY registros o METRICS_FLUSH_INTERVAL_S segundos; el archivo
+# rota al pasar METRICS_MAX_BYTES y en memoria se retienen solo las ultimas METRICS_RETENTION
+METRICS_SINK_PATH = os.path.join(BASE_DIR, f"metricas_{AGENT_MODE}.jsonl")
+METRICS_FLUSH_EVERY = 20
+METRICS_FLUSH_INTERVAL_S = 5.0
+METRICS_MAX_BYTES = 10 * 1024 * 1024
+METRICS_BACKUPS = 5
+METRICS_RETENTION = 500
+# Puntaje de cada metrica (tokens, citas, fidelidad, EM) en un hilo aparte, fuera de la respuesta
+METRICS_BACKGROUND = True
+
+# Trazas por etapa de cada pregunta (RAG_TRACE=1): "chrome" agrega eventos a un JSON para
+# chrome://tracing / Perfetto; "otel" una linea OTLP JSON por pregunta
+TRACE_ENABLED = os.getenv("RAG_TRACE", "0") == "1"
+TRACE_FORMAT = os.getenv("RAG_TRACE_FORMAT", "chrome")
+TRACE_PATH = os.path.join(BASE_DIR, f"trace_{AGENT_MODE}.json" if TRACE_FORMAT == "chrome"
+                          else f"trace_{AGENT_MODE}.otlp.jsonl")
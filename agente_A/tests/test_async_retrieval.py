@@ -0,0 +1,53 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("langchain_openai")
+pytest.importorskip("langchain_community")
+
+import rag_tools
+
+
+class _Stop(Exception):
+    pass
+
+
+def test_blocking_retrieval_does_not_serialize_requests(monkeypatch):
+    lock = threading.Lock()
+    running = {"now": 0, "max": 0}
+
+    def blocking(seconds):
+        with lock:
+            running["now"] += 1
+            running["max"] = max(running["max"], running["now"])
+        time.sleep(seconds)
+        with lock:
+            running["now"] -= 1
+
+    def load_vs():
+        blocking(0.2)
+        return object()
+
+    def lexical(query, k):
+        blocking(0.2)
+        raise _Stop()
+
+    monkeypatch.setattr(rag_tools, "_load_vs", load_vs)
+    monkeypatch.setattr(rag_tools, "_lexical", lexical)
+
+    async def request(query):
+        async for _ in rag_tools.arag_tool_stream(query, k=4):
+            pass
+
+    async def main():
+        return await asyncio.gather(request("uno"), request("dos"), return_exceptions=True)
+
+    start = time.time()
+    results = asyncio.run(main())
+    elapsed = time.time() - start
+
+    assert all(isinstance(r, _Stop) for r in results)
+    assert running["max"] == 2
+    assert elapsed < 0.7
@@ -0,0 +1,52 @@
+import pytest
+
+pytest.importorskip("langchain_text_splitters")
+tokenizers = pytest.importorskip("tokenizers")
+
+from chunking import FastTokenSplitter, TOKENIZER_MODEL
+
+PAGE = (
+    "La distancia euclidiana entre x e y es la raíz cuadrada de ∑ (x_i − y_i)². "
+    "En backpropagation el gradiente se propaga hacia atrás con la regla de la cadena; "
+    "el descenso de gradiente actualiza w ← w − η ∇L(w) hasta minimizar la pérdida. "
+    "Un kernel k(x, y) = φ(x)·φ(y) mide similitud en un espacio de características [SEP] "
+    "sin calcular φ explícitamente. Referencias: apuntes_semana_5.pdf, p. 12."
+)
+
+
+def _wordpiece():
+    from tokenizers import Tokenizer, decoders, models, pre_tokenizers
+    words = ["[UNK]", "[SEP]", "la", "suma", "de", "hola", "mundo", "##s"]
+    tok = Tokenizer(models.WordPiece({w: i for i, w in enumerate(words)}, unk_token="[UNK]"))
+    tok.pre_tokenizer = pre_tokenizers.BertPreTokenizer()
+    tok.decoder = decoders.WordPiece()
+    tok.add_special_tokens(["[UNK]", "[SEP]"])
+    return tok
+
+
+def test_decode_keeps_special_tokens(monkeypatch):
+    tok = _wordpiece()
+
+    class _Local:
+        @staticmethod
+        def from_pretrained(name):
+            return tok
+
+    monkeypatch.setattr(tokenizers, "Tokenizer", _Local)
+    splitter = FastTokenSplitter(tokens_per_chunk=3, chunk_overlap=1)
+    chunks = splitter.split_text("la suma ∑ de hola [SEP] mundo")
+    # como el tokenizer de transformers: [UNK] y [SEP] no desaparecen del texto
+    assert "[UNK]" in " ".join(chunks)
+    assert "[SEP]" in " ".join(chunks)
+
+
+def test_same_chunks_as_sentence_transformers_splitter():
+    pytest.importorskip("sentence_transformers")
+    from langchain_text_splitters import SentenceTransformersTokenTextSplitter
+    try:
+        old = SentenceTransformersTokenTextSplitter(tokens_per_chunk=32, chunk_overlap=8,
+                                                    model_name=TOKENIZER_MODEL)
+        new = FastTokenSplitter(tokens_per_chunk=32, chunk_overlap=8)
+    except Exception as e:  # sin red no se puede bajar el modelo
+        pytest.skip(f"modelo {TOKENIZER_MODEL} no disponible: {e}")
+    assert new.split_text(PAGE) == old.split_text(PAGE)
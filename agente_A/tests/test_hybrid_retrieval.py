@@ -0,0 +1,43 @@
+import pytest
+
+pytest.importorskip("langchain_openai")
+pytest.importorskip("langchain_community")
+from langchain_core.documents import Document
+
+import rag_tools
+
+
+class _Store:
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    def get_vectors(self, ids):
+        return [self.vectors.get(i) for i in ids]
+
+
+def _doc(chunk_id):
+    return Document(page_content=chunk_id, metadata={"chunk_id": chunk_id})
+
+
+def test_lexical_similarity_is_cosine_without_assuming_unit_norm():
+    vs = _Store({"a": [2.0, 0.0], "b": [3.0, 3.0]})
+    sims = rag_tools._lexical_similarity(vs, [5.0, 0.0], [_doc("a"), _doc("b"), _doc("c")])
+    assert sims[0] == pytest.approx(1.0)
+    assert sims[1] == pytest.approx(2 ** -0.5)
+    assert sims[2] is None
+
+
+def test_lexical_fast_path_keeps_bm25_order_with_cosine_scores():
+    vs = _Store({"a": [0.0, 1.0], "b": [1.0, 0.0]})
+    results = rag_tools._lexical_only(vs, [1.0, 0.0], [(_doc("a"), 4.0), (_doc("b"), 2.0)])
+    assert [doc.page_content for doc, _ in results] == ["a", "b"]
+    assert [doc.metadata["rank_score"] for doc, _ in results] == [1.0, 0.5]
+    assert [score for _, score in results] == pytest.approx([0.0, 1.0])
+
+
+def test_threshold_applies_to_fast_path_hits(monkeypatch):
+    monkeypatch.setattr(rag_tools, "RETRIEVAL_SCORE_THRESHOLD", 0.3)
+    vs = _Store({"a": [0.0, 1.0], "b": [1.0, 0.0]})
+    results = rag_tools._apply_threshold(
+        rag_tools._lexical_only(vs, [1.0, 0.0], [(_doc("a"), 4.0), (_doc("b"), 2.0)]))
+    assert [doc.page_content for doc, _ in results] == ["b"]
@@ -0,0 +1,55 @@
+import pytest
+
+pytest.importorskip("langchain_core")
+from langchain_core.documents import Document
+
+from index_manifest import IndexManifest, chunk_ids, page_key
+
+PARAMS = "recursive:800:100"
+
+
+def _page(text, source="apuntes.pdf", page=1):
+    return Document(page_content=text, metadata={"source": source, "page": page})
+
+
+def _indexed(tmp_path, *docs):
+    manifest = IndexManifest(str(tmp_path), PARAMS)
+    for doc in docs:
+        manifest.diff_page(doc, PARAMS)
+        manifest.record(doc, chunk_ids(doc, 2))
+    return manifest
+
+
+def test_new_page_is_changed_without_stale_ids(tmp_path):
+    changed, stale = IndexManifest(str(tmp_path)).diff_page(_page("hola"), PARAMS)
+    assert changed and stale == []
+
+
+def test_unchanged_page_is_skipped(tmp_path):
+    manifest = _indexed(tmp_path, _page("hola"))
+    assert manifest.diff_page(_page("hola"), PARAMS) == (False, [])
+
+
+def test_changed_text_or_params_returns_previous_ids(tmp_path):
+    manifest = _indexed(tmp_path, _page("hola"))
+    old_ids = ["apuntes.pdf#1:0", "apuntes.pdf#1:1"]
+    assert manifest.diff_page(_page("chao"), PARAMS) == (True, old_ids)
+    assert manifest.diff_page(_page("hola"), "recursive:500:50") == (True, old_ids)
+
+
+def test_removed_pages_and_forget(tmp_path):
+    kept, gone = _page("a", page=1), _page("b", page=2)
+    manifest = _indexed(tmp_path, kept, gone)
+    seen = {page_key(kept)}
+    assert manifest.removed_ids(seen) == ["apuntes.pdf#2:0", "apuntes.pdf#2:1"]
+    manifest.forget_missing(seen)
+    assert list(manifest.pages) == [page_key(kept)]
+
+
+def test_save_and_load(tmp_path):
+    manifest = _indexed(tmp_path, _page("hola"))
+    manifest.save()
+    loaded = IndexManifest.load(str(tmp_path))
+    assert loaded.params == PARAMS
+    assert loaded.pages == manifest.pages
+    assert loaded.diff_page(_page("hola"), PARAMS) == (False, [])
@@ -0,0 +1,66 @@
+from types import SimpleNamespace
+
+from llm_usage import (
+    UsageRecordingCompletions, new_usage, add_usage, tracking, tracked, cost_usd, _current,
+)
+
+
+class FakeCompletions:
+    """client.chat.completions minimo: cada create informa 10 tokens de prompt y 2 de respuesta."""
+
+    def create(self, **params):
+        usage = {"prompt_tokens": 10, "completion_tokens": 2}
+        if params.get("stream"):
+            return iter([SimpleNamespace(usage=None), SimpleNamespace(usage=usage)])
+        return SimpleNamespace(usage=usage)
+
+
+def _fake_llm_stream(client):
+    # como ChatOpenAI.stream: la peticion se hace al pedir el primer chunk
+    for chunk in client.create(stream=True):
+        yield chunk
+
+
+def test_tracking_restores_previous_usage():
+    outer, inner = new_usage(), new_usage()
+    with tracking(outer):
+        with tracking(inner):
+            assert _current.get() is inner
+        assert _current.get() is outer
+    assert _current.get() is None
+
+
+def test_non_stream_call_is_recorded():
+    client = UsageRecordingCompletions(FakeCompletions())
+    usage = new_usage()
+    with tracking(usage):
+        client.create(messages=[])
+    client.create(messages=[])  # fuera del bloque no se registra
+    assert usage == {"prompt_tokens": 10, "completion_tokens": 2, "cached_tokens": 0, "calls": 1}
+
+
+def test_tracked_stream_records_usage_and_binds_nothing_between_chunks():
+    client = UsageRecordingCompletions(FakeCompletions())
+    usage = new_usage()
+    for _ in tracked(_fake_llm_stream(client), usage):
+        assert _current.get() is None
+    assert usage["prompt_tokens"] == 10 and usage["calls"] == 1
+
+
+def test_abandoned_stream_leaves_no_usage_bound():
+    client = UsageRecordingCompletions(FakeCompletions())
+    usage = new_usage()
+    stream = tracked(_fake_llm_stream(client), usage)
+    next(stream)
+    del stream
+    client.create(messages=[])
+    assert _current.get() is None
+    assert usage["calls"] == 0
+
+
+def test_add_usage_and_cost():
+    total = add_usage(new_usage(), {"prompt_tokens": 1000, "completion_tokens": 500, "cached_tokens": 200, "calls": 1})
+    add_usage(total, {"prompt_tokens": 1000, "completion_tokens": 0, "cached_tokens": 0, "calls": 1})
+    assert total == {"prompt_tokens": 2000, "completion_tokens": 500, "cached_tokens": 200, "calls": 2}
+    prices = {"input": 1.0, "cached_input": 0.5, "output": 2.0}
+    assert cost_usd(total, prices) == (1.0 * 1800 + 0.5 * 200 + 2.0 * 500) / 1e6
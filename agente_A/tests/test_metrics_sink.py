@@ -0,0 +1,55 @@
+import time
+
+import pytest
+
+from metrics_sink import JsonlSink, iter_records, segments
+
+
+def _wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_flush_every_writes_in_order(tmp_path):
+    path = tmp_path / "m.jsonl"
+    sink = JsonlSink(str(path), flush_every=2, flush_interval_s=0)
+    for i in range(3):
+        sink.write({"i": i})
+    assert [r["i"] for r in iter_records(str(path))] == [0, 1]
+    sink.close()
+    assert [r["i"] for r in iter_records(str(path))] == [0, 1, 2]
+
+
+def test_idle_buffer_is_flushed_by_timer(tmp_path):
+    path = tmp_path / "m.jsonl"
+    sink = JsonlSink(str(path), flush_every=100, flush_interval_s=0.05)
+    sink.write({"i": 0})
+    assert _wait_for(lambda: path.exists() and list(iter_records(str(path))) == [{"i": 0}])
+    sink.close()
+
+
+def test_failed_write_keeps_buffer(tmp_path):
+    blocker = tmp_path / "no_es_carpeta"
+    blocker.write_text("")
+    sink = JsonlSink(str(blocker / "m.jsonl"), flush_every=100, flush_interval_s=0)
+    sink.write({"i": 0})
+    with pytest.raises(OSError):
+        sink.flush()
+    blocker.unlink()
+    sink.flush()
+    assert list(iter_records(str(blocker / "m.jsonl"))) == [{"i": 0}]
+    sink.close()
+
+
+def test_rotation_keeps_all_records(tmp_path):
+    path = tmp_path / "m.jsonl"
+    sink = JsonlSink(str(path), flush_every=1, flush_interval_s=0, max_bytes=30, backups=10)
+    for i in range(6):
+        sink.write({"registro": i})
+    sink.close()
+    assert len(segments(str(path))) > 1
+    assert [r["registro"] for r in iter_records(str(path))] == list(range(6))
@@ -0,0 +1,76 @@
+import math
+import random
+
+import pytest
+
+from quantile_sketch import QuantileSketch
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def _lognormal(n, seed):
+    rng = random.Random(seed)
+    return [rng.lognormvariate(6.0, 1.0) for _ in range(n)]
+
+
+def _exact(values, q):
+    # mismo rango que usa el sketch: el elemento floor(q * (n - 1)) de los valores ordenados
+    return sorted(values)[math.floor(q * (len(values) - 1))]
+
+
+def _sketch(values, accuracy=0.01):
+    sketch = QuantileSketch(accuracy)
+    for value in values:
+        sketch.add(value)
+    return sketch
+
+
+@pytest.mark.parametrize("accuracy", [0.01, 0.05])
+def test_quantiles_within_relative_accuracy(accuracy):
+    values = _lognormal(20000, seed=1)
+    sketch = _sketch(values, accuracy)
+    for q in QUANTILES:
+        exact = _exact(values, q)
+        assert abs(sketch.quantile(q) - exact) <= accuracy * exact
+
+
+def test_matches_numpy_quantile():
+    np = pytest.importorskip("numpy")
+    values = _lognormal(5000, seed=2)
+    sketch = _sketch(values)
+    for q in QUANTILES:
+        exact = float(np.quantile(values, q, method="lower"))
+        assert sketch.quantile(q) == pytest.approx(exact, rel=0.01)
+
+
+def test_merge_equals_single_sketch():
+    values = _lognormal(4000, seed=3)
+    merged = _sketch(values[:1500])
+    merged.merge(_sketch(values[1500:]))
+    whole = _sketch(values)
+    assert merged.counts == whole.counts
+    assert (merged.count, merged.min, merged.max) == (whole.count, whole.min, whole.max)
+    assert merged.total == pytest.approx(whole.total)
+    for q in QUANTILES:
+        assert merged.quantile(q) == whole.quantile(q)
+
+
+def test_merge_rejects_different_accuracy():
+    with pytest.raises(ValueError):
+        QuantileSketch(0.01).merge(QuantileSketch(0.02))
+
+
+def test_zeros_empty_and_bounds():
+    assert QuantileSketch().quantile(0.5) == 0.0
+    sketch = _sketch([0.0, 0.0, 0.0, 10.0])
+    assert sketch.quantile(0.5) == 0.0
+    assert sketch.quantile(1.0) == 10.0
+    assert sketch.histogram()[0] == (0.0, 3)
+
+
+def test_dict_roundtrip():
+    sketch = _sketch(_lognormal(500, seed=4))
+    restored = QuantileSketch.from_dict(sketch.to_dict())
+    assert restored.counts == sketch.counts
+    assert [restored.quantile(q) for q in QUANTILES] == [sketch.quantile(q) for q in QUANTILES]
+    assert QuantileSketch.from_dict(QuantileSketch().to_dict()).count == 0
@@ -0,0 +1,122 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager, nullcontext
+from typing import List, Dict, Any, Optional
+
+_NULL_SPAN = nullcontext()
+_write_lock = threading.Lock()
+
+class Tracer:
+    """
+    Registra etapas anidadas de una pregunta con time.perf_counter. Se exporta como
+    Chrome trace (chrome://tracing, Perfetto) o como OTLP JSON de OpenTelemetry.
+    Una instancia por pregunta; los spans se anidan segun el orden de apertura.
+    """
+
+    def __init__(self, service: str = "rag"):
+        self.service = service
+        self.trace_id = os.urandom(16).hex()
+        self.spans: List[Dict[str, Any]] = []
+        self._stack: List[str] = []
+        self._t0 = time.perf_counter()
+        self._wall0_ns = time.time_ns()
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        """Mide el bloque; `attrs` queda como atributos del span."""
+        span_id = os.urandom(8).hex()
+        parent = self._stack[-1] if self._stack else None
+        self._stack.append(span_id)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self._stack.remove(span_id)  # un generador abandonado puede cerrar fuera de orden
+            self.spans.append({"name": name, "span_id": span_id, "parent": parent, "start": start,
+                               "end": end, "tid": threading.get_ident(), "attrs": attrs})
+
+    def event(self, name: str, **attrs):
+        """Marca instantanea (p.ej. primer token del LLM)."""
+        now = time.perf_counter()
+        self.spans.append({"name": name, "span_id": os.urandom(8).hex(),
+                           "parent": self._stack[-1] if self._stack else None, "start": now, "end": now,
+                           "tid": threading.get_ident(), "attrs": attrs})
+
+    def totals(self) -> Dict[str, float]:
+        """ms por etapa (sumando si se repite), para guardar junto a las metricas."""
+        totals: Dict[str, float] = {}
+        for s in self.spans:
+            if s["end"] > s["start"]:
+                totals[s["name"]] = totals.get(s["name"], 0.0) + (s["end"] - s["start"]) * 1000
+        return totals
+
+    def _us(self, t: float) -> float:
+        return (self._wall0_ns / 1000) + (t - self._t0) * 1e6
+
+    def to_chrome(self) -> List[Dict[str, Any]]:
+        """Eventos del Trace Event Format ("X" completos, "i" instantaneos), ts/dur en microsegundos."""
+        pid = os.getpid()
+        events = []
+        for s in sorted(self.spans, key=lambda s: s["start"]):
+            event = {"name": s["name"], "cat": self.service, "pid": pid, "tid": s["tid"],
+                     "ts": self._us(s["start"]), "args": dict(s["attrs"], trace_id=self.trace_id)}
+            if s["end"] > s["start"]:
+                event.update(ph="X", dur=(s["end"] - s["start"]) * 1e6)
+            else:
+                event.update(ph="i", s="t")
+            events.append(event)
+        return events
+
+    def to_otel(self) -> Dict[str, Any]:
+        """Un ExportTraceServiceRequest en JSON (formato del file exporter de OpenTelemetry)."""
+        def value(v):
+            if isinstance(v, bool):
+                return {"boolValue": v}
+            if isinstance(v, int):
+                return {"intValue": str(v)}
+            if isinstance(v, float):
+                return {"doubleValue": v}
+            return {"stringValue": str(v)}
+
+        spans = []
+        for s in self.spans:
+            span = {"traceId": self.trace_id, "spanId": s["span_id"], "name": s["name"], "kind": 1,
+                    "startTimeUnixNano": str(int(self._us(s["start"]) * 1000)),
+                    "endTimeUnixNano": str(int(self._us(s["end"]) * 1000)),
+                    "attributes": [{"key": k, "value": value(v)} for k, v in s["attrs"].items()]}
+            if s["parent"]:
+                span["parentSpanId"] = s["parent"]
+            spans.append(span)
+        return {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service}}]},
+            "scopeSpans": [{"scope": {"name": "tracing"}, "spans": spans}],
+        }]}
+
+    def append_to(self, path: str, fmt: str = "chrome"):
+        """
+        Agrega la traza a `path`. "chrome" usa el JSON Array Format sin cerrar (lo aceptan
+        chrome://tracing y Perfetto), asi se puede seguir agregando; "otel" escribe una linea por traza.
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with _write_lock:
+            if fmt == "otel":
+                lines = json.dumps(self.to_otel(), ensure_ascii=False) + "\n"
+            else:
+                lines = "".join(json.dumps(e, ensure_ascii=False) + ",\n" for e in self.to_chrome())
+                if not os.path.exists(path):
+                    lines = "[\n" + lines
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(lines)
+
+def span(tracer: Optional[Tracer], name: str, **attrs):
+    """tracer.span(...) o un contexto vacio si no hay tracer (trazas desactivadas)."""
+    return tracer.span(name, **attrs) if tracer is not None else _NULL_SPAN
+
+def event(tracer: Optional[Tracer], name: str, **attrs):
+    if tracer is not None:
+        tracer.event(name, **attrs)
@@ -3,8 +3,12 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 
+from metrics_sink import iter_records
+
 def load_metrics(json_path="metrics.json"):
-    """Carga metricas desde JSON."""
+    """Carga metricas desde JSON o desde un sink JSON Lines (.jsonl, con sus segmentos rotados)."""
+    if json_path.endswith(".jsonl"):
+        return list(iter_records(json_path))
     with open(json_path, 'r', encoding='utf-8') as f:
         return json.load(f)
 
@@ -58,7 +62,61 @@ def analyze_metrics(metrics_data):
     
     summary.to_csv('summary_B.csv')
     print("\nTabla guardada en 'summary_B.csv'")
+    
+    plot_score_distribution(df)
+    plot_prompt_tokens(df)
+
+def plot_score_distribution(df, path='scores_analysis_B.png'):
+    """
+    Distribucion de similitud coseno de los fragmentos recuperados (solo RAG).
+    Los del camino solo lexico no tienen similitud (score None) y no se grafican.
+    """
+    scores = [doc['score']
+              for docs, web in zip(df['retrieved_docs'], df['web_used']) if not web
+              for doc in docs if doc.get('score') is not None]
+    if not any(scores):
+        print("\nSin scores de recuperacion para graficar")
+        return
+    
+    fig, ax = plt.subplots(figsize=(8, 5))
+    ax.hist(scores, bins=20, color='skyblue', edgecolor='black')
+    ax.set_title('Distribucion de Similitud de Fragmentos Recuperados')
+    ax.set_xlabel('Similitud coseno')
+    ax.set_ylabel('Frecuencia')
+    
+    plt.tight_layout()
+    plt.savefig(path, dpi=300)
+    print(f"\nGrafica de scores guardada en '{path}'")
+
+def plot_prompt_tokens(df, path='prompt_tokens_B.png'):
+    """Tokens de cada parte del prompt (estimacion previa al envio) vs los que informo la API."""
+    if 'prompt_tokens_est' not in df or not any(df['prompt_tokens_est']):
+        print("\nSin estimaciones de tokens del prompt para graficar")
+        return
+    
+    parts = pd.DataFrame([est or {} for est in df['prompt_tokens_est']], index=df['question_id']).fillna(0)
+    parts = parts[[c for c in ('template', 'history', 'question', 'context') if c in parts]]
+    
+    print("\n--- TOKENS DEL PROMPT (estimados) ---")
+    print(parts.describe())
+    if df['prompt_tokens'].any():
+        print(f"\nCosto total: ${df['cost_usd'].sum():.4f} "
+              f"(promedio ${df['cost_usd'].mean():.5f} por pregunta)")
+    
+    fig, ax = plt.subplots(figsize=(10, 5))
+    parts.plot(kind='bar', stacked=True, ax=ax, width=0.8)
+    reported = df['prompt_tokens'].where(df['prompt_tokens'] > 0)
+    ax.plot(range(len(df)), reported, 'k_', markersize=20, markeredgewidth=2, label='API (prompt_tokens)')
+    ax.set_title('Tokens del Prompt por Pregunta')
+    ax.set_xlabel('Pregunta')
+    ax.set_ylabel('Tokens')
+    ax.legend()
+    
+    plt.tight_layout()
+    plt.savefig(path, dpi=300)
+    print(f"\nGrafica de tokens del prompt guardada en '{path}'")
 
 if __name__ == "__main__":
-    metrics = load_metrics()
+    import sys
+    metrics = load_metrics(sys.argv[1] if len(sys.argv) > 1 else "metrics.json")
     analyze_metrics(metrics)
\ No newline at end of file
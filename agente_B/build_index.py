@@ -1,4 +1,5 @@
-import os, re, glob, sys
+import os, re, glob, sys, time, json, argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from dotenv import load_dotenv
 
 env_path = os.path.join(os.path.dirname(__file__), "..", ".env")
@@ -6,51 +7,185 @@ load_dotenv(env_path)
 
 from unidecode import unidecode
 from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import SentenceTransformersTokenTextSplitter
+from langchain_core.documents import Document
 from langchain_community.vectorstores import Chroma
-from langchain_openai import OpenAIEmbeddings
-from settings import DATA_DIR, DB_DIR, EMBED_MODEL, TOKENS_PER_CHUNK, TOKENS_OVERLAP
+from index_meta import write_index_meta, dir_size_bytes
+from index_manifest import IndexManifest, chunk_ids, page_key
+from embed_pipeline import EmbeddingStage, upsert_chunks, CHECKPOINT_FILE
+from chunking import crear_splitter, chunk_stats
+from resources import get_embeddings, open_numpy_store, reload as reload_resources
+from lexical_index import BM25Index, INDEX_FILE as BM25_FILE
+from settings import (DATA_DIR, DB_DIR, EMBED_MODEL, EMBED_BACKEND, EMBED_DIM, INGEST_WORKERS, AGENT_MODE,
+                      VECTOR_STORE, NUMPY_STORE_QUANTIZATION, NUMPY_STORE_TRUNCATE_DIM, BM25_K1, BM25_B,
+                      CHUNK_STRATEGY, CHUNK_STRATEGY_PARAMS)
 
 def limpiar_texto(txt: str) -> str:
     txt = unidecode(txt)
     txt = re.sub(r"\s+", " ", txt).strip()
     return txt
 
-def cargar_docs():
-    pdfs = glob.glob(os.path.join(DATA_DIR, "*.pdf"))
+def _parse_pdf(pdf_path: str):
+    """Lee y limpia un PDF (corre en un proceso del pool)."""
+    start = time.perf_counter()
+    loader = PyPDFLoader(pdf_path)
+    pages = [(d.metadata.get("page", None), limpiar_texto(d.page_content)) for d in loader.load()]
+    return os.path.basename(pdf_path), pages, time.perf_counter() - start
+
+def iter_docs(workers: int = INGEST_WORKERS):
+    """
+    Genera las paginas limpias de todos los PDFs a medida que cada archivo termina,
+    parseando en paralelo con un pool de procesos.
+    """
+    pdfs = sorted(glob.glob(os.path.join(DATA_DIR, "*.pdf")))
     if not pdfs:
         raise SystemExit(f"No hay PDFs en {DATA_DIR}")
-    docs = []
-    for pdf_path in pdfs:
-        loader = PyPDFLoader(pdf_path)
-        for d in loader.load():
-            d.page_content = limpiar_texto(d.page_content)
-            d.metadata = {
-                "source": os.path.basename(pdf_path),
-                "page": d.metadata.get("page", None),
-                "autor": "Estudiante",
-            }
-            docs.append(d)
-    return docs
-
-def main():
-    print(f"DATA_DIR = {DATA_DIR}")
-    docs = cargar_docs()
 
-    splitter = SentenceTransformersTokenTextSplitter(
-        tokens_per_chunk=TOKENS_PER_CHUNK,
-        chunk_overlap=TOKENS_OVERLAP,
-        model_name="sentence-transformers/all-MiniLM-L6-v2",
-    )
-    chunks = splitter.split_documents(docs)
-    print(f"Chunks creados: {len(chunks)}")
+    start = time.perf_counter()
+    total_pages = 0
+    if workers == 1:
+        results = (_parse_pdf(p) for p in pdfs)
+        pool = None
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        results = (f.result() for f in as_completed([pool.submit(_parse_pdf, p) for p in pdfs]))
+    try:
+        for name, pages, parse_s in results:
+            total_pages += len(pages)
+            print(f"  {name}: {len(pages)} pags en {parse_s:.2f}s ({len(pages) / max(parse_s, 1e-9):.1f} pags/s)")
+            for page, text in pages:
+                yield Document(
+                    page_content=text,
+                    metadata={"source": name, "page": page, "autor": "Estudiante"},
+                )
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    elapsed = time.perf_counter() - start
+    print(f"PDFs: {len(pdfs)} | paginas: {total_pages} | {elapsed:.2f}s ({total_pages / max(elapsed, 1e-9):.1f} pags/s)")
+
+def cargar_docs():
+    return list(iter_docs())
+
+def guardar_paginas(path: str, docs) -> int:
+    """Guarda paginas ya limpias en JSONL para reutilizarlas en otra construccion."""
+    n = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        for d in docs:
+            f.write(json.dumps({"text": d.page_content, "metadata": d.metadata}, ensure_ascii=False) + "\n")
+            n += 1
+    return n
+
+def iter_paginas(path: str):
+    """Lee las paginas guardadas con guardar_paginas."""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            rec = json.loads(line)
+            yield Document(page_content=rec["text"], metadata=rec["metadata"])
+
+# Si cambian, todas las huellas cambian y se re-embebe todo
+CHUNK_PARAMS = f"{CHUNK_STRATEGY}|{json.dumps(CHUNK_STRATEGY_PARAMS, sort_keys=True)}|{EMBED_MODEL}"
 
-    emb = OpenAIEmbeddings(model=EMBED_MODEL)
+def abrir_store(emb):
+    if VECTOR_STORE == "numpy":
+        return open_numpy_store(DB_DIR)
+    return Chroma(persist_directory=DB_DIR, embedding_function=emb)
 
-    if os.path.exists(DB_DIR):
+def contar_chunks(vs) -> int:
+    return vs.count() if VECTOR_STORE == "numpy" else vs._collection.count()
+
+def todos_los_chunks(vs):
+    """IDs, textos y metadata de todo el indice (el BM25 se recalcula completo porque el IDF es global)."""
+    if VECTOR_STORE == "numpy":
+        return vs.get_all()
+    data = vs._collection.get(include=["documents", "metadatas"])
+    return data["ids"], data["documents"], [m or {} for m in data["metadatas"]]
+
+def main(full: bool = False, pages_path: str = None):
+    """
+    Construye o actualiza el indice. Con `pages_path` usa paginas ya parseadas
+    (ver --dump-pages) en vez de leer los PDFs de DATA_DIR.
+    """
+    start = time.perf_counter()
+    print(f"DATA_DIR = {DATA_DIR}")
+    pages = iter_paginas(pages_path) if pages_path else iter_docs()
+    emb = get_embeddings(EMBED_MODEL)
+    splitter = crear_splitter(CHUNK_STRATEGY, CHUNK_STRATEGY_PARAMS, embeddings=emb)
+
+    vs = abrir_store(emb)
+    manifest = IndexManifest.load(DB_DIR)
+    # el manifiesto es comun a ambos stores: si el configurado esta vacio se reconstruye todo
+    if full or manifest.params != CHUNK_PARAMS or (manifest.pages and not contar_chunks(vs)):
         print(f"Limpiando indice: {DB_DIR}")
-    Chroma.from_documents(chunks, embedding=emb, persist_directory=DB_DIR).persist()
-    print(f"Indice B listo en {DB_DIR}")
+        vs.delete_collection()
+        vs = abrir_store(emb) if VECTOR_STORE == "chroma" else vs
+        manifest = IndexManifest(DB_DIR, CHUNK_PARAMS)
+
+    seen = set()
+    n_changed = 0
+    chunks, ids, stale_ids = [], [], []
+    split_s = 0.0
+    for doc in pages:
+        seen.add(page_key(doc))
+        changed, old_ids = manifest.diff_page(doc, CHUNK_PARAMS)
+        if not changed:
+            continue
+        n_changed += 1
+        stale_ids.extend(old_ids)
+        t0 = time.perf_counter()
+        page_chunks = splitter.split_documents([doc])
+        split_s += time.perf_counter() - t0
+        page_ids = chunk_ids(doc, len(page_chunks))
+        manifest.record(doc, page_ids)
+        chunks.extend(page_chunks)
+        ids.extend(page_ids)
+
+    stale_ids.extend(manifest.removed_ids(seen))
+    manifest.forget_missing(seen)
+    print(f"Paginas: {len(seen)} | nuevas o modificadas: {n_changed} | chunks a borrar: {len(stale_ids)}")
+    print(f"Chunks a embeber: {len(chunks)}")
+    split_stats = chunk_stats(chunks, split_s, n_changed, EMBED_DIM)
+    if chunks:
+        print(f"Chunking {CHUNK_STRATEGY}: {split_stats['tokens_mean']:.1f} tokens/chunk "
+              f"(p50 {split_stats['tokens_p50']:.0f}, p95 {split_stats['tokens_p95']:.0f}) | "
+              f"{split_stats['pages_per_s']:.1f} pags/s")
+
+    if stale_ids:
+        vs.delete(ids=stale_ids)
+    embed_stats = {}
+    if chunks:
+        stage = EmbeddingStage(checkpoint_path=os.path.join(DB_DIR, CHECKPOINT_FILE))
+        vectors = stage.run(ids, [c.page_content for c in chunks])
+        upsert_chunks(vs, ids, chunks, vectors)
+        stage.finish()
+        embed_stats = stage.stats
+    if VECTOR_STORE == "numpy":
+        vs.save()
+    if chunks or stale_ids or not os.path.exists(os.path.join(DB_DIR, BM25_FILE)):
+        all_ids, texts, metas = todos_los_chunks(vs)
+        BM25Index.build(texts, metas, k1=BM25_K1, b=BM25_B, ids=all_ids).save(DB_DIR)
+        print(f"Indice BM25: {len(texts)} chunks")
+
+    if chunks or stale_ids:
+        manifest.save()
+        total = sum(len(p["chunk_ids"]) for p in manifest.pages.values())
+        quantization = [NUMPY_STORE_QUANTIZATION, NUMPY_STORE_TRUNCATE_DIM] if VECTOR_STORE == "numpy" else None
+        write_index_meta(DB_DIR, chunks=total, embed_backend=EMBED_BACKEND, embed_model=EMBED_MODEL,
+                         embed_dim=EMBED_DIM, embed_stats=embed_stats, vector_store=VECTOR_STORE,
+                         quantization=quantization,
+                         chunk_strategy=CHUNK_STRATEGY, chunk_params=CHUNK_STRATEGY_PARAMS,
+                         split_stats=split_stats, index_size_mb=dir_size_bytes(DB_DIR) / (1024 * 1024),
+                         build_seconds=time.perf_counter() - start)
+        # nueva version: lo abierto en este proceso (store, BM25, version en memoria) se relee
+        reload_resources()
+    print(f"Indice {AGENT_MODE} listo en {DB_DIR}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--full", action="store_true", help="reconstruye el indice desde cero")
+    parser.add_argument("--pages", help="JSONL con paginas ya parseadas (en vez de los PDFs)")
+    parser.add_argument("--dump-pages", help="solo parsea los PDFs y guarda las paginas en este JSONL")
+    args = parser.parse_args()
+    if args.dump_pages:
+        print(f"Paginas guardadas: {guardar_paginas(args.dump_pages, iter_docs())}")
+    else:
+        main(full=args.full, pages_path=args.pages)
\ No newline at end of file
@@ -0,0 +1,260 @@
+import os
+import re
+import sys
+import time
+import json
+import argparse
+import tempfile
+import statistics
+import subprocess
+from typing import Callable, Dict, List, Any, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_text_splitters import TextSplitter, RecursiveCharacterTextSplitter
+from langchain_text_splitters.base import Tokenizer, split_text_on_tokens
+
+from context_packer import count_tokens
+
+# Tokenizer de la estrategia "token" (el mismo que usaba SentenceTransformersTokenTextSplitter)
+TOKENIZER_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+# Fin de oracion: . ! ? seguidos de espacio (el texto ya viene sin saltos de linea)
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+def split_sentences(text: str) -> List[str]:
+    return [s for s in SENTENCE_END.split(text) if s.strip()]
+
+class SentenceSplitter(TextSplitter):
+    """Agrupa oraciones completas hasta chunk_size tokens (no corta oraciones salvo que excedan el tamano)."""
+
+    def __init__(self, **kwargs):
+        super().__init__(length_function=count_tokens, **kwargs)
+
+    def split_text(self, text: str) -> List[str]:
+        return self._merge_splits(split_sentences(text), " ")
+
+class FastTokenSplitter(TextSplitter):
+    """
+    Mismos cortes que SentenceTransformersTokenTextSplitter pero solo con el tokenizer
+    rapido (`tokenizers`): no importa torch ni carga el modelo. Decodifica sin saltar
+    tokens especiales, igual que el tokenizer de transformers que usa el original.
+    """
+
+    def __init__(self, tokens_per_chunk: int, chunk_overlap: int, model_name: str = TOKENIZER_MODEL, **kwargs):
+        super().__init__(chunk_overlap=chunk_overlap, **kwargs)
+        from tokenizers import Tokenizer as HFTokenizer
+        self.tokens_per_chunk = tokens_per_chunk
+        self.tokenizer = HFTokenizer.from_pretrained(model_name)
+        self.tokenizer.no_truncation()
+        self.tokenizer.no_padding()
+
+    def split_text(self, text: str) -> List[str]:
+        tokenizer = Tokenizer(
+            chunk_overlap=self._chunk_overlap,
+            tokens_per_chunk=self.tokens_per_chunk,
+            decode=lambda ids: self.tokenizer.decode(ids, skip_special_tokens=False),
+            encode=lambda t: self.tokenizer.encode(t, add_special_tokens=False).ids,
+        )
+        return split_text_on_tokens(text=text, tokenizer=tokenizer)
+
+class PageSplitter(TextSplitter):
+    """Un chunk por pagina."""
+
+    def split_text(self, text: str) -> List[str]:
+        return [text] if text.strip() else []
+
+class SemanticSplitter(SentenceSplitter):
+    """
+    Corta donde la similitud entre oraciones vecinas cae bajo el percentil `breakpoint_percentile`;
+    los grupos que exceden chunk_size se vuelven a dividir por oraciones.
+    """
+
+    def __init__(self, embeddings, breakpoint_percentile: float = 20.0, **kwargs):
+        super().__init__(**kwargs)
+        self.embeddings = embeddings
+        self.breakpoint_percentile = breakpoint_percentile
+
+    def split_text(self, text: str) -> List[str]:
+        sentences = split_sentences(text)
+        if len(sentences) < 3:
+            return self._merge_splits(sentences, " ")
+        vectors = np.asarray(self.embeddings.embed_documents(sentences), dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+        sims = np.sum(vectors[:-1] * vectors[1:], axis=1)
+        cut = np.percentile(sims, self.breakpoint_percentile)
+
+        chunks, group = [], [sentences[0]]
+        for sentence, sim in zip(sentences[1:], sims):
+            if sim < cut:
+                chunks.extend(self._merge_splits(group, " "))
+                group = []
+            group.append(sentence)
+        chunks.extend(self._merge_splits(group, " "))
+        return chunks
+
+def _fixed_char(chunk_size: int, chunk_overlap: int, **_):
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        separators=["\n\n", "\n", " ", ""],
+    )
+
+def _token(chunk_size: int, chunk_overlap: int, **_):
+    return FastTokenSplitter(tokens_per_chunk=chunk_size, chunk_overlap=chunk_overlap)
+
+def _st_token(chunk_size: int, chunk_overlap: int, **_):
+    # implementacion original (importa torch y carga el modelo); se mantiene para --check-token
+    from langchain_text_splitters import SentenceTransformersTokenTextSplitter
+    return SentenceTransformersTokenTextSplitter(
+        tokens_per_chunk=chunk_size,
+        chunk_overlap=chunk_overlap,
+        model_name=TOKENIZER_MODEL,
+    )
+
+def _sentence(chunk_size: int, chunk_overlap: int, **_):
+    return SentenceSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+def _page(**_):
+    return PageSplitter()
+
+def _semantic(chunk_size: int, chunk_overlap: int, embeddings=None, **_):
+    if embeddings is None:
+        raise ValueError("La estrategia 'semantic' necesita embeddings")
+    return SemanticSplitter(embeddings, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+# nombre -> (fabrica, usa embeddings al dividir). chunk_size/chunk_overlap van en
+# caracteres para "fixed-char" y en tokens para el resto; "page" los ignora.
+STRATEGIES: Dict[str, Any] = {
+    "fixed-char": (_fixed_char, False),
+    "token": (_token, False),
+    "st-token": (_st_token, False),
+    "sentence": (_sentence, False),
+    "page": (_page, False),
+    "semantic": (_semantic, True),
+}
+
+def register(name: str, factory: Callable[..., TextSplitter], needs_embeddings: bool = False):
+    STRATEGIES[name] = (factory, needs_embeddings)
+
+def crear_splitter(strategy: str, params: Dict[str, Any], embeddings=None) -> TextSplitter:
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Estrategia de chunking desconocida: {strategy} (opciones: {', '.join(STRATEGIES)})")
+    factory, _ = STRATEGIES[strategy]
+    return factory(embeddings=embeddings, **params)
+
+def chunk_stats(chunks: List[Document], seconds: float, pages: int, vector_dim: int) -> Dict[str, Any]:
+    """Cantidad y largo (tokens) de los chunks, throughput del split y tamano estimado del indice."""
+    lengths = [count_tokens(c.page_content) for c in chunks]
+    text_bytes = sum(len(c.page_content.encode("utf-8")) for c in chunks)
+    return {
+        "chunks": len(chunks),
+        "tokens_total": sum(lengths),
+        "tokens_mean": statistics.mean(lengths) if lengths else 0.0,
+        "tokens_p50": float(np.percentile(lengths, 50)) if lengths else 0.0,
+        "tokens_p95": float(np.percentile(lengths, 95)) if lengths else 0.0,
+        "tokens_max": max(lengths, default=0),
+        "split_seconds": seconds,
+        "pages_per_s": pages / max(seconds, 1e-9),
+        "chunks_per_s": len(chunks) / max(seconds, 1e-9),
+        # vectores float32 + texto; no incluye el overhead de Chroma
+        "index_size_est_mb": (len(chunks) * vector_dim * 4 + text_bytes) / (1024 * 1024),
+    }
+
+def benchmark(pages: List[Document], strategies: List[str], params: Dict[str, Any],
+              vector_dim: int, embeddings=None) -> Dict[str, Dict[str, Any]]:
+    """Divide las mismas paginas con cada estrategia y devuelve sus estadisticas."""
+    results = {}
+    for name in strategies:
+        splitter = crear_splitter(name, params, embeddings=embeddings)
+        start = time.perf_counter()
+        chunks = splitter.split_documents(pages)
+        results[name] = chunk_stats(chunks, time.perf_counter() - start, len(pages), vector_dim)
+    return results
+
+def _probe(strategy: str, params: Dict[str, Any], pages_path: str) -> Dict[str, Any]:
+    """Arranque, tiempo de split y memoria maxima de una estrategia (se corre en un proceso aparte)."""
+    from build_index import iter_paginas
+    pages = list(iter_paginas(pages_path))
+    start = time.perf_counter()
+    splitter = crear_splitter(strategy, params)
+    startup_s = time.perf_counter() - start
+    start = time.perf_counter()
+    chunks = [c.page_content for c in splitter.split_documents(pages)]
+    from metrics import peak_rss_mb
+    return {
+        "startup_s": startup_s,
+        "split_s": time.perf_counter() - start,
+        "max_rss_mb": peak_rss_mb(),
+        "chunks": chunks,
+    }
+
+def check_token_splitter(pages: List[Document], params: Dict[str, Any],
+                         new: str = "token", old: str = "st-token") -> Dict[str, Any]:
+    """
+    Divide las mismas paginas con ambas implementaciones, cada una en su propio proceso para
+    medir arranque y memoria sin contaminarse, y compara los cortes chunk por chunk.
+    """
+    from build_index import guardar_paginas
+    with tempfile.TemporaryDirectory() as tmp:
+        pages_path = os.path.join(tmp, "paginas.jsonl")
+        guardar_paginas(pages_path, pages)
+        results = {}
+        for name in (old, new):
+            out = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--probe", name,
+                 "--pages", pages_path, "--params", json.dumps(params)],
+                cwd=os.path.dirname(os.path.abspath(__file__)), check=True, capture_output=True, text=True,
+            )
+            results[name] = json.loads(out.stdout.strip().splitlines()[-1])
+
+    a, b = results[old].pop("chunks"), results[new].pop("chunks")
+    mismatches = [i for i, (x, y) in enumerate(zip(a, b)) if x != y]
+    return {
+        "chunks": {old: len(a), new: len(b)},
+        "mismatches": len(mismatches) + abs(len(a) - len(b)),
+        "first_mismatch": mismatches[0] if mismatches else None,
+        old: results[old],
+        new: results[new],
+    }
+
+if __name__ == "__main__":
+    from settings import CHUNK_STRATEGY_PARAMS, EMBED_DIM, EMBED_MODEL
+    from build_index import iter_docs, iter_paginas
+
+    parser = argparse.ArgumentParser(description="Compara las estrategias de chunking sobre las mismas paginas")
+    parser.add_argument("--pages", help="JSONL de build_index.py --dump-pages (por defecto se leen los PDFs)")
+    parser.add_argument("--strategies", nargs="+",
+                        default=[n for n, (_, needs_emb) in STRATEGIES.items() if not needs_emb and n != "st-token"],
+                        help="'semantic' (embebe cada oracion) y 'st-token' (carga torch) no estan por defecto")
+    parser.add_argument("--params", type=json.loads, default=CHUNK_STRATEGY_PARAMS,
+                        help='JSON, p.ej. {"chunk_size": 200, "chunk_overlap": 30}')
+    parser.add_argument("--out", help="guarda los resultados en este JSON")
+    parser.add_argument("--check-token", type=int, metavar="N_PAGINAS",
+                        help="compara 'token' con 'st-token' (cortes, arranque y memoria) sobre N paginas")
+    parser.add_argument("--probe", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.probe:
+        print(json.dumps(_probe(args.probe, args.params, args.pages)))
+        sys.exit(0)
+
+    pages = list(iter_paginas(args.pages) if args.pages else iter_docs())
+    if args.check_token:
+        report = check_token_splitter(pages[:args.check_token], args.params)
+        print(json.dumps(report, indent=2))
+        sys.exit(0 if report["mismatches"] == 0 else 1)
+
+    embeddings: Optional[Any] = None
+    if any(STRATEGIES[n][1] for n in args.strategies):
+        from resources import get_embeddings
+        embeddings = get_embeddings(EMBED_MODEL)
+
+    results = benchmark(pages, args.strategies, args.params, EMBED_DIM, embeddings=embeddings)
+    print(f"{'estrategia':<12} {'chunks':>7} {'tok prom':>9} {'p50':>6} {'p95':>6} {'pags/s':>9} {'indice MB':>10}")
+    for name, s in results.items():
+        print(f"{name:<12} {s['chunks']:>7} {s['tokens_mean']:>9.1f} {s['tokens_p50']:>6.0f} "
+              f"{s['tokens_p95']:>6.0f} {s['pages_per_s']:>9.1f} {s['index_size_est_mb']:>10.2f}")
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,93 @@
+import math
+from functools import lru_cache
+from typing import List, Tuple, Optional
+
+import tiktoken
+from langchain_core.documents import Document
+
+SEPARATOR = "\n---\n"
+
+@lru_cache(maxsize=1)
+def get_tokenizer():
+    # compartido con MetricsCollector.count_tokens
+    try:
+        return tiktoken.encoding_for_model("gpt-3.5-turbo")
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+def count_tokens(text: str) -> int:
+    return len(get_tokenizer().encode(text, disallowed_special=()))
+
+def candidates_needed(budget_tokens: int, chunk_tokens: int, spare: int = 1) -> int:
+    """Cuantos fragmentos pedir al vector store para llenar el presupuesto."""
+    return max(1, math.ceil(budget_tokens / max(chunk_tokens, 1))) + spare
+
+def _overlap(a: str, b: str, min_len: int = 20) -> int:
+    """Largo del sufijo de `a` que es prefijo de `b` (0 si es menor que min_len)."""
+    for n in range(min(len(a), len(b)), min_len - 1, -1):
+        if a.endswith(b[:n]):
+            return n
+    return 0
+
+def _same_page(a: Document, b: Document) -> bool:
+    return (a.metadata.get("source"), a.metadata.get("page")) == (b.metadata.get("source"), b.metadata.get("page"))
+
+def _merge(a: Document, b: Document) -> Optional[Document]:
+    """Une dos fragmentos de la misma pagina si uno contiene al otro o se solapan."""
+    ta, tb = a.page_content, b.page_content
+    if tb in ta:
+        return a
+    if ta in tb:
+        return Document(page_content=tb, metadata=a.metadata)
+    n = _overlap(ta, tb)
+    if n:
+        return Document(page_content=ta + tb[n:], metadata=a.metadata)
+    n = _overlap(tb, ta)
+    if n:
+        return Document(page_content=tb + ta[n:], metadata=a.metadata)
+    return None
+
+def _best(a: Optional[float], b: Optional[float]) -> Optional[float]:
+    if a is None or b is None:
+        return b if a is None else a
+    return max(a, b)
+
+def dedupe(scored: List[Tuple[Document, Optional[float]]]) -> List[Tuple[Document, Optional[float]]]:
+    """
+    Fusiona fragmentos solapados de la misma pagina; conserva el mejor score.
+    Se respeta el orden recibido (la recuperacion ya los entrega rankeados).
+    """
+    result: List[Tuple[Document, Optional[float]]] = []
+    for doc, score in scored:
+        for i, (kept, kept_score) in enumerate(result):
+            if _same_page(kept, doc):
+                merged = _merge(kept, doc)
+                if merged is not None:
+                    result[i] = (merged, _best(kept_score, score))
+                    break
+        else:
+            result.append((doc, score))
+    return result
+
+def pack_context(scored: List[Tuple[Document, Optional[float]]],
+                 budget_tokens: int) -> List[Tuple[Document, Optional[float]]]:
+    """
+    Toma los fragmentos en el orden recibido (mas relevante primero, ya deduplicados)
+    hasta llenar `budget_tokens`. Un fragmento que no cabe se salta y se prueba con el siguiente.
+    """
+    candidates = dedupe(scored)
+    packed = []
+    used = 0
+    sep_tokens = count_tokens(SEPARATOR)
+    for doc, score in candidates:
+        cost = count_tokens(doc.page_content) + (sep_tokens if packed else 0)
+        if used + cost > budget_tokens:
+            continue
+        packed.append((doc, score))
+        used += cost
+    if not packed and candidates:
+        # ni el mejor fragmento cabe: se recorta al presupuesto
+        doc, score = candidates[0]
+        text = get_tokenizer().decode(get_tokenizer().encode(doc.page_content, disallowed_special=())[:budget_tokens])
+        packed.append((Document(page_content=text, metadata=doc.metadata), score))
+    return packed
@@ -0,0 +1,216 @@
+import os
+import json
+import time
+import random
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Any, Optional, Callable, Tuple
+
+import tiktoken
+import openai
+
+from settings import (
+    EMBED_MODEL, EMBED_BACKEND, EMBED_BASE_URL, EMBED_BATCH_TOKENS, EMBED_BATCH_SIZE,
+    EMBED_CONCURRENCY, EMBED_MAX_RETRIES,
+)
+
+CHECKPOINT_FILE = "embed_checkpoint.jsonl"
+
+# (textos) -> (vectores, tokens consumidos)
+EmbedFn = Callable[[List[str]], Tuple[List[List[float]], int]]
+
+def openai_embed_fn(model: str = EMBED_MODEL, base_url: Optional[str] = EMBED_BASE_URL) -> EmbedFn:
+    """Cliente de embeddings; con `base_url` se puede apuntar a un servidor falso local."""
+    client = openai.OpenAI(base_url=base_url, max_retries=0)
+
+    def embed(texts: List[str]) -> Tuple[List[List[float]], int]:
+        response = client.embeddings.create(model=model, input=texts)
+        vectors = [d.embedding for d in sorted(response.data, key=lambda d: d.index)]
+        tokens = response.usage.total_tokens if response.usage else 0
+        return vectors, tokens
+
+    return embed
+
+def local_embed_fn(model=None) -> EmbedFn:
+    """Embeddings con el modelo local del registro (ver local_embeddings.LocalEmbeddings)."""
+    if model is None:
+        from resources import get_embeddings
+        model = get_embeddings().base
+
+    def embed(texts: List[str]) -> Tuple[List[List[float]], int]:
+        return model.embed_documents(texts), model.count_tokens(texts)
+
+    return embed
+
+def default_embed_fn() -> EmbedFn:
+    return local_embed_fn() if EMBED_BACKEND == "local" else openai_embed_fn()
+
+def batch_by_tokens(token_counts: List[int], max_tokens: int, max_items: int) -> List[List[int]]:
+    """Agrupa indices consecutivos sin pasar de `max_tokens` ni `max_items` por lote."""
+    batches, current, current_tokens = [], [], 0
+    for i, n in enumerate(token_counts):
+        if current and (current_tokens + n > max_tokens or len(current) >= max_items):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += n
+    if current:
+        batches.append(current)
+    return batches
+
+def _retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+def upsert_chunks(vs, ids: List[str], chunks: List[Any], vectors: List[List[float]], batch_size: int = 1000):
+    """Escribe en el vector store los chunks con sus embeddings ya calculados."""
+    collection = vs if hasattr(vs, "search_many") else vs._collection
+    for start in range(0, len(ids), batch_size):
+        end = start + batch_size
+        collection.upsert(
+            ids=ids[start:end],
+            embeddings=vectors[start:end],
+            documents=[c.page_content for c in chunks[start:end]],
+            metadatas=[c.metadata for c in chunks[start:end]],
+        )
+
+class EmbeddingStage:
+    """
+    Etapa de embeddings para build_index: lotes por presupuesto de tokens,
+    peticiones concurrentes acotadas, backoff exponencial ante rate limits y
+    checkpoint en disco para retomar una construccion interrumpida. Cada lote se
+    guarda en el checkpoint desde el hilo que lo embebio; ante un error o Ctrl-C se
+    cancelan los lotes que no empezaron y los reintentos en espera.
+    """
+
+    RETRYABLE = (openai.RateLimitError, openai.APIConnectionError,
+                 openai.APITimeoutError, openai.InternalServerError)
+
+    def __init__(self,
+                 embed_fn: Optional[EmbedFn] = None,
+                 checkpoint_path: Optional[str] = None,
+                 max_tokens: int = EMBED_BATCH_TOKENS,
+                 max_items: int = EMBED_BATCH_SIZE,
+                 concurrency: int = EMBED_CONCURRENCY,
+                 max_retries: int = EMBED_MAX_RETRIES):
+        self.embed_fn = embed_fn or default_embed_fn()
+        self.checkpoint_path = checkpoint_path
+        self.max_tokens = max_tokens
+        self.max_items = max_items
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.stats: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._pause_until = 0.0
+        self._stop = threading.Event()
+        try:
+            self._encoding = tiktoken.encoding_for_model(EMBED_MODEL)
+        except KeyError:
+            self._encoding = tiktoken.get_encoding("cl100k_base")
+
+    def _load_checkpoint(self) -> Dict[str, Tuple[str, List[float]]]:
+        done = {}
+        if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except json.JSONDecodeError:
+                        break  # linea truncada por una interrupcion
+                    done[rec["id"]] = (rec["text_hash"], rec["vector"])
+        return done
+
+    def _save_batch(self, ids: List[str], hashes: List[str], vectors: List[List[float]]):
+        if not self.checkpoint_path:
+            return
+        with self._lock, open(self.checkpoint_path, 'a', encoding='utf-8') as f:
+            for chunk_id, text_hash, vector in zip(ids, hashes, vectors):
+                f.write(json.dumps({"id": chunk_id, "text_hash": text_hash, "vector": vector}) + "\n")
+
+    def _call(self, texts: List[str]) -> Tuple[List[List[float]], int]:
+        for attempt in range(self.max_retries + 1):
+            if self._stop.wait(max(self._pause_until - time.time(), 0.0)):
+                raise RuntimeError("Etapa de embeddings cancelada")
+            try:
+                return self.embed_fn(texts)
+            except self.RETRYABLE as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = _retry_after(e) or min(60.0, 2 ** attempt) * (0.5 + random.random())
+                with self._lock:
+                    # todos los hilos esperan si el servidor pide bajar el ritmo
+                    self._pause_until = max(self._pause_until, time.time() + delay)
+                print(f"  Reintento {attempt + 1}/{self.max_retries} en {delay:.1f}s ({type(e).__name__})")
+
+    def _embed_batch(self, ids: List[str], hashes: List[str], texts: List[str]) -> Tuple[List[List[float]], int]:
+        """Embebe un lote y lo deja en el checkpoint antes de retornar."""
+        vectors, tokens = self._call(texts)
+        self._save_batch(ids, hashes, vectors)
+        return vectors, tokens
+
+    def run(self, ids: List[str], texts: List[str]) -> List[List[float]]:
+        """Embebe `texts` (con IDs estables) y retorna los vectores en el mismo orden."""
+        hashes = [hashlib.sha1(t.encode("utf-8")).hexdigest() for t in texts]
+        done = self._load_checkpoint()
+        vectors: List[Optional[List[float]]] = [None] * len(texts)
+        pending = []
+        for i, (chunk_id, text_hash) in enumerate(zip(ids, hashes)):
+            prev = done.get(chunk_id)
+            if prev is not None and prev[0] == text_hash:
+                vectors[i] = prev[1]
+            else:
+                pending.append(i)
+        if len(pending) < len(texts):
+            print(f"Checkpoint: {len(texts) - len(pending)} chunks ya embebidos, faltan {len(pending)}")
+
+        token_counts = [len(self._encoding.encode(texts[i], disallowed_special=())) for i in pending]
+        batches = [[pending[j] for j in b] for b in batch_by_tokens(token_counts, self.max_tokens, self.max_items)]
+
+        start = time.perf_counter()
+        n_chunks = 0
+        n_tokens = 0
+        self._stop.clear()
+        pool = ThreadPoolExecutor(max_workers=self.concurrency)
+        try:
+            futures = {
+                pool.submit(self._embed_batch, [ids[i] for i in b], [hashes[i] for i in b], [texts[i] for i in b]): b
+                for b in batches
+            }
+            for future in as_completed(futures):
+                batch = futures[future]
+                batch_vectors, tokens = future.result()
+                for i, vector in zip(batch, batch_vectors):
+                    vectors[i] = vector
+                n_chunks += len(batch)
+                n_tokens += tokens
+                print(f"  Embebidos {n_chunks}/{len(pending)} chunks")
+        except BaseException:
+            # los lotes en curso terminan y quedan en el checkpoint; el resto no se envia
+            self._stop.set()
+            pool.shutdown(wait=True, cancel_futures=True)
+            raise
+        pool.shutdown()
+        elapsed = time.perf_counter() - start
+
+        self.stats = {
+            "chunks": n_chunks,
+            "tokens": n_tokens,
+            "batches": len(batches),
+            "seconds": elapsed,
+            "chunks_per_s": n_chunks / elapsed if elapsed else 0.0,
+            "tokens_per_s": n_tokens / elapsed if elapsed else 0.0,
+        }
+        print(f"Embeddings: {n_chunks} chunks, {n_tokens} tokens en {elapsed:.2f}s "
+              f"({self.stats['chunks_per_s']:.1f} chunks/s, {self.stats['tokens_per_s']:.0f} tokens/s)")
+        return vectors
+
+    def finish(self):
+        """Borra el checkpoint una vez que los vectores quedaron en el indice."""
+        if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
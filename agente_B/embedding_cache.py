@@ -0,0 +1,121 @@
+import sqlite3
+import asyncio
+import threading
+from array import array
+from collections import OrderedDict
+from typing import List, Optional, Dict
+
+from langchain_core.embeddings import Embeddings
+
+def normalizar_consulta(text: str) -> str:
+    return " ".join(text.lower().split())
+
+class EmbeddingCache:
+    """
+    Cache de embeddings de consultas: LRU en memoria + nivel persistente opcional en SQLite.
+    La llave es (texto normalizado, modelo).
+    """
+
+    def __init__(self, model: str, max_size: int = 1024, path: Optional[str] = None):
+        self.model = model
+        self.max_size = max_size
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lru: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings ("
+                "model TEXT NOT NULL, text TEXT NOT NULL, vector BLOB NOT NULL, "
+                "PRIMARY KEY (model, text))"
+            )
+            self._db.commit()
+
+    def get(self, text: str) -> Optional[List[float]]:
+        key = normalizar_consulta(text)
+        with self._lock:
+            if key in self._lru:
+                self._lru.move_to_end(key)
+                self.hits += 1
+                return self._lru[key]
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT vector FROM query_embeddings WHERE model = ? AND text = ?",
+                    (self.model, key),
+                ).fetchone()
+                if row is not None:
+                    vector = array("f", row[0]).tolist()
+                    self._put_memory(key, vector)
+                    self.hits += 1
+                    return vector
+            self.misses += 1
+            return None
+
+    def put(self, text: str, vector: List[float]):
+        key = normalizar_consulta(text)
+        with self._lock:
+            self._put_memory(key, vector)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO query_embeddings (model, text, vector) VALUES (?, ?, ?)",
+                    (self.model, key, array("f", vector).tobytes()),
+                )
+                self._db.commit()
+
+    def _put_memory(self, key: str, vector: List[float]):
+        self._lru[key] = vector
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_size:
+            self._lru.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._lru)}
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+class CachedEmbeddings(Embeddings):
+    """Envuelve un cliente de embeddings y cachea solo las consultas (embed_query)."""
+
+    def __init__(self, base: Embeddings, cache: EmbeddingCache):
+        self.base = base
+        self.cache = cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.base.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = self.cache.get(text)
+        if vector is None:
+            vector = self.base.embed_query(text)
+            self.cache.put(text, vector)
+        return vector
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embebe varias consultas con un solo llamado para las que no estan en cache."""
+        vectors = [self.cache.get(t) for t in texts]
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        if missing:
+            fresh = self.base.embed_documents([texts[i] for i in missing])
+            for i, vector in zip(missing, fresh):
+                vectors[i] = vector
+                self.cache.put(texts[i], vector)
+        return vectors
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.base.aembed_documents(texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        # la cache puede leer y escribir SQLite: fuera del event loop
+        vector = await asyncio.to_thread(self.cache.get, text)
+        if vector is None:
+            vector = await self.base.aembed_query(text)
+            await asyncio.to_thread(self.cache.put, text, vector)
+        return vector
@@ -0,0 +1,111 @@
+import os
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any
+from dotenv import load_dotenv
+
+env_path = os.path.join(os.path.dirname(__file__), "..", ".env")
+load_dotenv(env_path)
+
+from rag_tools import retrieve_many, answer_from_context
+from metrics import MetricsCollector
+from settings import AGENT_MODE, EVAL_WORKERS, CHAT_PRICE_PER_1M
+
+def cargar_preguntas(path: str) -> List[Dict[str, Any]]:
+    """
+    Lee preguntas desde .jsonl ({"question": ..., "gold": regex opcional}) o
+    desde texto plano (una pregunta por linea).
+    """
+    preguntas = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if path.endswith(".jsonl"):
+                preguntas.append(json.loads(line))
+            else:
+                preguntas.append({"question": line})
+    return preguntas
+
+def evaluar(preguntas: List[Dict[str, Any]], workers: int = EVAL_WORKERS,
+            batch: bool = True) -> MetricsCollector:
+    """
+    Evalua todas las preguntas sin memoria conversacional: recuperacion (en bloque, o
+    pregunta por pregunta con batch=False) y generaciones en paralelo con `workers` hilos.
+    t_retrieval_ms es el de cada pregunta (ver retrieve_many); en bloque incluye una parte
+    proporcional del embedding y la busqueda compartidos. Para percentiles de latencia
+    usar batch=False y workers=1: con mas hilos t_generation_ms incluye la contencion.
+    """
+    collector = MetricsCollector(prices=CHAT_PRICE_PER_1M)
+    queries = [p["question"] for p in preguntas]
+
+    start = time.time()
+    retrieval_stats = []
+    contexts = retrieve_many(queries, stats=retrieval_stats, batch=batch)
+    print(f"Recuperacion {'en bloque' if batch else 'por pregunta'}: "
+          f"{len(queries)} preguntas en {(time.time() - start):.2f}s")
+
+    def generar(i: int):
+        stats = {}
+        answer = answer_from_context(queries[i], contexts[i], stats=stats)
+        return answer, stats
+
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(generar, range(len(queries))))
+    print(f"Generacion: {len(queries)} respuestas en {(time.time() - start):.2f}s con {workers} hilos")
+
+    for i, (answer, stats) in enumerate(results):
+        query_tokens = collector.count_tokens(queries[i])
+        usage = stats.get("llm_usage") or {}
+        estimate = stats.get("prompt_tokens_est") or {}
+        collector.add_metric(
+            agent_mode=AGENT_MODE,
+            question_id=preguntas[i].get("id", i + 1),
+            question_text=queries[i],
+            web_allowed=False,
+            web_used=False,
+            t_retrieval_ms=retrieval_stats[i]["t_retrieval_ms"],
+            t_generation_ms=stats.get("t_generation_ms", 0.0),
+            tokens_in=usage.get("prompt_tokens") or estimate.get("total", 0),
+            tokens_out=usage.get("completion_tokens") or collector.count_tokens(answer),
+            retrieved_docs=stats.get("retrieved_docs", []),
+            answer=answer,
+            query_tokens=query_tokens,
+            retrieval_query_tokens=query_tokens,
+            t_first_token_ms=stats.get("t_first_token_ms", 0.0),
+            t_rerank_ms=retrieval_stats[i]["t_rerank_ms"],
+            llm_usage=usage,
+            prompt_tokens_est=estimate,
+            gold_pattern=preguntas[i].get("gold")
+        )
+    return collector
+
+def main():
+    parser = argparse.ArgumentParser(description=f"Evaluacion en lote del Agente {AGENT_MODE}")
+    parser.add_argument("preguntas", help="archivo .jsonl o .txt con las preguntas")
+    parser.add_argument("--workers", type=int, default=EVAL_WORKERS)
+    parser.add_argument("--per-query", action="store_true",
+                        help="recupera pregunta por pregunta (t_retrieval_ms es la latencia real de cada una)")
+    parser.add_argument("--latency", action="store_true",
+                        help="--per-query y generacion secuencial: latencias sin concurrencia")
+    parser.add_argument("--out", default=f"metricas_eval_{AGENT_MODE}")
+    args = parser.parse_args()
+
+    preguntas = cargar_preguntas(args.preguntas)
+    if not preguntas:
+        raise SystemExit(f"No hay preguntas en {args.preguntas}")
+
+    workers = 1 if args.latency else args.workers
+    collector = evaluar(preguntas, workers=workers, batch=not (args.latency or args.per_query))
+    collector.save_to_json(f"{args.out}.json")
+    collector.save_to_csv(f"{args.out}.csv")
+    print(f"Metricas guardadas en {args.out}.json / {args.out}.csv")
+    for key, value in collector.get_summary().items():
+        print(f"  {key}: {value:.2f}" if isinstance(value, float) else f"  {key}: {value}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import math
+from typing import Dict, Any, List, Tuple
+
+class QuantileSketch:
+    """
+    Histograma con buckets logaritmicos (estilo HDR/DDSketch): el valor x > 0 cae en el
+    bucket ceil(log_gamma(x)) con gamma = (1 + a) / (1 - a), asi que cualquier cuantil
+    se estima con error relativo <= `relative_accuracy`. Agregar es O(1), la memoria
+    depende del rango de valores y no de cuantos hay, y dos sketches se suman con merge.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.counts: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float):
+        value = float(value)
+        if value <= 0:
+            self.zero_count += 1  # latencias y tokens no son negativos
+        else:
+            key = math.ceil(math.log(value) / self._log_gamma)
+            self.counts[key] = self.counts.get(key, 0) + 1
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other: "QuantileSketch"):
+        if other.gamma != self.gamma:
+            raise ValueError("No se pueden combinar sketches con distinta precision")
+        for key, n in other.counts.items():
+            self.counts[key] = self.counts.get(key, 0) + n
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> float:
+        """Cuantil q en [0, 1]; 0.0 si el sketch esta vacio."""
+        if not self.count:
+            return 0.0
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return max(self.min, 0.0)
+        for key in sorted(self.counts):
+            seen += self.counts[key]
+            if rank < seen:
+                # punto medio (relativo) del bucket, acotado al rango observado
+                value = 2 * self.gamma ** key / (self.gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def histogram(self) -> List[Tuple[float, int]]:
+        """Buckets no vacios como (limite superior, cantidad), de menor a mayor."""
+        buckets = [(0.0, self.zero_count)] if self.zero_count else []
+        return buckets + [(self.gamma ** key, self.counts[key]) for key in sorted(self.counts)]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"relative_accuracy": self.relative_accuracy, "counts": {str(k): n for k, n in self.counts.items()},
+                "zero_count": self.zero_count, "count": self.count, "total": self.total,
+                "min": self.min if self.count else None, "max": self.max if self.count else None}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "QuantileSketch":
+        sketch = cls(data["relative_accuracy"])
+        sketch.counts = {int(k): n for k, n in data["counts"].items()}
+        sketch.zero_count = data["zero_count"]
+        sketch.count = data["count"]
+        sketch.total = data["total"]
+        if sketch.count:
+            sketch.min, sketch.max = data["min"], data["max"]
+        return sketch
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# los modulos del agente se importan por nombre (como al correr los scripts desde su carpeta)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
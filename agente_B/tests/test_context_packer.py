@@ -0,0 +1,69 @@
+import pytest
+
+pytest.importorskip("tiktoken")
+pytest.importorskip("langchain_core")
+from langchain_core.documents import Document
+
+from context_packer import (
+    SEPARATOR, candidates_needed, count_tokens, dedupe, get_tokenizer, pack_context,
+)
+
+
+@pytest.fixture
+def tokenizer():
+    try:
+        return get_tokenizer()
+    except Exception as e:  # tiktoken descarga el vocabulario la primera vez
+        pytest.skip(f"tokenizer no disponible: {e}")
+
+
+def _doc(text, page=1, source="apuntes.pdf"):
+    return Document(page_content=text, metadata={"source": source, "page": page})
+
+
+A = "El gradiente descendente actualiza los pesos en la direccion opuesta al gradiente. "
+B = "La tasa de aprendizaje controla el tamano de cada paso de la actualizacion. "
+
+
+def test_candidates_needed():
+    assert candidates_needed(1200, 300) == 5
+    assert candidates_needed(1000, 300, spare=0) == 4
+    assert candidates_needed(100, 0) == 101
+
+
+def test_dedupe_merges_overlapping_chunks_of_the_same_page():
+    merged = dedupe([(_doc(A + B), 0.8), (_doc(B + A[:40]), 0.9)])
+    assert len(merged) == 1
+    assert merged[0][0].page_content == A + B + A[:40]
+    assert merged[0][1] == 0.9
+
+
+def test_dedupe_drops_contained_chunks_and_keeps_order():
+    scored = [(_doc(B), 0.5), (_doc(A + B), 0.7), (_doc(A, page=2), 0.9)]
+    result = dedupe(scored)
+    assert [(d.page_content, d.metadata["page"], s) for d, s in result] == [(A + B, 1, 0.7), (A, 2, 0.9)]
+
+
+def test_dedupe_keeps_different_pages_and_unknown_scores():
+    result = dedupe([(_doc(A, page=1), None), (_doc(A, page=2), 0.4)])
+    assert [s for _, s in result] == [None, 0.4]
+    assert dedupe([(_doc(A), None), (_doc(A), 0.3)])[0][1] == 0.3
+
+
+def test_count_tokens_accepts_special_token_text(tokenizer):
+    assert count_tokens("<|endoftext|>") > 1
+
+
+def test_pack_context_fills_budget_in_order(tokenizer):
+    docs = [(_doc(A, page=1), 0.9), (_doc(B * 20, page=2), 0.8), (_doc(B, page=3), 0.7)]
+    budget = count_tokens(A) + count_tokens(SEPARATOR) + count_tokens(B)
+    packed = pack_context(docs, budget)
+    # el segundo no cabe y se salta; el tercero si
+    assert [d.metadata["page"] for d, _ in packed] == [1, 3]
+
+
+def test_pack_context_truncates_when_nothing_fits(tokenizer):
+    packed = pack_context([(_doc(A * 10), 0.9)], budget_tokens=5)
+    assert len(packed) == 1
+    assert count_tokens(packed[0][0].page_content) <= 5
+    assert pack_context([], 100) == []
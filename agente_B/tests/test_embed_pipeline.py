@@ -0,0 +1,128 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+openai = pytest.importorskip("openai")
+tiktoken = pytest.importorskip("tiktoken")
+
+from embed_pipeline import EmbeddingStage, openai_embed_fn, batch_by_tokens
+
+
+class FakeEmbeddingServer:
+    """
+    Servidor /v1/embeddings minimo: vector = [largo del texto, 1.0]. `fail_on` hace que
+    los lotes con ese texto respondan 400 y `rate_limit` respuestas 429 antes de atender.
+    """
+
+    def __init__(self, fail_on=None, rate_limit=0):
+        self.fail_on = fail_on
+        self.rate_limit = rate_limit
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                texts = body["input"]
+                server.requests.append(texts)
+                if server.rate_limit:
+                    server.rate_limit -= 1
+                    self._reply(429, {"error": {"message": "slow down"}}, {"retry-after": "0.01"})
+                elif server.fail_on in texts:
+                    self._reply(400, {"error": {"message": "bad input"}})
+                else:
+                    self._reply(200, {
+                        "object": "list",
+                        "model": body["model"],
+                        "data": [{"object": "embedding", "index": i, "embedding": [float(len(t)), 1.0]}
+                                 for i, t in enumerate(texts)],
+                        "usage": {"prompt_tokens": len(texts), "total_tokens": len(texts)},
+                    })
+
+            def _reply(self, status, payload, headers=None):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}/v1"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def fake_server(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    servers = []
+
+    def start(**kwargs):
+        servers.append(FakeEmbeddingServer(**kwargs))
+        return servers[-1]
+
+    yield start
+    for server in servers:
+        server.close()
+
+
+def _stage(server, checkpoint_path):
+    try:
+        return EmbeddingStage(embed_fn=openai_embed_fn("text-embedding-3-small", base_url=server.base_url),
+                              checkpoint_path=str(checkpoint_path), max_items=2, concurrency=1,
+                              max_retries=2)
+    except Exception as e:  # tiktoken descarga el vocabulario la primera vez
+        pytest.skip(f"tokenizer no disponible: {e}")
+
+
+def test_batch_by_tokens_respects_limits():
+    assert batch_by_tokens([3, 3, 3, 9, 1], max_tokens=6, max_items=10) == [[0, 1], [2], [3], [4]]
+    assert batch_by_tokens([1, 1, 1], max_tokens=100, max_items=2) == [[0, 1], [2]]
+
+
+def test_run_returns_vectors_in_order(fake_server, tmp_path):
+    server = fake_server()
+    texts = ["a", "bb", "ccc", "dddd", "eeeee"]
+    vectors = _stage(server, tmp_path / "ckpt.jsonl").run([f"id{i}" for i in range(5)], texts)
+    assert [v[0] for v in vectors] == [1.0, 2.0, 3.0, 4.0, 5.0]
+    assert len(server.requests) == 3
+
+
+def test_rate_limit_is_retried(fake_server, tmp_path):
+    server = fake_server(rate_limit=1)
+    stage = _stage(server, tmp_path / "ckpt.jsonl")
+    assert stage.run(["id0"], ["hola"]) == [[4.0, 1.0]]
+    assert len(server.requests) == 2
+
+
+def test_failure_keeps_finished_batches_and_resumes(fake_server, tmp_path):
+    ids = [f"id{i}" for i in range(10)]
+    texts = ["x" * (i + 1) for i in range(10)]
+    texts[2] = "boom"
+    checkpoint = tmp_path / "ckpt.jsonl"
+
+    failing = fake_server(fail_on="boom")
+    with pytest.raises(openai.BadRequestError):
+        _stage(failing, checkpoint).run(ids, texts)
+    answered = {ids[texts.index(t)] for batch in failing.requests if "boom" not in batch for t in batch}
+    saved = {json.loads(line)["id"] for line in checkpoint.read_text(encoding="utf-8").splitlines()}
+    # todo lote que respondio el servidor quedo en el checkpoint; los que no empezaron se cancelaron
+    assert saved == answered and {"id0", "id1"} <= saved
+    assert len(failing.requests) < 5
+
+    texts[2] = "xxx"
+    healthy = fake_server()
+    vectors = _stage(healthy, checkpoint).run(ids, texts)
+    assert [v[0] for v in vectors] == [float(i + 1) for i in range(10)]
+    assert sorted(t for batch in healthy.requests for t in batch) == sorted(texts[int(i[2:])] for i in set(ids) - saved)
@@ -0,0 +1,61 @@
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("unidecode")
+pytest.importorskip("langchain_core")
+
+from lexical_index import BM25Index, tokenize
+
+TEXTS = [
+    "La distancia euclidiana es la raiz de la suma de diferencias al cuadrado.",
+    "La similitud coseno compara la direccion de dos vectores.",
+    "El kernel gaussiano usa la distancia euclidiana entre los puntos.",
+    "La regresion lineal ajusta una recta por minimos cuadrados.",
+]
+METAS = [{"source": "apuntes.pdf", "page": i + 1} for i in range(len(TEXTS))]
+
+
+def test_tokenize_strips_accents_and_stopwords():
+    assert tokenize("¿Qué es la Distancia Euclídiana?") == ["distancia", "euclidiana"]
+
+
+def test_search_ranks_matching_chunks_and_reports_coverage():
+    index = BM25Index.build(TEXTS, METAS)
+    hits, coverage = index.search("similitud coseno", k=3)
+    assert hits[0][0].metadata["page"] == 2
+    assert coverage == 1.0
+    assert all(score > 0 for _, score in hits)
+
+    hits, coverage = index.search("distancia euclidiana kernel", k=3)
+    assert [doc.metadata["page"] for doc, _ in hits[:2]] == [3, 1]
+    assert hits[0][1] > hits[1][1]
+    assert coverage == 1.0
+
+
+def test_search_without_known_terms():
+    index = BM25Index.build(TEXTS, METAS)
+    assert index.search("que es", k=3) == ([], 0.0)
+    assert index.search("transformers", k=3) == ([], 0.0)
+
+
+def test_rare_terms_weigh_more():
+    index = BM25Index.build(TEXTS, METAS)
+    assert index.idf[index.vocab["coseno"]] > index.idf[index.vocab["distancia"]]
+
+
+def test_save_load_keeps_scores_and_chunk_ids(tmp_path):
+    ids = [f"apuntes.pdf#{i + 1}:0" for i in range(len(TEXTS))]
+    index = BM25Index.build(TEXTS, METAS, ids=ids)
+    index.save(str(tmp_path))
+    loaded = BM25Index.load(str(tmp_path))
+    hits, _ = loaded.search("regresion lineal", k=1)
+    assert hits[0][0].page_content == TEXTS[3]
+    assert hits[0][0].metadata == {"source": "apuntes.pdf", "page": 4, "chunk_id": ids[3]}
+    assert hits[0][1] == pytest.approx(index.search("regresion lineal", k=1)[0][0][1])
+
+
+def test_index_without_ids_has_no_chunk_id(tmp_path):
+    BM25Index.build(TEXTS, METAS).save(str(tmp_path))
+    hits, _ = BM25Index.load(str(tmp_path)).search("coseno", k=1)
+    assert "chunk_id" not in hits[0][0].metadata
+    assert BM25Index.load(str(tmp_path / "vacio")) is None
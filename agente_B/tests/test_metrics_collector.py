@@ -0,0 +1,54 @@
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("unidecode")
+pytest.importorskip("tiktoken")
+
+import metrics
+from metrics import MetricsCollector
+
+
+@pytest.fixture
+def collector_factory(monkeypatch):
+    # sin vocabulario de tiktoken count_tokens cae a contar palabras
+    monkeypatch.setattr(metrics, "get_tokenizer", lambda: None)
+    return lambda: MetricsCollector(background=True)
+
+
+def _record(collector, question_id):
+    collector.add_metric(
+        agent_mode="rag", question_id=question_id, question_text="que es un kernel",
+        web_allowed=False, web_used=False, t_retrieval_ms=10.0, t_generation_ms=20.0,
+        tokens_in=100, tokens_out=50, retrieved_docs=[], answer="un kernel es una funcion de similitud")
+
+
+def test_get_summary_reports_scored_records_without_waiting(collector_factory):
+    collector = collector_factory()
+    collector.submit(lambda: _record(collector, 1))
+    collector.wait()
+
+    release = threading.Event()
+    collector.submit(release.wait)
+    collector.submit(lambda: _record(collector, 2))
+
+    start = time.perf_counter()
+    summary = collector.get_summary()
+    assert time.perf_counter() - start < 0.5
+    assert summary["total_questions"] == 1
+
+    release.set()
+    collector.flush()
+    assert collector.get_summary()["total_questions"] == 2
+
+
+def test_sessions_share_one_scoring_thread(collector_factory):
+    collectors = [collector_factory() for _ in range(5)]
+    for i, collector in enumerate(collectors):
+        collector.submit(lambda c=collector, i=i: _record(c, i))
+    for collector in collectors:
+        collector.wait()
+        assert collector.get_summary()["total_questions"] == 1
+    scoring = [t for t in threading.enumerate() if t.name.startswith("metrics")]
+    assert len(scoring) == 1
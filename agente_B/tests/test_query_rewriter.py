@@ -0,0 +1,37 @@
+import pytest
+
+pytest.importorskip("unidecode")
+pytest.importorskip("langchain_openai")
+
+from query_rewriter import is_followup
+
+
+@pytest.mark.parametrize("question", [
+    "¿Y para regresión logística?",
+    "Pero, ¿cómo se calcula?",
+    "¿Por qué?",
+    "¿Cómo así?",
+    "¿Eso aplica también a SVM?",
+    "¿Cuál es su derivada?",
+    "¿Qué son estas funciones?",
+    "¿Éstas sirven para clasificar?",
+    "estas funciones son convexas?",
+    "¿Por qué es eso importante?",
+])
+def test_followups(question):
+    assert is_followup(question)
+
+
+@pytest.mark.parametrize("question", [
+    "¿Estás seguro de la respuesta?",
+    "¿Estás usando la distancia euclidiana?",
+    "estas seguro?",
+    "estas usando los apuntes?",
+    "estas equivocado con la formula",
+    "¿Qué es la distancia coseno?",
+    "¿Cómo funciona el gradiente descendente?",
+    "Explica backpropagation",
+    "¿Qué es un kernel?",
+])
+def test_standalone_questions(question):
+    assert not is_followup(question)
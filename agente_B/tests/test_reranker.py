@@ -0,0 +1,53 @@
+import time
+
+import pytest
+
+pytest.importorskip("langchain_core")
+from langchain_core.documents import Document
+
+from reranker import CrossEncoderReranker
+
+PAIR_S = 0.03
+
+
+class _Model:
+    """Cross-encoder falso: el logit es el numero del fragmento y cada par tarda PAIR_S."""
+
+    def predict(self, pairs, batch_size=None, show_progress_bar=False):
+        time.sleep(PAIR_S * len(pairs))
+        return [float(text.split()[-1]) for _, text in pairs]
+
+
+def _reranker(budget_ms):
+    reranker = CrossEncoderReranker("falso", batch_size=2, budget_ms=budget_ms)
+    reranker._model = _Model()
+    reranker.ms_per_pair = PAIR_S * 1000
+    return reranker
+
+
+def _candidates(n):
+    return [(Document(page_content=f"fragmento {i}"), 0.5) for i in range(n)]
+
+
+def test_partial_budget_keeps_scores_and_appends_the_rest():
+    reranker = _reranker(budget_ms=100)
+    candidates = _candidates(6)
+    reranked, info = reranker.rerank("consulta", candidates)
+
+    scored = [doc for doc, _ in reranked if "rank_score" in doc.metadata]
+    rest = [doc for doc, _ in reranked if "rank_score" not in doc.metadata]
+    assert 0 < len(scored) < len(candidates)
+    assert [d.metadata["rank_score"] for d in scored] == sorted((d.metadata["rank_score"] for d in scored),
+                                                               reverse=True)
+    assert [d.page_content for d in rest] == [d.page_content for d, _ in candidates[len(scored):]]
+    assert info["rerank_fallback"] is False
+    assert reranker.fallbacks == 0
+
+
+def test_fallback_only_when_nothing_was_scored():
+    reranker = _reranker(budget_ms=10)
+    candidates = _candidates(4)
+    reranked, info = reranker.rerank("consulta", candidates)
+    assert reranked == candidates
+    assert info["rerank_fallback"] is True
+    assert reranker.fallbacks == 1
@@ -0,0 +1,63 @@
+import os
+
+import pytest
+
+pytest.importorskip("langchain_openai")
+pytest.importorskip("langchain_community")
+
+from index_meta import META_FILE, write_index_meta
+from resources import ResourceRegistry
+
+VECTOR = [1.0, 0.0, 0.0]
+
+
+def _rebuild(db_dir):
+    # otro proceso reconstruye el indice: nuevo index_meta.json con otra version
+    meta = write_index_meta(db_dir)
+    path = os.path.join(db_dir, META_FILE)
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    return meta["version"]
+
+
+def _cached_answer(registry, db_dir):
+    return registry.answer_cache().lookup(VECTOR, registry.index_version(db_dir), "rag")
+
+
+def test_version_is_cached_while_meta_is_unchanged(tmp_path, monkeypatch):
+    db_dir = str(tmp_path)
+    version = _rebuild(db_dir)
+    registry = ResourceRegistry()
+    assert registry.index_version(db_dir) == version
+
+    import resources
+    monkeypatch.setattr(resources, "index_version", lambda _: pytest.fail("se releyo index_meta.json"))
+    assert registry.index_version(db_dir) == version
+
+
+def test_rebuild_elsewhere_stops_serving_cached_answer(tmp_path):
+    db_dir = str(tmp_path)
+    _rebuild(db_dir)
+    registry = ResourceRegistry()
+    registry.answer_cache().store(VECTOR, registry.index_version(db_dir), "rag", "vieja", [])
+    assert _cached_answer(registry, db_dir) == ("vieja", [])
+
+    new_version = _rebuild(db_dir)
+    assert _cached_answer(registry, db_dir) is None
+    assert registry.index_version(db_dir) == new_version
+    assert registry.answer_cache().stats()["size"] == 0
+
+
+def test_rebuild_reopens_lexical_index(tmp_path, monkeypatch):
+    import resources
+    loads = []
+    monkeypatch.setattr(resources.BM25Index, "load", classmethod(lambda cls, d: loads.append(d) or object()))
+    db_dir = str(tmp_path)
+    _rebuild(db_dir)
+    registry = ResourceRegistry()
+    first = registry.lexical_index(db_dir)
+    assert registry.lexical_index(db_dir) is first
+
+    _rebuild(db_dir)
+    assert registry.lexical_index(db_dir) is not first
+    assert len(loads) == 2
@@ -0,0 +1,143 @@
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+import statistics
+
+# Configuración
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+AGENTS = {
+    "A": os.path.join(PROJECT_ROOT, "agente_A"),
+    "B": os.path.join(PROJECT_ROOT, "agente_B"),
+}
+OUTPUT_DIR = os.path.join(PROJECT_ROOT, "benchmark_out")
+
+def run(agent_dir, args):
+    """Ejecuta un script del agente en su propia carpeta y mide el tiempo."""
+    start = time.perf_counter()
+    subprocess.run([sys.executable] + args, cwd=agent_dir, check=True)
+    return time.perf_counter() - start
+
+def db_dir(agent_dir):
+    """Lee DB_DIR desde el settings.py del agente."""
+    out = subprocess.run([sys.executable, "-c", "from settings import DB_DIR; print(DB_DIR)"],
+                         cwd=agent_dir, check=True, capture_output=True, text=True)
+    return os.path.abspath(os.path.join(agent_dir, out.stdout.strip()))
+
+def dir_size_mb(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for f in files:
+            total += os.path.getsize(os.path.join(root, f))
+    return total / (1024 * 1024)
+
+def percentiles(values):
+    """p50/p95/p99 (interpolados) de una lista de valores."""
+    if not values:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0}
+    if len(values) == 1:
+        return {"p50": values[0], "p95": values[0], "p99": values[0]}
+    q = statistics.quantiles(values, n=100, method="inclusive")
+    return {"p50": q[49], "p95": q[94], "p99": q[98]}
+
+def summarize(metrics, build):
+    """Resumen comparable de las metricas de un agente."""
+    def col(name):
+        return [m.get(name, 0) or 0 for m in metrics]
+    mean = lambda xs: statistics.mean(xs) if xs else 0.0
+    return {
+        "questions": len(metrics),
+        "t_retrieval_ms": percentiles(col("t_retrieval_ms")),
+        "t_generation_ms": percentiles(col("t_generation_ms")),
+        "t_total_ms": percentiles(col("t_total_ms")),
+        "avg_tokens_in": mean(col("tokens_in")),
+        "avg_tokens_out": mean(col("tokens_out")),
+        "fidelity_rate": mean(col("fidelity_binary")),
+        "exact_match_rate": mean(col("em_binary")),
+        "avg_citation_correctness": mean(col("citations_correct_ratio")),
+        **build,
+    }
+
+def format_report(report):
+    """Tabla en markdown con ambos agentes lado a lado."""
+    rows = [
+        ("Preguntas", lambda r: f"{r['questions']}"),
+        ("Retrieval p50/p95 (ms)", lambda r: f"{r['t_retrieval_ms']['p50']:.0f} / {r['t_retrieval_ms']['p95']:.0f}"),
+        ("Generacion p50/p95 (ms)", lambda r: f"{r['t_generation_ms']['p50']:.0f} / {r['t_generation_ms']['p95']:.0f}"),
+        ("Total p50/p95/p99 (ms)", lambda r: "{p50:.0f} / {p95:.0f} / {p99:.0f}".format(**r['t_total_ms'])),
+        ("Tokens in / out", lambda r: f"{r['avg_tokens_in']:.0f} / {r['avg_tokens_out']:.0f}"),
+        ("Fidelidad", lambda r: f"{r['fidelity_rate']:.2%}"),
+        ("Exact match", lambda r: f"{r['exact_match_rate']:.2%}"),
+        ("Chunks en indice", lambda r: f"{r.get('chunks', '?')}"),
+        ("Tamano indice (MB)", lambda r: f"{r['index_size_mb']:.2f}"),
+        ("Construccion (s)", lambda r: f"{r['build_seconds']:.1f}"),
+    ]
+    agents = list(report["agents"])
+    if report.get("workers", 1) > 1:
+        note = (f"Latencias medidas con {report['workers']} generaciones concurrentes "
+                f"(incluyen contencion); usar --workers 1 para latencias aisladas.")
+    else:
+        note = "Latencias por pregunta, sin concurrencia (recuperacion y generacion una a una)."
+    lines = ["| Metrica | " + " | ".join(f"Agente {a}" for a in agents) + " |",
+             "|---|" + "---|" * len(agents)]
+    for name, fmt in rows:
+        lines.append(f"| {name} | " + " | ".join(fmt(report["agents"][a]) for a in agents) + " |")
+    lines.append("")
+    lines.append(f"Parseo compartido de PDFs: {report['parse_seconds']:.1f}s")
+    lines.append(note)
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark A/B con una sola pasada de ingesta")
+    parser.add_argument("preguntas", help="archivo .jsonl o .txt con las preguntas (ver evaluate.py)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="generaciones concurrentes; con mas de 1 las latencias incluyen contencion")
+    parser.add_argument("--skip-build", action="store_true", help="usa los indices existentes")
+    args = parser.parse_args()
+
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    preguntas = os.path.abspath(args.preguntas)
+    pages = os.path.join(OUTPUT_DIR, "paginas.jsonl")
+
+    # 1. Parseo y limpieza de los PDFs una sola vez (limpiar_texto es igual en ambos agentes)
+    parse_seconds = 0.0
+    if not args.skip_build:
+        print("=== Parseando PDFs ===")
+        parse_seconds = run(AGENTS["A"], ["build_index.py", "--dump-pages", pages])
+
+    report = {"parse_seconds": parse_seconds, "workers": args.workers, "agents": {}}
+    for name, agent_dir in AGENTS.items():
+        # 2. Cada agente construye su indice desde las mismas paginas
+        build = {"build_seconds": 0.0}
+        if not args.skip_build:
+            print(f"=== Construyendo indice {name} ===")
+            build["build_seconds"] = run(agent_dir, ["build_index.py", "--full", "--pages", pages])
+
+        index_dir = db_dir(agent_dir)
+        build["index_size_mb"] = dir_size_mb(index_dir)
+        meta_path = os.path.join(index_dir, "index_meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                build["chunks"] = json.load(f).get("chunks")
+
+        # 3. Mismas preguntas contra ambos agentes
+        print(f"=== Evaluando agente {name} ===")
+        out = os.path.join(OUTPUT_DIR, f"metricas_{name}")
+        run(agent_dir, ["evaluate.py", preguntas, "--per-query", "--workers", str(args.workers), "--out", out])
+        with open(f"{out}.json", 'r', encoding='utf-8') as f:
+            report["agents"][name] = summarize(json.load(f), build)
+
+    # 4. Reporte comparativo
+    with open(os.path.join(OUTPUT_DIR, "reporte_ab.json"), 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    table = format_report(report)
+    with open(os.path.join(OUTPUT_DIR, "reporte_ab.md"), 'w', encoding='utf-8') as f:
+        f.write(table + "\n")
+    print()
+    print(table)
+    print(f"\nReporte guardado en {OUTPUT_DIR}")
+
+if __name__ == "__main__":
+    main()